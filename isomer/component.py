@@ -55,7 +55,9 @@ from formal import model_factory
 # noinspection PyUnresolvedReferences
 from isomer.events.system import isomer_ui_event, authorized_event, anonymous_event
 from isomer.events.client import send
-from isomer.logger import isolog, warn, critical, error, verbose
+from isomer.instrumentation import instrument
+from isomer.logger import isolog, is_enabled, is_traced, warn, critical, error, \
+    verbose, info
 from isomer.schemata.component import ComponentBaseConfigSchema
 from isomer.misc import nested_map_update
 from jsonschema import ValidationError
@@ -78,6 +80,9 @@ def handler(*names, **kwargs):
     method may have an additional first argument named *event*. If declared,
     the event object that caused the handler to be invoked is assigned to it.
 
+    Handlers are wrapped for optional latency recording, see
+    :mod:`isomer.instrumentation`.
+
     By default, the handler is invoked by the component's root
     :class:`~.manager.Manager` for events that are propagated on the channel
     determined by the BaseComponent's *channel* attribute.
@@ -147,7 +152,7 @@ def handler(*names, **kwargs):
             del args[0]
         f.event = getattr(f, "event", bool(args and args[0] == "event"))
 
-        return f
+        return instrument(f)
 
     return wrapper
 
@@ -196,19 +201,29 @@ class LoggingMeta(BaseMeta):
     def log(self, *args, **kwargs):
         """Log a statement from this component"""
 
-        func = inspect.currentframe().f_back.f_code
-        # Dump the message + the name of this function to the log.
+        if not is_enabled(kwargs.get("lvl", info)):
+            return
+
+        exception = "exc" in kwargs and kwargs["exc"] is True
 
-        if "exc" in kwargs and kwargs["exc"] is True:
+        if exception:
             exc_type, exc_obj, exc_tb = exc_info()
             line_no = exc_tb.tb_lineno
             # print('EXCEPTION DATA:', line_no, exc_type, exc_obj, exc_tb)
             args += (traceback.extract_tb(exc_tb),)
-        else:
-            line_no = func.co_firstlineno
 
-        sourceloc = "[%.10s@%s:%i]" % (func.co_name, func.co_filename, line_no)
-        isolog(sourceloc=sourceloc, emitter=self.uniquename, *args, **kwargs)
+        if is_traced(kwargs.get("tb", False)):
+            func = inspect.currentframe().f_back.f_code
+            # Dump the message + the name of this function to the log.
+
+            if not exception:
+                line_no = func.co_firstlineno
+
+            kwargs["sourceloc"] = "[%.10s@%s:%i]" % (
+                func.co_name, func.co_filename, line_no
+            )
+
+        isolog(emitter=self.uniquename, *args, **kwargs)
 
 
 class ConfigurableMeta(LoggingMeta):
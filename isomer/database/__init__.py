@@ -39,6 +39,7 @@ import sys
 import formal
 import jsonschema
 import pymongo
+from pymongo import monitoring
 
 from isomer import schemastore
 from isomer.error import abort, EXIT_NO_DATABASE, EXIT_NO_DATABASE_DEFINED,\
@@ -63,6 +64,35 @@ instance = ""
 initialized = False
 ValidationError = jsonschema.ValidationError
 
+command_listener = None
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """Records database command latencies into the metrics registry"""
+
+    def __init__(self):
+        from isomer.metrics import registry
+
+        self.latency = registry.histogram(
+            "isomer_db_command_seconds", "Database command latency", ("command",)
+        )
+        self.failures = registry.counter(
+            "isomer_db_command_failures_total", "Failed database commands",
+            ("command",)
+        )
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.latency.observe(event.duration_micros / 1000000.0,
+                             command=event.command_name)
+
+    def failed(self, event):
+        self.latency.observe(event.duration_micros / 1000000.0,
+                             command=event.command_name)
+        self.failures.inc(command=event.command_name)
+
 
 def clear_all():
     """DANGER!
@@ -242,6 +272,13 @@ def initialize(
 
     db_log("Using database:", dbname, "@", dbhost, ":", dbport)
 
+    global command_listener
+
+    # Listeners only apply to clients created after their registration
+    if command_listener is None:
+        command_listener = CommandLatencyListener()
+        monitoring.register(command_listener)
+
     if dbname == "" and not ignore_fail:
         abort(EXIT_NO_DATABASE_DEFINED)
     if dbhost == "" and not ignore_fail:
@@ -272,6 +309,9 @@ def initialize(
     schemastore.l10n_schemastore = schemastore.build_l10n_schemastore(
         schemastore.schemastore
     )
+    schemastore.permissionstore = schemastore.build_permissionstore(
+        schemastore.schemastore
+    )
     objectmodels = _build_model_factories(schemastore.schemastore)
     collections = _build_collections(schemastore.schemastore)
     instance = instance_name
@@ -32,6 +32,7 @@ from isomer.component import ConfigurableComponent, handler
 from isomer.database import dbhost, dbport, dbname
 from isomer.database.backup import backup
 from isomer.logger import verbose, error, warn
+from isomer.metrics import registry
 from isomer.misc.path import get_path
 
 
@@ -104,6 +105,19 @@ class Maintenance(ConfigurableComponent):
         self.disk_allocated = {}
         self.disk_free = {}
 
+        registry.gauge(
+            "isomer_db_collection_bytes", "Storage size of database collections",
+            ("collection",), callback=lambda: self.collection_sizes
+        )
+        registry.gauge(
+            "isomer_disk_free_bytes", "Free space of storage locations",
+            ("location",), callback=lambda: self.disk_free
+        )
+        registry.gauge(
+            "isomer_disk_allocated_bytes", "Space used by storage locations",
+            ("location",), callback=lambda: self.disk_allocated
+        )
+
         self.maintenance_check()
         self.timer = Timer(
             self.config.interval, Event.create("maintenance_check"), persist=True
@@ -165,9 +179,13 @@ class Maintenance(ConfigurableComponent):
                 self.log("Location unavailable:", name, e, type(e), lvl=warn, exc=True)
                 continue
             free_space = stats.f_frsize * stats.f_bavail
-            used_space = get_folder_size(get_path(name, "")) / 1024.0 / 1024
+            allocated = get_folder_size(get_path(name, ""))
+            used_space = allocated / 1024.0 / 1024
             total += used_space
 
+            self.disk_free[name] = free_space
+            self.disk_allocated[name] = allocated
+
             self.log("Location %s uses %.2f MB" % (name, used_space))
 
             if free_space < checkpoint["minimum"]:
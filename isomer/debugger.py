@@ -30,8 +30,12 @@ Debugger overlord
 """
 
 import json
+import os
 import shutil
-from collections import deque
+import sys
+import threading
+import time
+from collections import Counter, deque
 from itertools import islice
 from uuid import uuid4
 
@@ -47,7 +51,11 @@ from isomer.events.system import (
     frontendbuildrequest,
     componentupdaterequest,
     logtailrequest,
+    handlerstatsrequest,
 )
+from isomer.events import statistics
+from isomer.instrumentation import stats, enable_handler_stats
+from isomer.metrics import registry
 
 try:
     # noinspection PyPackageRequirements
@@ -101,7 +109,12 @@ class cli_help(Event):
 
 
 class cli_errors(Event):
-    """Display errors in the live log"""
+    """Display errors in the live log
+
+    Arguments:
+        [int]   Number of latest errors to display
+        [str]   Only display errors of this emitter
+    """
 
     pass
 
@@ -122,6 +135,28 @@ class cli_log_level(Event):
     pass
 
 
+class cli_handler_stats(Event):
+    """Display or control handler latency statistics
+
+    Arguments:
+        on|off|reset    Switch recording on/off or drop recorded data
+        [int]           Number of slowest handlers and events to display
+        [str]           Sort by count, total, mean, p50, p90, p99 or max
+    """
+
+    pass
+
+
+class cli_event_stats(Event):
+    """Display counts and rates of constructed events
+
+    Arguments:
+        [int]|reset     Number of event classes to display or reset counters
+    """
+
+    pass
+
+
 class cli_comp_graph(Event):
     """Draw current component graph"""
 
@@ -177,6 +212,23 @@ class cli_exception_test(Event):
     pass
 
 
+class cli_profile(Event):
+    """Sample the event loop's call stacks and write a collapsed stack file
+
+    Arguments:
+        [float] Duration of sampling in seconds
+        [float] Sampling interval in milliseconds
+    """
+
+    pass
+
+
+class cli_profile_stop(Event):
+    """Stop a running stack sampler early and write its results"""
+
+    pass
+
+
 class TestException(BaseException):
     """Generic exception to test exception monitoring"""
 
@@ -195,7 +247,13 @@ class IsomerDebugger(ConfigurableComponent):
             "description": "Users that should be notified about exceptions.",
             "default": [],
             "items": {"type": "string"},
-        }
+        },
+        "handler_stats": {
+            "type": "boolean",
+            "title": "Handler statistics",
+            "description": "Record latency histograms of all event handlers",
+            "default": False,
+        },
     }
     channel = "isomer-web"
 
@@ -218,6 +276,8 @@ class IsomerDebugger(ConfigurableComponent):
             self.fireEvent(cli_register_event("comp_graph", cli_comp_graph))
             self.fireEvent(cli_register_event("locations", cli_locations))
             self.fireEvent(cli_register_event("test_exception", cli_exception_test))
+            self.fireEvent(cli_register_event("handler_stats", cli_handler_stats))
+            self.fireEvent(cli_register_event("event_stats", cli_event_stats))
         except AttributeError:
             pass  # We're running in a test environment and root is not yet running
 
@@ -226,6 +286,10 @@ class IsomerDebugger(ConfigurableComponent):
         except AttributeError:
             self.log("No pympler library for memory analysis installed.", lvl=warn)
 
+        if self.config.handler_stats:
+            self.log("Recording handler statistics")
+            enable_handler_stats()
+
         self.log("Started. Notification users: ", self.config.notificationusers)
 
     def _drawgraph(self):
@@ -242,12 +306,15 @@ class IsomerDebugger(ConfigurableComponent):
     def cli_errors(self, *args):
         """Display errors in the live log"""
 
-        self.log("All errors since startup:")
         from isomer.logger import LiveLog
 
-        for logline in LiveLog:
-            if logline[1] >= error:
-                self.log(logline, pretty=True)
+        limit = int(args[0]) if len(args) > 0 else None
+        emitter = args[1] if len(args) > 1 else None
+
+        self.log("Latest errors since startup:")
+
+        for logline in reversed(LiveLog.query(limit, error, emitter)):
+            self.log(logline, pretty=True)
 
     @handler("cli_log_level")
     def cli_log_level(self, *args):
@@ -260,6 +327,86 @@ class IsomerDebugger(ConfigurableComponent):
         verbosity["console"] = new_level
         verbosity["file"] = new_level
 
+    @handler("cli_handler_stats")
+    def cli_handler_stats(self, *args):
+        """Display or control handler latency statistics"""
+
+        if len(args) > 0 and args[0] in ("on", "off", "reset"):
+            if args[0] == "reset":
+                stats.reset()
+            else:
+                enable_handler_stats(args[0] == "on")
+            self.log("Handler statistics", args[0])
+            return
+
+        try:
+            limit = int(args[0]) if len(args) > 0 else 20
+        except ValueError:
+            self.log("Invalid limit:", args[0], lvl=warn)
+            return
+
+        sort = args[1] if len(args) > 1 else "total"
+
+        report = stats.report(limit, sort)
+
+        if not report["enabled"]:
+            self.log("Handler statistics are not being recorded, use "
+                     "'handler_stats on'", lvl=warn)
+
+        row = "%-60s %9s %10s %9s %9s %9s %9s"
+        header = row % ("name", "count", "total", "mean", "p50", "p99", "max")
+
+        for section in ("handlers", "events"):
+            self.log("Slowest %s by %s (microseconds):" % (section, sort))
+            self.log(header)
+            for item in report[section]:
+                self.log(row % (
+                    item["name"][-60:], item["count"], item["total"], item["mean"],
+                    item["p50"], item["p99"], item["max"]
+                ))
+
+        self.log("Event queue depth:", report["queue_depth"], pretty=True)
+
+    @handler("cli_event_stats")
+    def cli_event_stats(self, *args):
+        """Display counts and rates of constructed events"""
+
+        if len(args) > 0 and args[0] == "reset":
+            statistics.reset()
+            self.log("Event statistics reset")
+            return
+
+        try:
+            limit = int(args[0]) if len(args) > 0 else None
+        except ValueError:
+            self.log("Invalid limit:", args[0], lvl=warn)
+            return
+
+        row = "%-70s %10s %12s %12s"
+        self.log("Constructed events (rates per second):")
+        self.log(row % ("event", "total", "recent", "average"))
+        for name, total, recent, average in statistics.report(limit):
+            self.log(row % (name[-70:], total, "%.2f" % recent, "%.2f" % average))
+
+    @handler(handlerstatsrequest)
+    def handlerstatsrequest(self, event):
+        """Transmit handler latency and event queue statistics"""
+
+        data = event.data if isinstance(event.data, dict) else {}
+
+        try:
+            limit = int(data.get("limit", 50))
+        except (TypeError, ValueError):
+            self.log("Invalid handler statistics request:", data, lvl=warn)
+            return
+
+        response = {
+            "component": "isomer.debugger",
+            "action": "handlerstatsrequest",
+            "data": stats.report(limit, str(data.get("sort", "total"))),
+        }
+        self.fireEvent(send(event.client.uuid, response))
+
     @handler("cli_compgraph")
     def cli_compgraph(self, event):
         """Draw current component graph"""
@@ -299,8 +446,34 @@ class IsomerDebugger(ConfigurableComponent):
 
     @handler(logtailrequest)
     def logtailrequest(self, event):
+        """Transmit the latest live log messages, optionally filtered by
+        level and emitter"""
+
+        from isomer.logger import LiveLog
+
         self.log("Log requested")
 
+        data = event.data if isinstance(event.data, dict) else {}
+
+        try:
+            limit = int(data.get("limit", 100))
+            level = data.get("level", None)
+            level = None if level is None else int(level)
+            end = data.get("end", None)
+            end = None if end is None else int(end)
+        except (TypeError, ValueError):
+            self.log("Invalid log tail request:", data, lvl=warn)
+            return
+
+        messages = LiveLog.query(limit, level, data.get("emitter", None), end)
+
+        response = {
+            "component": "isomer.debugger",
+            "action": "logtailrequest",
+            "data": messages,
+        }
+        self.fireEvent(send(event.client.uuid, response))
+
     @handler("exception", channel="*", priority=1.0)
     def _on_exception(self, error_type, value, traceback, handler=None, fevent=None):
         # TODO: Generate hashes and thus unique urls with exceptions and fill
@@ -516,6 +689,13 @@ class MemoryLogger(ConfigurableComponent):
         self.snapshot_diffs = deque(maxlen=self.config.snapshot_diffs)
         self.size_diffs = deque(maxlen=self.config.size_diffs)
 
+        registry.gauge("isomer_memory_tracked_bytes",
+                       "Memory size tracked by the memory logger",
+                       callback=lambda: self.size)
+        registry.gauge("isomer_memory_growth_bytes",
+                       "Memory growth during the last snapshot interval",
+                       callback=lambda: self.size_diffs[-1] if self.size_diffs else 0)
+
         if hpy is not None:
             # noinspection PyCallingNonCallable
             self.heapy = hpy()
@@ -653,3 +833,204 @@ class MemoryLogger(ConfigurableComponent):
             )
         )
         self.log("\n%s" % asciichartpy.plot(size_k, config), nc=True)
+
+
+def collapse_stack(frame, max_depth: int = 64) -> str:
+    """Return a frame's call stack in collapsed (flamegraph) notation,
+    outermost caller first"""
+
+    stack = []
+
+    while frame is not None and len(stack) < max_depth:
+        code = frame.f_code
+        stack.append(
+            "%s@%s:%i" % (
+                code.co_name,
+                os.path.basename(code.co_filename),
+                code.co_firstlineno,
+            )
+        )
+        frame = frame.f_back
+
+    return ";".join(reversed(stack)).replace(" ", "_")
+
+
+class StackSampler(threading.Thread):
+    """Periodically records the current call stack of another thread"""
+
+    def __init__(self, thread_id: int, duration: float, interval: float,
+                 max_depth: int = 64):
+        super(StackSampler, self).__init__(name="isomer-profiler", daemon=True)
+
+        self.thread_id = thread_id
+        self.duration = duration
+        self.interval = interval
+        self.max_depth = max_depth
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        self.started = time.monotonic()
+        end = self.started + self.duration
+
+        while not self.stopped.is_set() and time.monotonic() < end:
+            frame = sys._current_frames().get(self.thread_id, None)
+            if frame is None:
+                break
+
+            self.stacks[collapse_stack(frame, self.max_depth)] += 1
+            self.samples += 1
+
+            # Drop the reference, so the sampled frames can be released
+            del frame
+
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """Stop sampling"""
+
+        self.stopped.set()
+
+    def write(self, filename: str):
+        """Write all sampled stacks in collapsed notation, as used by
+        flamegraph.pl, speedscope and similar tools"""
+
+        with open(filename, "w") as f:
+            for stack, amount in self.stacks.most_common():
+                f.write("%s %i\n" % (stack, amount))
+
+    def leaves(self, limit: int = 10) -> list:
+        """Return the functions most often found on top of the stack"""
+
+        result = Counter()
+        for stack, amount in self.stacks.items():
+            result[stack.rsplit(";", 1)[-1]] += amount
+
+        return result.most_common(limit)
+
+
+class Profiler(ConfigurableComponent):
+    """
+    Statistical sampling profiler for the event loop
+    """
+
+    configprops = {
+        "interval": {
+            "type": "number",
+            "title": "Interval",
+            "description": "Default sampling interval in milliseconds",
+            "default": 5,
+        },
+        "duration": {
+            "type": "number",
+            "title": "Duration",
+            "description": "Default sampling duration in seconds",
+            "default": 10,
+        },
+        "max_duration": {
+            "type": "number",
+            "title": "Maximum duration",
+            "description": "Upper limit for sampling durations in seconds",
+            "default": 300,
+        },
+        "max_depth": {
+            "type": "integer",
+            "title": "Maximum stack depth",
+            "description": "Number of stack frames to record per sample",
+            "default": 64,
+        },
+    }
+    channel = "isomer-web"
+
+    def __init__(self, *args):
+        super(Profiler, self).__init__("PROF", *args)
+
+        self.sampler = None
+        self.profiling = False
+        self.lock = threading.Lock()
+
+        try:
+            self.fireEvent(cli_register_event("profile", cli_profile))
+            self.fireEvent(cli_register_event("profile_stop", cli_profile_stop))
+        except AttributeError:
+            pass  # We're running in a test environment and root is not yet running
+
+        self.log("Started")
+
+    @handler("cli_profile")
+    def cli_profile(self, *args):
+        """Sample the event loop's call stacks and write a collapsed stack
+        file"""
+
+        if self.profiling:
+            self.log("Profiler is already running", lvl=warn)
+            return
+
+        try:
+            duration = float(args[0]) if len(args) > 0 else self.config.duration
+            interval = float(args[1]) if len(args) > 1 else self.config.interval
+        except ValueError:
+            self.log("Invalid profiler arguments:", args, lvl=warn)
+            return
+
+        duration = min(duration, self.config.max_duration)
+
+        with self.lock:
+            if self.profiling:
+                self.log("Profiler is already running", lvl=warn)
+                return
+
+            # Handlers are executed on the event loop thread, which is sampled
+            self.sampler = StackSampler(
+                threading.get_ident(), duration, interval / 1000.0,
+                self.config.max_depth
+            )
+            self.profiling = True
+
+        threading.Thread(
+            target=self._profile, args=(self.sampler,), daemon=True
+        ).start()
+
+        self.log("Sampling event loop for %.1f seconds every %.1f ms" % (
+            duration, interval))
+
+    @handler("cli_profile_stop")
+    def cli_profile_stop(self, *args):
+        """Stop a running stack sampler early and write its results"""
+
+        with self.lock:
+            if not self.profiling:
+                self.log("Profiler is not running", lvl=warn)
+                return
+
+            # Also stops samplers, that have not been started, yet
+            self.sampler.stop()
+
+    def _profile(self, sampler):
+        try:
+            sampler.start()
+            sampler.join()
+        finally:
+            with self.lock:
+                self.profiling = False
+
+        from isomer.misc.path import get_path
+
+        try:
+            filename = os.path.join(
+                get_path("cache", "profiles", ensure=True),
+                time.strftime("profile-%Y%m%d-%H%M%S.folded"),
+            )
+            sampler.write(filename)
+        except (IOError, OSError) as e:
+            self.log("Could not write profile:", e, lvl=error)
+            return
+
+        self.log("Wrote %i samples (%i unique stacks) to %s" % (
+            sampler.samples, len(sampler.stacks), filename))
+
+        for leaf, amount in sampler.leaves():
+            self.log("%5.1f%% %s" % (100.0 * amount / max(sampler.samples, 1), leaf))
@@ -91,6 +91,10 @@ EXIT_INSTANCE_UNKNOWN = {"code": 22, "message": ""}
 EXIT_SERVICE_INVALID = {"code": 31, "message": ""}
 EXIT_USER_BAILED_OUT = {"code": 41, "message": ""}
 EXIT_NOTHING_TO_ARCHIVE = {"code": 51, "message": ""}
+EXIT_NO_LOGFILE = {"code": 53, "message": "No structured logfile found"}
+EXIT_INVALID_LOG_QUERY = {"code": 54, "message": "Invalid log query argument"}
+EXIT_UNKNOWN_SCHEMA = {"code": 55, "message": "Schema is not registered"}
+EXIT_NO_SAMPLE_OBJECTS = {"code": 56, "message": "No sample objects stored"}
 
 EXIT_INVALID_PARAMETER = {
     "code": 62,
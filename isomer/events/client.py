@@ -24,7 +24,9 @@ Isomer Client events
 
 from circuits import Event
 
-from isomer.logger import isolog, warn, events
+from isomer import tracing
+from isomer.logger import isolog, shorten, warn, events
+from isomer.events.statistics import count_event
 
 
 class send(Event):
@@ -48,6 +50,9 @@ class send(Event):
         """
         super(send, self).__init__(*args)
 
+        # Responses fired by a traced request's handler continue its trace
+        self.trace = tracing.current
+
         if uuid is None and username is None:
             isolog("[SEND-EVENT] No recipient (uuid/name) given!", lvl=warn)
         self.uuid = uuid
@@ -57,13 +62,14 @@ class send(Event):
         self.raw = raw
         self.fail_quiet = fail_quiet
 
-        isolog(
-            "[CM-EVENT] Send event generated:",
-            uuid,
-            str(packet)[:80],
-            sendtype,
-            lvl=events,
-        )
+        if count_event(self):
+            isolog(
+                "[CM-EVENT] Send event generated:",
+                uuid,
+                shorten(packet, 80),
+                sendtype,
+                lvl=events,
+            )
 
 
 class broadcast(Event):
@@ -83,10 +89,11 @@ class broadcast(Event):
         self.content = content
         self.group = group
 
-        isolog(
-            "[CM-EVENT] Broadcast event generated:", broadcasttype, content, group,
-            lvl=events
-        )
+        if count_event(self):
+            isolog(
+                "[CM-EVENT] Broadcast event generated:", broadcasttype,
+                shorten(content, 80), group, lvl=events
+            )
 
 
 class clientdisconnect(Event):
@@ -105,12 +112,13 @@ class clientdisconnect(Event):
         self.clientuuid = clientuuid
         self.useruuid = useruuid
 
-        isolog(
-            "[CM-EVENT] Client disconnect event generated:",
-            clientuuid,
-            useruuid,
-            lvl=events,
-        )
+        if count_event(self):
+            isolog(
+                "[CM-EVENT] Client disconnect event generated:",
+                clientuuid,
+                useruuid,
+                lvl=events,
+            )
 
 
 class userlogin(Event):
@@ -131,9 +139,11 @@ class userlogin(Event):
         self.client = client
         self.user = user
 
-        isolog(
-            "[CM-EVENT] User login event generated:", clientuuid, useruuid, lvl=events
-        )
+        if count_event(self):
+            isolog(
+                "[CM-EVENT] User login event generated:", clientuuid, useruuid,
+                lvl=events
+            )
 
 
 class userlogout(Event):
@@ -152,7 +162,8 @@ class userlogout(Event):
         self.useruuid = useruuid
         self.clientuuid = clientuuid
 
-        isolog("[CM-EVENT] User logout event generated:", useruuid, lvl=events)
+        if count_event(self):
+            isolog("[CM-EVENT] User logout event generated:", useruuid, lvl=events)
 
 
 class authenticationrequest(Event):
@@ -199,4 +210,5 @@ class authentication(Event):
         self.useruuid = useruuid
         self.sock = sock
 
-        isolog("[AUTH-EVENT] Authentication granted:", self.__dict__, lvl=events)
+        if count_event(self):
+            isolog("[AUTH-EVENT] Authentication granted:", self.__dict__, lvl=events)
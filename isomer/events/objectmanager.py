@@ -32,6 +32,7 @@ Major Isomer event declarations
 from circuits.core import Event
 
 from isomer.logger import isolog, events
+from isomer.events.statistics import count_event
 
 # from isomer.ui.clientobjects import User
 from isomer.events.system import authorized_event
@@ -50,13 +51,14 @@ class objectevent(Event):
         self.schema = schema
         self.client = client
 
-        isolog(
-            "Object event created: ",
-            self.__doc__,
-            self.__dict__,
-            lvl=events,
-            emitter="OBJECT-EVENT",
-        )
+        if count_event(self):
+            isolog(
+                "Object event created: ",
+                self.__doc__,
+                self.__dict__,
+                lvl=events,
+                emitter="OBJECT-EVENT",
+            )
 
 
 class objectchange(objectevent):
@@ -85,13 +87,14 @@ class updatesubscriptions(Event):
         self.schema = schema
         self.data = data
 
-        isolog(
-            "Object event created: ",
-            self.__doc__,
-            self.__dict__,
-            lvl=events,
-            emitter="OBJECT-EVENT",
-        )
+        if count_event(self):
+            isolog(
+                "Object event created: ",
+                self.__doc__,
+                self.__dict__,
+                lvl=events,
+                emitter="OBJECT-EVENT",
+            )
 
 
 class search(authorized_event):
@@ -132,3 +135,23 @@ class remove_role(authorized_event):
 
 class add_role(authorized_event):
     pass
+
+
+class getmany(authorized_event):
+    """A client requests a number of objects at once"""
+
+
+class putmany(authorized_event):
+    """A client stores a number of objects at once"""
+
+
+class changemany(authorized_event):
+    """A client modifies a number of objects at once"""
+
+
+class deletemany(authorized_event):
+    """A client deletes a number of objects at once"""
+
+
+class changeroles(authorized_event):
+    """A client adds or removes a role on a number of objects at once"""
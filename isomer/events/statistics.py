@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: Event statistics
+========================
+
+Counters of constructed events.
+
+Event constructors call :func:`count_event`, which increments a per class
+counter and tells them whether event level logging is enabled at all, so the
+(comparatively expensive) log message is only assembled when it will be
+emitted.
+
+Rates are derived lazily from the counters: every :func:`report` compares
+the counters with those of the previous report.
+
+"""
+
+from collections import defaultdict
+from time import monotonic
+
+from isomer.logger import is_enabled, events
+
+counts = defaultdict(int)
+
+started = monotonic()
+_previous = (started, {})
+
+
+def count_event(event) -> bool:
+    """Count a newly constructed event, returns True if event level logging
+    is enabled
+
+    Subclass constructors may call this after their base class did, each
+    event is only counted once.
+    """
+
+    if not event.__dict__.get("_counted", False):
+        event._counted = True
+        counts[event.__class__] += 1
+
+    return is_enabled(events)
+
+
+def event_name(cls) -> str:
+    """Return the qualified name of an event class"""
+
+    return cls.__module__ + "." + cls.__name__
+
+
+def reset():
+    """Drop all counters"""
+
+    global started
+    global _previous
+
+    counts.clear()
+    started = monotonic()
+    _previous = (started, {})
+
+
+def report(limit: int = None) -> list:
+    """Return (name, total, rate since last report, average rate) tuples of
+    all counted event classes, most frequent first"""
+
+    global _previous
+
+    now = monotonic()
+    previous_time, previous_counts = _previous
+    current = dict(counts)
+
+    interval = max(now - previous_time, 1e-9)
+    runtime = max(now - started, 1e-9)
+
+    result = []
+    for cls, total in current.items():
+        recent = (total - previous_counts.get(cls, 0)) / interval
+        result.append((event_name(cls), total, recent, total / runtime))
+
+    _previous = (now, current)
+
+    result.sort(key=lambda item: item[1], reverse=True)
+
+    return result[:limit] if limit is not None else result
@@ -34,6 +34,7 @@ from typing import Dict
 
 from circuits.core import Event
 from isomer.logger import isolog, events, debug, verbose, hilight
+from isomer.events.statistics import count_event
 
 # from isomer.ui.clientobjects import User
 
@@ -134,6 +135,9 @@ class isomer_event(isomer_basic_event):
 class anonymous_event(isomer_ui_event):
     """Base class for events for logged in users."""
 
+    #: Request trace (see isomer.tracing), set by the clientmanager
+    trace = None
+
     def __init__(self, action, data, client, *args):
         """
         Initializes an Isomer anonymous user interface event.
@@ -150,7 +154,8 @@ class anonymous_event(isomer_ui_event):
         self.action = action
         self.data = data
         self.client = client
-        isolog("AnonymousEvent created:", self.name, lvl=events)
+        if count_event(self):
+            isolog("AnonymousEvent created:", self.name, lvl=events)
 
     @classmethod
     def realname(cls):
@@ -165,6 +170,9 @@ class authorized_event(isomer_ui_event):
 
     roles = ["admin", "crew"]
 
+    #: Request trace (see isomer.tracing), set by the clientmanager
+    trace = None
+
     def __init__(self, user, action, data, client, *args):
         """
         Initializes an Isomer authorized user interface event.
@@ -185,7 +193,8 @@ class authorized_event(isomer_ui_event):
         self.action = action
         self.data = data
         self.client = client
-        isolog("AuthorizedEvent created:", self.name, lvl=events)
+        if count_event(self):
+            isolog("AuthorizedEvent created:", self.name, lvl=events)
 
     @classmethod
     def realname(cls):
@@ -215,7 +224,8 @@ class reload_configuration(isomer_ui_event):
     def __init__(self, target, *args, **kwargs):
         super(reload_configuration, self).__init__(*args, **kwargs)
         self.target = target
-        isolog("Reload of configuration triggered", lvl=events)
+        if count_event(self):
+            isolog("Reload of configuration triggered", lvl=events)
 
 
 # Authenticator Events
@@ -232,12 +242,13 @@ class profilerequest(authorized_event):
         """
         super(profilerequest, self).__init__(*args)
 
-        isolog(
-            "Profile update request: ",
-            self.__dict__,
-            lvl=events,
-            emitter="PROFILE-EVENT",
-        )
+        if count_event(self):
+            isolog(
+                "Profile update request: ",
+                self.__dict__,
+                lvl=events,
+                emitter="PROFILE-EVENT",
+            )
 
 
 # Frontend assembly events
@@ -267,13 +278,20 @@ class logtailrequest(authorized_event):
     pass
 
 
+class handlerstatsrequest(authorized_event):
+    """Request handler latency and event queue statistics"""
+
+    roles = ["admin"]
+
+
 class debugrequest(authorized_event):
     """Debugging event"""
 
     def __init__(self, *args):
         super(debugrequest, self).__init__(*args)
 
-        isolog("Created debugrequest", lvl=events, emitter="DEBUG-EVENT")
+        if count_event(self):
+            isolog("Created debugrequest", lvl=events, emitter="DEBUG-EVENT")
 
 
 asyncapi_template = {
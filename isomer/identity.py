@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: Identity
+================
+
+In-process cache of user identities.
+
+Logins and user targeted messages have to resolve user names to uuids and
+uuids to accounts and profiles. These lookups are answered from memory for
+a limited time (TTL) and explicitly invalidated, when users or profiles are
+changed through the object manager. Accounts changed by other means (e.g.
+the command line tool or other nodes) may be served from the cache until
+their entries expire, so login verification requests fresh accounts to see
+deactivations and password changes immediately. Updates of an account's
+lastlogin field are collected and written to the database in batches.
+
+Cached accounts are shared, use :func:`public_copy` before handing one out
+in modified form.
+
+"""
+
+from time import monotonic
+
+from pymongo import UpdateOne
+
+from isomer.database import objectmodels
+from isomer.logger import isolog, debug
+
+#: Seconds after which cached entries are looked up again
+DEFAULT_TTL = 300
+
+#: Schemata with cached objects
+SCHEMATA = ("user", "profile")
+
+
+def identity_log(*args, **kwargs):
+    """Log as emitter 'IDENTITY'"""
+    kwargs.update({"emitter": "IDENTITY", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+def public_copy(account):
+    """Return a copy of a user account without its password hash"""
+
+    copy = objectmodels["user"](account._fields, from_find=True)
+    copy.passhash = ""
+
+    return copy
+
+
+class IdentityCache(object):
+    """Time limited cache of user accounts and profiles"""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._names = {}
+        self._accounts = {}
+        self._profiles = {}
+        self._lastlogins = {}
+
+    def configure(self, ttl):
+        """Set the time to live of entries and drop all cached entries"""
+
+        self.ttl = ttl
+        self.clear()
+
+    def clear(self):
+        """Drop all cached entries"""
+
+        self._names.clear()
+        self._accounts.clear()
+        self._profiles.clear()
+
+    def _lookup(self, store, key):
+        try:
+            value, expires = store[key]
+        except KeyError:
+            return None
+
+        if expires < monotonic():
+            del store[key]
+            return None
+
+        return value
+
+    def _store(self, store, key, value):
+        store[key] = (value, monotonic() + self.ttl)
+
+    def remember_account(self, account):
+        """Cache a user account"""
+
+        self._store(self._accounts, account.uuid, account)
+        self._store(self._names, account.name, account.uuid)
+
+    def remember_profile(self, useruuid, profile):
+        """Cache the profile of a user"""
+
+        self._store(self._profiles, useruuid, profile)
+
+    def account(self, uuid=None, name=None, fresh=False):
+        """Return a user account by uuid or name, None if there is none.
+        With fresh set, the account is read from the database and the
+        cached entry is replaced."""
+
+        if uuid is None and not fresh:
+            uuid = self._lookup(self._names, name)
+
+        if uuid is not None and not fresh:
+            account = self._lookup(self._accounts, uuid)
+            if account is not None:
+                self.hits += 1
+                return account
+
+        self.misses += 1
+
+        query = {"uuid": uuid} if uuid is not None else {"name": name}
+        account = objectmodels["user"].find_one(query)
+
+        if account is not None:
+            self.remember_account(account)
+        elif uuid is not None:
+            self.invalidate("user", uuid)
+
+        return account
+
+    def profile(self, useruuid):
+        """Return the profile of a user, None if there is none"""
+
+        profile = self._lookup(self._profiles, useruuid)
+        if profile is not None:
+            self.hits += 1
+            return profile
+
+        self.misses += 1
+
+        # TODO: Load active profile, not just any
+        profile = objectmodels["profile"].find_one({"owner": str(useruuid)})
+
+        if profile is not None:
+            self.remember_profile(useruuid, profile)
+
+        return profile
+
+    def invalidate(self, schema=None, uuid=None):
+        """Drop cached entries, either all, those of a schema or those of a
+        single object"""
+
+        if schema is None:
+            self.clear()
+        elif schema == "user":
+            if uuid is None:
+                self._accounts.clear()
+                self._names.clear()
+                return
+
+            self._accounts.pop(uuid, None)
+            for name in [
+                name for name, entry in self._names.items() if entry[0] == uuid
+            ]:
+                del self._names[name]
+        elif schema == "profile":
+            if uuid is None:
+                self._profiles.clear()
+                return
+
+            for owner in [
+                owner for owner, entry in self._profiles.items()
+                if entry[0].uuid == uuid
+            ]:
+                del self._profiles[owner]
+
+    def update_lastlogin(self, account, timestamp):
+        """Note a login, the database is updated by the next :meth:`flush`"""
+
+        account.lastlogin = timestamp
+        self._lastlogins[account.uuid] = timestamp
+
+    def flush(self):
+        """Write collected lastlogin timestamps to the database and return
+        their count"""
+
+        if len(self._lastlogins) == 0:
+            return 0
+
+        pending, self._lastlogins = self._lastlogins, {}
+
+        requests = [
+            UpdateOne({"uuid": uuid}, {"$set": {"lastlogin": timestamp}})
+            for uuid, timestamp in pending.items()
+        ]
+
+        try:
+            objectmodels["user"].collection().bulk_write(requests, ordered=False)
+        except Exception:
+            # Keep them for the next attempt, unless newer logins happened
+            for uuid, timestamp in pending.items():
+                self._lastlogins.setdefault(uuid, timestamp)
+            raise
+
+        identity_log("Stored", len(requests), "lastlogin timestamps", lvl=debug)
+
+        return len(requests)
+
+
+cache = IdentityCache()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module: Instrumentation
+=======================
+
+Opt-in latency instrumentation of event handlers.
+
+Every method decorated with :func:`isomer.component.handler` is wrapped by
+:func:`instrument`. As long as handler statistics are disabled, the wrapper
+only checks a flag. Once enabled, call counts and latencies are recorded per
+handler and per event name into log-linear (HDR style) histograms, together
+with the event queue depth of the handler's root manager.
+
+For handlers that return generators (i.e. circuits tasks), only the initial
+call is measured.
+
+The same wrapper feeds request traces (see :mod:`isomer.tracing`): if the
+handled event carries a trace, the handler's duration is added to it and the
+trace is made the current one while the handler runs.
+
+"""
+
+import time
+from functools import wraps
+
+from isomer import tracing
+
+#: Number of bits used for linear sub-buckets per power of two
+SUB_BUCKET_BITS = 4
+
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class Histogram(object):
+    """Log-linear histogram of non negative integer values
+
+    Values below 2^(SUB_BUCKET_BITS+1) are counted exactly, above that every
+    power of two is divided into SUB_BUCKETS linear buckets, so the relative
+    error stays below 1/SUB_BUCKETS for any magnitude.
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def index(value: int) -> int:
+        """Return the bucket index of a value"""
+
+        if value < SUB_BUCKETS:
+            return value
+
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def bounds(index: int) -> tuple:
+        """Return the lowest and highest value counted in a bucket"""
+
+        if index < SUB_BUCKETS:
+            return index, index
+
+        shift = index // SUB_BUCKETS - 1
+        low = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+
+        return low, low + (1 << shift) - 1
+
+    def record(self, value: int):
+        """Count a value"""
+
+        if value < 0:
+            value = 0
+
+        index = self.index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """Return the (upper bucket bound) value below which the given
+        percentage of all values fall"""
+
+        if self.count == 0:
+            return 0
+
+        threshold = self.count * percent / 100.0
+        seen = 0
+
+        for index, amount in enumerate(self.counts):
+            seen += amount
+            if amount > 0 and seen >= threshold:
+                return min(self.bounds(index)[1], self.max)
+
+        return self.max
+
+    def mean(self) -> float:
+        """Return the arithmetic mean of all values"""
+
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def summary(self) -> dict:
+        """Return count, mean, extremes and common percentiles"""
+
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": round(self.mean(), 1),
+            "min": self.min if self.min is not None else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class HandlerStats(object):
+    """Latency histograms (in microseconds) per handler and per event name
+    and a histogram of observed event queue depths"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded data"""
+
+        self.handlers = {}
+        self.events = {}
+        self.queue_depth = Histogram()
+        self.since = time.time()
+
+    def record(self, handler: str, event: str, duration: float, queue_depth=None):
+        """Record a single handler invocation"""
+
+        latency = int(duration * 1000000)
+
+        try:
+            self.handlers[handler].record(latency)
+        except KeyError:
+            self.handlers[handler] = Histogram()
+            self.handlers[handler].record(latency)
+
+        try:
+            self.events[event].record(latency)
+        except KeyError:
+            self.events[event] = Histogram()
+            self.events[event].record(latency)
+
+        if queue_depth is not None:
+            self.queue_depth.record(queue_depth)
+
+    def report(self, limit: int = None, sort: str = "total") -> dict:
+        """Return summaries of the slowest handlers and events
+
+        :param limit: Maximum number of handlers and events each
+        :param sort: Summary field to order by, e.g. total, p99 or count
+        """
+
+        def summarize(histograms):
+            result = []
+            for name, histogram in histograms.items():
+                summary = histogram.summary()
+                summary["name"] = name
+                result.append(summary)
+
+            result.sort(key=lambda item: item.get(sort, 0), reverse=True)
+
+            return result[:limit] if limit is not None else result
+
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "handlers": summarize(self.handlers),
+            "events": summarize(self.events),
+            "queue_depth": self.queue_depth.summary(),
+        }
+
+
+stats = HandlerStats()
+
+
+def enable_handler_stats(enabled: bool = True):
+    """Switch handler latency recording on or off"""
+
+    stats.enabled = enabled
+
+
+def _queue_depth(component):
+    """Return the length of a component's root manager event queue"""
+
+    try:
+        return len(component.root._queue)
+    except (AttributeError, TypeError):
+        return None
+
+
+def instrument(f):
+    """Wrap a handler function to record its latency while handler
+    statistics are enabled"""
+
+    handler_name = f.__qualname__
+    names = getattr(f, "names", ())
+    event_name = str(names[0]) if len(names) == 1 else f.__name__
+    takes_event = getattr(f, "event", False)
+
+    traces = tracing.traces
+
+    @wraps(f)
+    def instrumented(*args, **kwargs):
+        if not (stats.enabled or traces.enabled):
+            return f(*args, **kwargs)
+
+        event = args[1] if takes_event and len(args) > 1 else None
+        trace = getattr(event, "trace", None)
+
+        if trace is not None:
+            previous = tracing.current
+            tracing.current = trace
+
+        begin = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - begin
+
+            if trace is not None:
+                tracing.current = previous
+                trace.handler(handler_name, begin, duration)
+
+            if stats.enabled:
+                stats.record(
+                    handler_name,
+                    getattr(event, "name", event_name),
+                    duration,
+                    _queue_depth(args[0]) if len(args) > 0 else None,
+                )
+
+    return instrumented
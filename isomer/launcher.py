@@ -64,6 +64,7 @@ from isomer.logger import (
     setup_root,
 )
 from isomer.debugger import cli_register_event
+from isomer.metrics import MetricsController
 from isomer.ui.builder import install_frontend
 from isomer.error import abort, EXIT_NO_CERTIFICATE
 from isomer.tool.etc import load_instance
@@ -202,6 +203,14 @@ class Core(ConfigurableComponent):
             "description": "Option to toggle frontend activation",
             "default": True,
         },
+        "metrics": {
+            "type": "boolean",
+            "title": "Metrics endpoint",
+            "description": "Serve operational metrics on /metrics. The endpoint "
+                           "is not authenticated, restrict access to it via "
+                           "your proxy.",
+            "default": False,
+        },
     }
 
     def __init__(self, name, instance, **kwargs):
@@ -280,6 +289,7 @@ class Core(ConfigurableComponent):
         self._write_config()
 
         self.server = None
+        self.metrics = None
 
         if self.insecure:
             self.log("Not dropping privileges - this may be insecure!", lvl=warn)
@@ -463,6 +473,10 @@ class Core(ConfigurableComponent):
             else:
                 self.log("Could not open port (%i):" % self.port, e, lvl=critical)
 
+        if self.config.metrics and self.metrics is None:
+            self.log("Serving metrics on /metrics")
+            self.metrics = MetricsController().register(self)
+
     def _drop_privileges(self, *args):
         self.log("Dropping privileges", lvl=debug)
         drop_privileges()
@@ -40,6 +40,7 @@ off = 100
 """
 
 # from circuits.core import Event
+import atexit
 import random
 import string
 import pprint
@@ -55,9 +56,15 @@ import time
 import datetime
 import sys
 import inspect
+import threading
 
 import os
 
+from array import array
+from collections import deque
+from heapq import merge
+from queue import Queue, Empty, Full
+
 root = None
 
 temp = 1
@@ -110,8 +117,6 @@ mute = []
 solo = []
 mark = []
 
-LiveLog = []
-
 start = time.time()
 
 
@@ -142,6 +147,50 @@ def get_verbosity():
     return verbosity
 
 
+def is_enabled(lvl: int) -> bool:
+    """Check if messages of a level will be emitted at all. Use this to guard
+    expensive preparation of log messages."""
+
+    return lvl >= verbosity["global"]
+
+
+def is_traced(traceback: bool = False) -> bool:
+    """Check if emitted messages include their source code location"""
+
+    return verbosity["global"] <= debug or traceback
+
+
+class lazy(object):
+    """Defer formatting of a log argument until the message is emitted
+
+    Example: ``isolog("Packet:", lazy(pformat, packet), lvl=debug)``
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def evaluate(self):
+        """Return the deferred value"""
+
+        return self.func(*self.args)
+
+    def __str__(self):
+        return str(self.evaluate())
+
+
+def _shorten(thing, length: int) -> str:
+    return str(thing)[:length]
+
+
+def shorten(thing, length: int = 80) -> lazy:
+    """Deferred string representation of an object, cut to a length"""
+
+    return lazy(_shorten, thing, length)
+
+
 def set_logfile(path: str, instance: str, filename: str = None):
     """
     Specify logfile path
@@ -167,11 +216,515 @@ def get_logfile() -> str:
     return logfile
 
 
+class LogWriter(object):
+    """Buffered logfile writer
+
+    Messages are put into a bounded queue, which a background thread drains
+    into a persistent file handle in batches. The file is flushed when a
+    batch threshold is reached or the flush interval elapsed. If the queue is
+    full, messages are dropped (or, with block set, the caller waits up to one
+    flush interval) and the number of dropped messages is logged afterwards.
+    If the logfile cannot be written, the writer switches to its own
+    temporary emergency logfile.
+
+    With a record format (see :mod:`isomer.logrecords`) set, the writer
+    accepts record tuples of (timestamp, level, emitter, sourceloc, content)
+    instead of lines and encodes them in its own thread. Without an explicit
+    path, structured records are written next to the global logfile.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 0.5,
+        batch_size: int = 256,
+        queue_size: int = 10000,
+        block: bool = False,
+        path: str = None,
+        record_format: str = None,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.block = block
+        self.path = path
+        self.record_format = record_format
+
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.emergency = None
+
+        self._handle = None
+        self._path = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+
+    def write(self, message):
+        """Queue a message (or record tuple) for writing"""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+
+        try:
+            if self.block:
+                self.queue.put(message, timeout=self.flush_interval)
+            else:
+                self.queue.put_nowait(message)
+        except Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until all queued messages are written"""
+
+        if self._thread is None or not self._thread.is_alive():
+            return
+
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Write all queued messages, stop the writer thread and close the
+        file"""
+
+        if self._thread is not None and self._thread.is_alive():
+            self.flush(timeout)
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+        self._close_file()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="isomer-logwriter", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        stop = False
+
+        while not stop:
+            items = []
+            try:
+                items.append(self.queue.get(timeout=self.flush_interval))
+                while len(items) < self.batch_size:
+                    items.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            batch = [item for item in items if isinstance(item, (str, tuple))]
+            markers = [item for item in items if isinstance(item, threading.Event)]
+            stop = None in items
+
+            if len(batch) > 0:
+                self._write(batch)
+                pending += len(batch)
+
+            now = time.monotonic()
+            if (
+                stop
+                or len(markers) > 0
+                or pending >= self.batch_size
+                or now - last_flush >= self.flush_interval
+            ):
+                if pending > 0 and self._handle is not None:
+                    try:
+                        self._handle.flush()
+                    except IOError:
+                        self._close_file()
+                pending = 0
+                last_flush = now
+
+            for marker in markers:
+                marker.set()
+
+        self._close_file()
+
+    def _take_dropped(self) -> int:
+        with self._dropped_lock:
+            dropped = self.dropped
+            self.dropped = 0
+
+        return dropped
+
+    def _encode(self, lines: list):
+        dropped = self._take_dropped()
+
+        if self.record_format is None:
+            if dropped > 0:
+                lines.insert(0, "[LOGGER] Dropped %i log messages" % dropped)
+
+            return "\n".join(lines) + "\n"
+
+        from isomer.logrecords import encode_record
+
+        if dropped > 0:
+            lines.insert(
+                0,
+                (time.time(), warn, "LOGGER", None,
+                 "Dropped %i log messages" % dropped),
+            )
+
+        return b"".join(encode_record(self.record_format, *line) for line in lines)
+
+    def _write(self, lines: list):
+        data = self._encode(lines)
+
+        while True:
+            handle = self._open()
+            if handle is None:
+                return
+
+            try:
+                handle.write(data)
+                return
+            except IOError:
+                self._close_file()
+                if not self._use_emergency_logfile():
+                    return
+
+    def _target(self) -> str:
+        if self.path is not None:
+            return self.path
+
+        filename = logfile if self.emergency is None else self.emergency
+
+        if self.record_format is not None:
+            return "%s.%s" % (filename, self.record_format)
+
+        return filename
+
+    def _open(self):
+        target = self._target()
+
+        if self._handle is not None and self._path == target:
+            return self._handle
+
+        self._close_file()
+
+        while True:
+            try:
+                if self.record_format is None:
+                    self._handle = open(target, "a")
+                else:
+                    from isomer.logrecords import file_header
+
+                    self._handle = open(target, "ab")
+                    if self._handle.tell() == 0:
+                        self._handle.write(file_header(self.record_format))
+                self._path = target
+
+                return self._handle
+            except IOError:
+                if not self._use_emergency_logfile():
+                    return None
+                target = self._target()
+
+    def _close_file(self):
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except IOError:
+                pass
+
+        self._handle = None
+        self._path = None
+
+    def _use_emergency_logfile(self) -> bool:
+        """Switch this writer to a temporary logfile, returns False if that
+        did not work before or an explicit path is set"""
+
+        print("Cannot open logfile '%s' for writing" % self._target())
+
+        if self.path is not None:
+            return False
+
+        if self.emergency is not None:
+            print(
+                "Safe temporary logging is not working either, "
+                "giving up on file logging"
+            )
+            return False
+
+        self.emergency = os.path.join(
+            tempfile.mkdtemp(prefix="isomer_"), "emergency_log"
+        )
+        print("Logging to temporary logfile '%s'" % self._target())
+
+        return True
+
+
+writer = LogWriter()
+
+
+def set_logwriter(
+    flush_interval: float = 0.5,
+    batch_size: int = 256,
+    queue_size: int = 10000,
+    block: bool = False,
+):
+    """Configure buffering of logfile output, queued messages are written
+    before the new settings take effect"""
+
+    global writer
+
+    writer.close()
+    writer = LogWriter(flush_interval, batch_size, queue_size, block)
+
+
+structured = None
+
+
+def set_structured_log(record_format: str = None, path: str = None):
+    """Additionally write structured log records (ndjson or binary) to path
+    or next to the logfile, None disables structured logging"""
+
+    global structured
+
+    if structured is not None:
+        structured.close()
+        structured = None
+
+    if record_format is not None:
+        structured = LogWriter(path=path, record_format=record_format)
+
+
+@atexit.register
+def _close_logwriter():
+    writer.close()
+    if structured is not None:
+        structured.close()
+
+
+class LogBuffer(object):
+    """Fixed capacity ring buffer of recent log messages
+
+    Timestamps, levels and message counters are stored in compact arrays,
+    emitter names are interned into a table. Per level and per emitter
+    indices of message sequence numbers allow answering queries like "the
+    last 10 errors of emitter X" without scanning the whole buffer.
+
+    Overwritten messages are removed from the indices right away and the
+    table ids of emitters without any stored message are reused, so memory
+    use stays bounded by the capacity.
+
+    Entries are returned as lists of
+    ``[isoformat time, level, runtime, counter, emitter, content]``.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+
+        self.timestamps = array("d", [0.0]) * capacity
+        self.levels = array("B", [0]) * capacity
+        self.counters = array("q", [0]) * capacity
+        self.emitters = array("I", [0]) * capacity
+        self.contents = [None] * capacity
+
+        self.emitter_names = []
+        self.emitter_ids = {}
+        self.free_ids = []
+
+        self.by_level = {}
+        self.by_emitter = {}
+
+        self.written = 0
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def __iter__(self):
+        for sequence in range(self.written - len(self), self.written):
+            yield self._entry(sequence)
+
+    def __contains__(self, entry):
+        return any(stored == entry for stored in self)
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return "<LogBuffer %i/%i messages>" % (len(self), self.capacity)
+
+    def __getitem__(self, index: int):
+        length = len(self)
+
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("Log buffer index out of range")
+
+        return self._entry(self.written - length + index)
+
+    def clear(self):
+        """Remove all messages"""
+
+        self.by_level.clear()
+        self.by_emitter.clear()
+        self.emitter_names = []
+        self.emitter_ids.clear()
+        self.free_ids = []
+        self.contents = [None] * self.capacity
+        self.written = 0
+
+    def append(self, timestamp: float, lvl: int, counter: int, emitter: str,
+               content: str):
+        """Store a message, overwriting the oldest one if the buffer is full"""
+
+        sequence = self.written
+        slot = sequence % self.capacity
+
+        if sequence >= self.capacity:
+            self._drop(slot)
+
+        emitter_id = self.emitter_ids.get(emitter, None)
+        if emitter_id is None:
+            if len(self.free_ids) > 0:
+                emitter_id = self.free_ids.pop()
+                self.emitter_names[emitter_id] = emitter
+            else:
+                emitter_id = len(self.emitter_names)
+                self.emitter_names.append(emitter)
+            self.emitter_ids[emitter] = emitter_id
+
+        self.timestamps[slot] = timestamp
+        self.levels[slot] = lvl
+        self.counters[slot] = counter
+        self.emitters[slot] = emitter_id
+        self.contents[slot] = content
+
+        self._index(self.by_level, lvl, sequence)
+        self._index(self.by_emitter, emitter_id, sequence)
+
+        self.written += 1
+
+    def _drop(self, slot: int):
+        """Remove the oldest message, which is about to be overwritten in
+        the given slot, from the indices"""
+
+        lvl = self.levels[slot]
+        emitter_id = self.emitters[slot]
+
+        self._unindex(self.by_level, lvl)
+
+        if self._unindex(self.by_emitter, emitter_id):
+            name = self.emitter_names[emitter_id]
+            del self.emitter_ids[name]
+            self.emitter_names[emitter_id] = None
+            self.free_ids.append(emitter_id)
+
+    @staticmethod
+    def _unindex(index: dict, key) -> bool:
+        """Remove the oldest sequence of a key, returns True if no sequences
+        are left"""
+
+        entries = index.get(key, None)
+        if entries is None:
+            return False
+
+        if len(entries) > 0:
+            entries.popleft()
+
+        if len(entries) == 0:
+            del index[key]
+            return True
+
+        return False
+
+    @staticmethod
+    def _index(index: dict, key, sequence: int):
+        entries = index.get(key, None)
+        if entries is None:
+            entries = index[key] = deque()
+
+        entries.append(sequence)
+
+    def _entry(self, sequence: int) -> list:
+        slot = sequence % self.capacity
+        timestamp = self.timestamps[slot]
+
+        return [
+            datetime.datetime.fromtimestamp(timestamp).isoformat(),
+            self.levels[slot],
+            timestamp - start,
+            self.counters[slot],
+            self.emitter_names[self.emitters[slot]],
+            self.contents[slot],
+        ]
+
+    def _sequences(self, entries):
+        oldest = self.written - self.capacity
+
+        while len(entries) > 0 and entries[0] < oldest:
+            entries.popleft()
+
+        for sequence in reversed(entries):
+            if sequence < oldest:
+                break
+            yield sequence
+
+    def query(self, limit: int = None, min_level: int = None,
+              emitter: str = None, end: int = None) -> list:
+        """Return the latest matching messages, newest first
+
+        :param limit: Maximum number of messages
+        :param min_level: Only return messages of at least this level
+        :param emitter: Only return messages of this emitter
+        :param end: Only return messages older than this counter value
+        """
+
+        if emitter is not None:
+            emitter_id = self.emitter_ids.get(emitter, None)
+            if emitter_id is None:
+                return []
+            sequences = self._sequences(self.by_emitter.get(emitter_id, ()))
+        elif min_level is not None:
+            sequences = merge(
+                *[
+                    self._sequences(entries)
+                    for lvl, entries in self.by_level.items()
+                    if lvl >= min_level
+                ],
+                reverse=True
+            )
+        else:
+            sequences = reversed(range(self.written - len(self), self.written))
+
+        result = []
+
+        for sequence in sequences:
+            slot = sequence % self.capacity
+
+            if emitter is not None and min_level is not None:
+                if self.levels[slot] < min_level:
+                    continue
+            if end is not None and self.counters[slot] >= end:
+                continue
+
+            result.append(self._entry(sequence))
+
+            if limit is not None and len(result) >= limit:
+                break
+
+        return result
+
+
+LiveLog = LogBuffer()
+
+
 def clear():
     """Clear the live log"""
-    global LiveLog
 
-    LiveLog = []
+    LiveLog.clear()
 
 
 def is_muted(what) -> bool:
@@ -254,6 +807,8 @@ def isolog(*what, **kwargs):
 
         for thing in things:
             result += " "
+            if isinstance(thing, lazy):
+                thing = thing.evaluate()
             if kwargs.get("pretty", False) and not isinstance(thing, str):
                 result += "\n" + pprint.pformat(thing)
             else:
@@ -261,37 +816,6 @@ def isolog(*what, **kwargs):
 
         return result
 
-    def write_to_log(message: str):
-        global logfile
-
-        while True:
-            try:
-                f = open(logfile, "a")
-                f.write(message + "\n")
-                f.flush()
-                f.close()
-
-                break
-            except IOError:
-                global log_emergency
-                print("Cannot open logfile '%s' for writing" % logfile)
-
-                if log_emergency is True:
-                    print(
-                        "Safe temporary logging is not working either, "
-                        "giving up on file logging"
-                    )
-                    break
-
-                logfile = os.path.join(
-                    tempfile.mkdtemp(prefix="isomer_"),
-                    "emergency_log"
-                )
-                print("Logging to temporary logfile '%s'" % logfile)
-                log_emergency = True
-
-                continue
-
     def write_to_console(message: str):
         try:
             print(message)
@@ -317,7 +841,7 @@ def isolog(*what, **kwargs):
     if exception:
         exc_type, exc_obj, exc_tb = sys.exc_info()  # NOQA
 
-    if verbosity["global"] <= debug or traceback:
+    if is_traced(traceback):
         # Automatically log the current function details.
 
         if "sourceloc" not in kwargs:
@@ -362,10 +886,11 @@ def isolog(*what, **kwargs):
             msg += "%s" % callee
 
     content = assemble_things(what)
-    msg += content
 
     if exception:
-        msg += "\n" + "".join(format_exception(exc_type, exc_obj, exc_tb))
+        content += "\n" + "".join(format_exception(exc_type, exc_obj, exc_tb))
+
+    msg += content
 
     if is_muted(msg):
         return
@@ -374,7 +899,9 @@ def isolog(*what, **kwargs):
         msg = msg[:1000]
 
     if lvl >= verbosity["file"]:
-        write_to_log(msg)
+        writer.write(msg)
+        if structured is not None:
+            structured.write((timestamp, lvl, emitter, callee, content.lstrip(" ")))
 
     if is_marked(msg):
         lvl = hilight
@@ -386,5 +913,4 @@ def isolog(*what, **kwargs):
         write_to_console(output)
 
     if live:
-        item = [now, lvl, runtime, count, emitter, str(content)]
-        LiveLog.append(item)
+        LiveLog.append(timestamp, lvl, count, emitter, str(content))
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module: Log Records
+===================
+
+Structured log record formats and an offline reader.
+
+Two formats are supported:
+
+* ``ndjson``: One JSON object per line, with the timestamp as first key
+* ``binary``: Length prefixed records after a file magic
+
+Each record contains timestamp, level, emitter, source location and content.
+The reader memory-maps a logfile and keeps a sparse index of record offsets
+and timestamps in a sidecar file (``<logfile>.idx``), which is extended
+incrementally, so time range queries only need to scan matching records.
+
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+
+formats = ("ndjson", "binary")
+
+MAGIC = b"ISOLOG1\n"
+
+#: Record length, timestamp, level, emitter length, source location length
+HEADER = struct.Struct("<IdBHH")
+
+#: Every n'th record is put into the sparse time index
+INDEX_STRIDE = 256
+
+
+def encode_record(record_format, timestamp, lvl, emitter, sourceloc, content):
+    """Encode a single log record"""
+
+    if sourceloc is None:
+        sourceloc = ""
+
+    if record_format == "ndjson":
+        # The timestamp has to stay the first key, the reader relies on that
+        return (
+            json.dumps(
+                {
+                    "t": timestamp,
+                    "l": lvl,
+                    "e": emitter,
+                    "s": sourceloc,
+                    "c": content,
+                },
+                ensure_ascii=False,
+            ).encode("utf-8")
+            + b"\n"
+        )
+
+    emitter = emitter.encode("utf-8")
+    sourceloc = sourceloc.encode("utf-8")
+    content = content.encode("utf-8")
+
+    length = HEADER.size + len(emitter) + len(sourceloc) + len(content)
+
+    return (
+        HEADER.pack(length, timestamp, lvl, len(emitter), len(sourceloc))
+        + emitter
+        + sourceloc
+        + content
+    )
+
+
+def file_header(record_format):
+    """Return the bytes a new logfile of a format starts with"""
+
+    return MAGIC if record_format == "binary" else b""
+
+
+class LogReader(object):
+    """Query structured logfiles by time range, level and emitter"""
+
+    def __init__(self, path, use_index=True):
+        self.path = path
+        self.use_index = use_index
+
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+
+        if size == 0:
+            self.data = b""
+        else:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.binary = self.data[: len(MAGIC)] == MAGIC
+        self.start = len(MAGIC) if self.binary else 0
+
+        self.offsets = array("q")
+        self.timestamps = array("d")
+
+    def close(self):
+        """Release the memory map and file"""
+
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _next(self, offset):
+        """Return the offset of the record following the one at offset"""
+
+        if self.binary:
+            length = HEADER.unpack_from(self.data, offset)[0]
+            return offset + length
+
+        end = self.data.find(b"\n", offset)
+        return len(self.data) if end == -1 else end + 1
+
+    def _timestamp(self, offset):
+        if self.binary:
+            return HEADER.unpack_from(self.data, offset)[1]
+
+        # Lines start with '{"t": <timestamp>,'
+        end = self.data.find(b",", offset)
+        return float(self.data[offset + 6:end])
+
+    def _complete(self, offset):
+        """Check if a complete record starts at offset"""
+
+        if self.binary:
+            if offset + HEADER.size > len(self.data):
+                return False
+            return offset + HEADER.unpack_from(self.data, offset)[0] <= len(self.data)
+
+        return self.data.find(b"\n", offset) != -1
+
+    def _index_path(self):
+        return self.path + ".idx"
+
+    def _valid_entry(self, position):
+        offset = self.offsets[position]
+
+        return self._complete(offset) and (
+            self._timestamp(offset) == self.timestamps[position]
+        )
+
+    def _load_index(self):
+        offsets = array("q")
+        timestamps = array("d")
+
+        try:
+            with open(self._index_path(), "rb") as f:
+                count = os.fstat(f.fileno()).st_size // 16
+                offsets.fromfile(f, count)
+                timestamps.fromfile(f, count)
+        except (IOError, OSError, EOFError):
+            return
+
+        self.offsets = offsets
+        self.timestamps = timestamps
+
+        # A rotated or truncated logfile invalidates the index
+        if count == 0 or not (self._valid_entry(0) and self._valid_entry(-1)):
+            self.offsets = array("q")
+            self.timestamps = array("d")
+
+    def _save_index(self):
+        try:
+            with open(self._index_path(), "wb") as f:
+                self.offsets.tofile(f)
+                self.timestamps.tofile(f)
+        except (IOError, OSError):
+            pass
+
+    def build_index(self):
+        """Extend the sparse time index over records not yet indexed"""
+
+        if self.use_index and len(self.offsets) == 0:
+            self._load_index()
+
+        # Continue scanning at the last indexed record, which is indexed again
+        if len(self.offsets) > 0:
+            offset = self.offsets.pop()
+            self.timestamps.pop()
+        else:
+            offset = self.start
+
+        records = len(self.offsets) * INDEX_STRIDE
+
+        while self._complete(offset):
+            if records % INDEX_STRIDE == 0:
+                self.offsets.append(offset)
+                self.timestamps.append(self._timestamp(offset))
+
+            offset = self._next(offset)
+            records += 1
+
+        if self.use_index:
+            self._save_index()
+
+    def _decode(self, offset, end):
+        if self.binary:
+            (length, timestamp, lvl, emitter_length,
+             sourceloc_length) = HEADER.unpack_from(self.data, offset)
+            position = offset + HEADER.size
+            emitter = self.data[position:position + emitter_length]
+            position += emitter_length
+            sourceloc = self.data[position:position + sourceloc_length]
+            position += sourceloc_length
+
+            return {
+                "t": timestamp,
+                "l": lvl,
+                "e": emitter.decode("utf-8", errors="replace"),
+                "s": sourceloc.decode("utf-8", errors="replace"),
+                "c": self.data[position:end].decode("utf-8", errors="replace"),
+            }
+
+        return json.loads(self.data[offset:end])
+
+    def _matches(self, offset, min_level, emitter):
+        """Check level and emitter of a binary record without decoding it"""
+
+        (_, _, lvl, emitter_length, _) = HEADER.unpack_from(self.data, offset)
+
+        if min_level is not None and lvl < min_level:
+            return False
+
+        if emitter is not None:
+            position = offset + HEADER.size
+            if self.data[position:position + emitter_length] != emitter:
+                return False
+
+        return True
+
+    def query(self, start=None, end=None, min_level=None, emitter=None, limit=None):
+        """Iterate over all records in a time range with at least a level and
+        optionally of one emitter"""
+
+        if len(self.data) == 0:
+            return
+
+        self.build_index()
+
+        offset = self.start
+        if start is not None and len(self.timestamps) > 0:
+            position = bisect_right(self.timestamps, start) - 1
+            if position >= 0:
+                offset = self.offsets[position]
+
+        encoded_emitter = None if emitter is None else emitter.encode("utf-8")
+        found = 0
+
+        while self._complete(offset):
+            following = self._next(offset)
+            timestamp = self._timestamp(offset)
+
+            if end is not None and timestamp > end:
+                break
+
+            if start is None or timestamp >= start:
+                if self.binary:
+                    if self._matches(offset, min_level, encoded_emitter):
+                        yield self._decode(offset, following)
+                        found += 1
+                else:
+                    record = self._decode(offset, following)
+                    if (min_level is None or record["l"] >= min_level) and (
+                        emitter is None or record["e"] == emitter
+                    ):
+                        yield record
+                        found += 1
+
+                if limit is not None and found >= limit:
+                    break
+
+            offset = following
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module: Metrics
+===============
+
+Registry of operational metrics with a Prometheus style text exposition.
+
+Components register counters, gauges and histograms in the global
+:data:`registry`. Gauges can be backed by a callback, which is evaluated only
+when the metrics are collected, so e.g. connection counts cost nothing until
+they are scraped. Registering a metric name again returns the existing metric,
+so restarted components keep their series.
+
+The node serves the exposition through :class:`MetricsController`, if
+enabled in the core configuration.
+
+"""
+
+import threading
+from math import inf
+
+from circuits.web import Controller
+
+from isomer.logger import isolog, warn
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#: Default histogram buckets, suitable for latencies in seconds
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0
+)
+
+
+def metrics_log(*args, **kwargs):
+    """Log as emitter 'METRICS'"""
+    kwargs.update({"emitter": "METRICS", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('%s="%s"' % extra)
+
+    return "{%s}" % ",".join(pairs) if len(pairs) > 0 else ""
+
+
+class Metric(object):
+    """Base class of all metric types"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, label values, extra label, value) tuples"""
+
+        for key, value in list(self.values.items()):
+            yield "", key, None, value
+
+    def expose(self) -> str:
+        """Return the text exposition of this metric"""
+
+        lines = [
+            "# HELP %s %s" % (self.name, _escape(self.documentation)),
+            "# TYPE %s %s" % (self.name, self.kind),
+        ]
+
+        for suffix, key, extra, value in self.samples():
+            lines.append(
+                "%s%s%s %s" % (
+                    self.name,
+                    suffix,
+                    _format_labels(self.labelnames, key, extra),
+                    _format_value(value),
+                )
+            )
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter"""
+
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Return the current value"""
+
+        return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value that can go up and down, optionally computed by a callback
+
+    A callback either returns a number or, for labelled gauges, a dictionary
+    of label value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        """Set the gauge to a value"""
+
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        """Increase the gauge"""
+
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Decrease the gauge"""
+
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        """Return the current value"""
+
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.callback is None:
+            yield from super(Gauge, self).samples()
+            return
+
+        try:
+            result = self.callback()
+        except Exception as e:
+            metrics_log("Gauge callback of", self.name, "failed:", e, lvl=warn)
+            return
+
+        if isinstance(result, dict):
+            for key, value in result.items():
+                if not isinstance(key, tuple):
+                    key = (key,)
+                yield "", key, None, value
+        else:
+            yield "", (), None, result
+
+
+class Histogram(Metric):
+    """Distribution of observed values over cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (inf,)
+
+    def observe(self, value, **labels):
+        """Record an observed value"""
+
+        key = self._key(labels)
+
+        with self._lock:
+            try:
+                counts, total = self.values[key]
+            except KeyError:
+                counts, total = [0] * len(self.buckets), 0
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        for key, (counts, total) in list(self.values.items()):
+            cumulative = 0
+            for bound, amount in zip(self.buckets, counts):
+                cumulative += amount
+                yield "_bucket", key, ("le", _format_value(bound)), cumulative
+
+            yield "_sum", key, None, total
+            yield "_count", key, None, cumulative
+
+
+class Registry(object):
+    """Collection of named metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name, None)
+
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already registered as %s" % (
+                    name, metric.kind))
+
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Return the counter of a name, registering it if necessary"""
+
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=(),
+              callback=None) -> Gauge:
+        """Return the gauge of a name, registering it if necessary. A given
+        callback replaces a previously registered one."""
+
+        metric = self._get_or_create(Gauge, name, documentation, labelnames)
+        if callback is not None:
+            metric.callback = callback
+
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(),
+                  buckets=LATENCY_BUCKETS) -> Histogram:
+        """Return the histogram of a name, registering it if necessary"""
+
+        return self._get_or_create(Histogram, name, documentation, labelnames,
+                                   buckets=buckets)
+
+    def unregister(self, name: str):
+        """Remove a metric"""
+
+        with self._lock:
+            self.metrics.pop(name, None)
+
+    def expose(self) -> str:
+        """Return the text exposition of all metrics"""
+
+        return "\n".join(
+            self.metrics[name].expose() for name in sorted(self.metrics)
+        ) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsController(Controller):
+    """Serves the metrics registry's text exposition"""
+
+    channel = "/metrics"
+
+    def index(self):
+        """Return all metrics"""
+
+        self.response.headers["Content-Type"] = CONTENT_TYPE
+
+        return registry.expose()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: Permissions
+===================
+
+Compiled role based access control evaluation for stored objects.
+
+The schemastore builder compiles every schema's creation roles and special
+checks once into a :class:`SchemaPermissions` entry. Object permission
+checks then only need set operations on these entries and the object's own
+permission lists. Decisions are cached per role set, schema, action and
+permission list, so listing thousands of objects with identical permissions
+costs one evaluation. As the cache key contains all inputs of a decision,
+cached decisions never need to be invalidated.
+
+"""
+
+from functools import lru_cache
+
+from isomer.logger import isolog, debug
+
+#: Upper bound for cached decisions, least recently used ones are dropped
+CACHE_SIZE = 10000
+
+
+def permission_log(*args, **kwargs):
+    """Log as emitter 'PERMISSIONS'"""
+    kwargs.update({"emitter": "PERMISSIONS", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+def _as_roles(roles):
+    """Normalize a role specification (single role or list) to a frozenset"""
+
+    if roles is None:
+        return frozenset()
+    if isinstance(roles, str):
+        return frozenset([roles])
+
+    return frozenset(roles)
+
+
+class SchemaPermissions(object):
+    """Precompiled permission data of a single schema"""
+
+    __slots__ = ("name", "roles_create", "specials")
+
+    def __init__(self, name, store_entry):
+        schema = store_entry.get("schema", {})
+
+        self.name = name
+        self.roles_create = _as_roles(schema.get("roles_create", None))
+        self.specials = dict(store_entry.get("specials", None) or {})
+
+    def __repr__(self):
+        return "<SchemaPermissions %s create=%s specials=%s>" % (
+            self.name,
+            sorted(self.roles_create),
+            sorted(self.specials.keys()),
+        )
+
+
+def compile_permissions(store):
+    """Compile the permission data of all schemata in a schemastore"""
+
+    result = {}
+
+    for name, entry in store.items():
+        result[name] = SchemaPermissions(name, entry)
+
+    permission_log("Compiled permissions of", len(result), "schemata", lvl=debug)
+
+    return result
+
+
+def get_compiled(schema):
+    """Return the compiled permissions of a schema, compiling on demand"""
+
+    from isomer import schemastore
+
+    compiled = schemastore.permissionstore.get(schema, None)
+    if compiled is None:
+        compiled = SchemaPermissions(schema, schemastore.schemastore[schema])
+        schemastore.permissionstore[schema] = compiled
+
+    return compiled
+
+
+def get_fields(obj):
+    """Return the raw field dictionary of a model instance or a plain document"""
+
+    if isinstance(obj, dict):
+        return obj
+
+    return obj._fields
+
+
+def get_roles(subject):
+    """Return the roles of a user as frozenset"""
+
+    return _as_roles(subject.account.roles)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _decide(roles, schema, action, allowed):
+    """Cached check, if any of the roles is in the allowed list"""
+
+    return not roles.isdisjoint(allowed)
+
+
+def check_permissions(schema, subject, action, obj, roles=None):
+    """Check if a subject may execute an action on a stored object
+
+    :param schema: Name of the object's schema
+    :param subject: User object (with account and uuid)
+    :param action: One of read, write or list
+    :param obj: Model instance or plain document dictionary
+    :param roles: Optional precomputed role set of the subject
+    """
+
+    if roles is None:
+        roles = get_roles(subject)
+
+    fields = get_fields(obj)
+    perms = fields.get("perms", None)
+
+    # Objects without permissions are administrative objects
+    if perms is None:
+        return "admin" in roles
+
+    compiled = get_compiled(schema)
+
+    action_check = compiled.specials.get(action, None)
+    if action_check is not None:
+        if action_check(obj, subject.account.roles) is False:
+            return False
+
+    allowed = perms.get(action, ())
+
+    if "owner" in allowed and subject.uuid == fields.get("owner", None):
+        return True
+
+    if not isinstance(allowed, tuple):
+        allowed = tuple(allowed)
+
+    return _decide(roles, schema, action, allowed)
+
+
+def permission_filter(subject, action, roles=None):
+    """Translate a subject's roles into a database query that only matches
+    objects the subject may execute the given action on
+
+    Special action checks of schemata cannot be expressed as query and have
+    to be evaluated separately.
+    """
+
+    if roles is None:
+        roles = get_roles(subject)
+
+    field = "perms." + action
+
+    alternatives = [
+        {field: {"$in": sorted(roles)}},
+        {field: "owner", "owner": str(subject.uuid)},
+    ]
+
+    if "admin" in roles:
+        alternatives.append({"perms": {"$exists": False}})
+
+    return {"$or": alternatives}
+
+
+def check_create_permission(schema, subject, roles=None):
+    """Check if a subject may create new objects of a schema"""
+
+    if roles is None:
+        roles = get_roles(subject)
+
+    return not roles.isdisjoint(get_compiled(schema).roles_create)
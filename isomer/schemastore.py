@@ -29,6 +29,7 @@ from json import dumps
 
 from isomer.logger import isolog, verbose, warn, debug
 from isomer.misc import all_languages, i18n as _
+from isomer.permissions import compile_permissions
 
 
 def schemata_log(*args, **kwargs):
@@ -41,6 +42,7 @@ schemastore = {}
 l10n_schemastore = {}
 restrictions = {}
 configschemastore = {}
+permissionstore = {}
 
 
 def build_schemastore_new():
@@ -220,6 +222,12 @@ def build_l10n_schemastore(available):
     return l10n_schemata
 
 
+def build_permissionstore(available):
+    """Compile the RBAC data of all schemata for fast permission checks"""
+
+    return compile_permissions(available)
+
+
 def test_schemata():
     """Validates all registered schemata"""
 
@@ -36,8 +36,8 @@ import click
 from click_didyoumean import DYMGroup
 from click_plugins import with_plugins
 from pkg_resources import iter_entry_points
-from isomer.logger import set_logfile, set_color, set_verbosity, warn, verbose, \
-    critical, debug
+from isomer.logger import set_logfile, set_logwriter, set_structured_log, \
+    set_color, set_verbosity, warn, verbose, critical, debug
 from isomer.misc.path import get_log_path, set_etc_path, set_instance, set_prefix_path
 from isomer.tool import log
 from isomer.tool.defaults import (
@@ -98,6 +98,26 @@ RPI_GPIO_CHANNEL = 5
 @click.option("--no-log", default=False, is_flag=True, help="Do not log to file")
 @click.option("--log-path", default=None, help="Logfile path")
 @click.option("--log-file", default=None, help="Logfile name")
+@click.option(
+    "--log-flush",
+    default=None,
+    type=float,
+    help="Maximum delay in seconds before buffered log lines are written",
+    metavar="<seconds>",
+)
+@click.option(
+    "--log-batch",
+    default=None,
+    type=int,
+    help="Number of buffered log lines that trigger writing",
+    metavar="<lines>",
+)
+@click.option(
+    "--log-structured",
+    default=None,
+    type=click.Choice(["ndjson", "binary"]),
+    help="Additionally write structured log records next to the logfile",
+)
 @click.option("--dbhost", default=None, help=db_host_help, metavar=db_host_metavar)
 @click.option("--dbname", default=None, help=db_help, metavar=db_metavar)
 @click.option("--prefix-path", "-p", default=None, help="Use different system prefix")
@@ -116,6 +136,9 @@ def cli(
         no_log,
         log_path,
         log_file,
+        log_flush,
+        log_batch,
+        log_structured,
         dbhost,
         dbname,
         prefix_path,
@@ -162,6 +185,15 @@ def cli(
         if log_path is not None or log_file is not None:
             set_logfile(log_path, instance, log_file)
 
+        if log_flush is not None or log_batch is not None:
+            set_logwriter(
+                flush_interval=log_flush if log_flush is not None else 0.5,
+                batch_size=log_batch if log_batch is not None else 256,
+            )
+
+        if log_structured is not None and not no_log:
+            set_structured_log(log_structured)
+
         if no_colors is False:
             set_color()
 
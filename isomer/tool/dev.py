@@ -44,7 +44,7 @@ from isomer.tool import log, ask, run_process, finish
 from isomer.tool.templates import write_template_file
 from isomer.logger import debug, verbose, warn
 from isomer.misc.std import std_table
-from isomer.error import abort
+from isomer.error import abort, EXIT_UNKNOWN_SCHEMA, EXIT_NO_SAMPLE_OBJECTS
 from isomer.ui.store.inventory import populate_store, get_inventory
 from isomer.ui.builder import get_components
 from isomer.events.system import generate_asyncapi
@@ -320,6 +320,61 @@ def export_schemata(ctx, output_path, output_format, no_entity_mode, include_met
     finish(ctx)
 
 
+@dev.command(short_help="benchmark json codecs")
+@click.option("--schema", "-s", help="Schema of sample objects", default="user")
+@click.option("--count", "-c", help="Number of sample objects", default=100)
+@click.option("--rounds", "-r", help="Number of benchmark rounds", default=100)
+@click.pass_context
+def benchmark_codecs(ctx, schema, count, rounds):
+    """Compare the installed websocket JSON codecs on objectmanager packets
+
+    Sample objects are taken from the database. Get, list and update packets
+    are built from them, just like the objectmanager does.
+    """
+
+    from isomer import database
+    from isomer.ui.clientmanager.encoder import benchmark_codecs as benchmark
+
+    database.initialize(ctx.obj["dbhost"], ctx.obj["dbname"])
+
+    if schema not in database.objectmodels:
+        log("Unknown schema:", schema, lvl=warn)
+        abort(EXIT_UNKNOWN_SCHEMA)
+
+    objects = [
+        item.serializablefields()
+        for item in database.objectmodels[schema].find({}, limit=count)
+    ]
+
+    if len(objects) == 0:
+        log("No objects of schema", schema, "stored", lvl=warn)
+        abort(EXIT_NO_SAMPLE_OBJECTS)
+
+    component = "isomer.events.objectmanager"
+    payloads = [
+        {"component": component, "action": "get",
+         "data": {"schema": schema, "uuid": item["uuid"], "object": item}}
+        for item in objects
+    ]
+    payloads += [
+        {"component": component, "action": "update",
+         "data": {"schema": schema, "uuid": item["uuid"], "object": item}}
+        for item in objects
+    ]
+    payloads.append({"component": component, "action": "getlist",
+                     "data": {"schema": schema, "list": objects}})
+
+    result = namedtuple("result", ["codec", "encoding_ms", "decoding_ms", "bytes"])
+    results = [
+        result(name, "%.3f" % (encoding * 1000), "%.3f" % (decoding * 1000), size)
+        for name, (encoding, decoding, size) in benchmark(payloads, rounds).items()
+    ]
+
+    log("Benchmarked", len(payloads), "packets with", len(objects), schema,
+        "objects,", rounds, "rounds:")
+    log("\n%s" % std_table(results))
+
+
 @dev.command(short_help="create starterkit module")
 @click.option(
     "--clear-target",
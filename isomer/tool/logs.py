@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: Logs
+============
+
+Structured logfile inspection.
+
+"""
+
+import datetime
+import json
+import os
+
+import click
+from click_didyoumean import DYMGroup
+
+from isomer import logger
+from isomer.error import abort, EXIT_NO_LOGFILE, EXIT_INVALID_LOG_QUERY
+from isomer.logger import level_data, warn
+from isomer.logrecords import LogReader, formats
+from isomer.tool import log
+
+level_names = {value[0]: key for key, value in level_data.items()}
+
+
+def _parse_time(value):
+    """Parse a unix timestamp or ISO 8601 date/time"""
+
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        log("Cannot parse time:", value, lvl=warn)
+        abort(EXIT_INVALID_LOG_QUERY)
+
+
+def _parse_level(value):
+    """Parse a numeric or named log level"""
+
+    if value is None:
+        return None
+
+    if value.isdigit():
+        return int(value)
+
+    try:
+        return level_names[value.upper()]
+    except KeyError:
+        log("Unknown log level:", value, "- use one of", list(level_names), lvl=warn)
+        abort(EXIT_INVALID_LOG_QUERY)
+
+
+def _default_logfile():
+    """Find a structured logfile next to the configured logfile"""
+
+    for record_format in formats:
+        filename = "%s.%s" % (logger.logfile, record_format)
+        if os.path.exists(filename):
+            return filename
+
+    log("No structured logfile found next to", logger.logfile, lvl=warn)
+    abort(EXIT_NO_LOGFILE)
+
+
+def _format_record(record):
+    level = level_data.get(record["l"], [str(record["l"])])[0]
+
+    return "[%s]:%s: [%5s]%s %s" % (
+        datetime.datetime.fromtimestamp(record["t"]).isoformat(),
+        level,
+        record["e"],
+        record["s"],
+        record["c"],
+    )
+
+
+@click.group(
+    name="log",
+    cls=DYMGroup,
+    short_help="Logfile operations"
+)
+def logs():
+    """[GROUP] Logfile operations"""
+    pass
+
+
+@logs.command(short_help="Query a structured logfile")
+@click.option("--start", default=None, help="Earliest record time (unix or ISO)")
+@click.option("--end", default=None, help="Latest record time (unix or ISO)")
+@click.option("--level", default=None, help="Minimum level (number or name)")
+@click.option("--emitter", default=None, help="Only show records of an emitter")
+@click.option("--limit", default=None, type=int, help="Maximum number of records")
+@click.option("--json", "as_json", is_flag=True, default=False,
+              help="Output records as NDJSON")
+@click.option("--no-index", is_flag=True, default=False,
+              help="Do not read or write the sparse time index file")
+@click.argument("filename", required=False, default=None)
+def query(start, end, level, emitter, limit, as_json, no_index, filename):
+    """Query a structured (ndjson or binary) logfile by time range, level and
+    emitter.
+
+    Without a filename, the structured logfile next to the configured logfile
+    is used."""
+
+    if filename is None:
+        filename = _default_logfile()
+
+    with LogReader(filename, use_index=not no_index) as reader:
+        for record in reader.query(
+            start=_parse_time(start),
+            end=_parse_time(end),
+            min_level=_parse_level(level),
+            emitter=emitter,
+            limit=limit,
+        ):
+            if as_json:
+                click.echo(json.dumps(record, ensure_ascii=False))
+            else:
+                click.echo(_format_record(record))
@@ -42,6 +42,7 @@ from isomer.tool.remote import remote
 from isomer.tool.misc import cmdmap, shell
 from isomer.tool.version import versions, version
 from isomer.tool.dev import dev
+from isomer.tool.logs import logs
 from isomer.tool.cli import cli
 from isomer.launcher import launch
 
@@ -56,6 +57,7 @@ cli.add_command(version)
 cli.add_command(versions)
 cli.add_command(remote)
 cli.add_command(dev)
+cli.add_command(logs)
 
 db.add_command(rbac)
 db.add_command(objects)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module: Tracing
+===============
+
+Per request timing breakdown of client requests.
+
+The clientmanager stamps inbound websocket messages with a :class:`Trace`
+and records the time spent in each stage (decoding, forwarding, permission
+checks). The trace is carried on the resulting authorized or anonymous
+event. While a traced event is handled, the trace is the :data:`current`
+one, so ``send`` events fired by the handler pick it up and the response's
+transmission is recorded, too.
+
+Traces are kept in a bounded :class:`TraceStore`, requests slower than a
+threshold are logged with their full breakdown.
+
+"""
+
+from collections import deque
+from itertools import count
+from time import perf_counter, time
+
+from isomer.logger import isolog, warn
+
+#: Trace of the event that is currently being handled
+current = None
+
+
+def trace_log(*args, **kwargs):
+    """Log as emitter 'TRACE'"""
+    kwargs.update({"emitter": "TRACE", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+class Trace(object):
+    """Timing record of a single client request"""
+
+    __slots__ = ("id", "client", "component", "action", "timestamp", "start",
+                 "last", "stages", "handled", "finished", "echo")
+
+    def __init__(self, trace_id, client, component=None, action=None, echo=False,
+                 start=None):
+        self.id = trace_id
+        self.client = client
+        self.component = component
+        self.action = action
+        self.echo = echo
+
+        self.timestamp = time()
+        self.start = self.last = start if start is not None else perf_counter()
+        self.stages = []
+        self.handled = False
+        self.finished = False
+
+    def mark(self, stage: str):
+        """Record the time since the previous stage as a new stage"""
+
+        now = perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def handler(self, name: str, begin: float, duration: float):
+        """Record a handler invocation, the first one also records the time
+        the event spent in the event queue"""
+
+        if not self.handled:
+            self.stages.append(("queue", begin - self.last))
+            self.handled = True
+
+        self.stages.append((name, duration))
+        self.last = max(self.last, begin + duration)
+
+    @property
+    def total(self) -> float:
+        """Time between the request's arrival and its last recorded stage"""
+
+        return self.last - self.start
+
+    def timings(self) -> dict:
+        """Return the breakdown in milliseconds"""
+
+        return {
+            "trace": self.id,
+            "total": round(self.total * 1000, 3),
+            "stages": [[name, round(duration * 1000, 3)] for name, duration in
+                       self.stages],
+        }
+
+    def __repr__(self):
+        return "<Trace %s %s/%s %.3fms %s>" % (
+            self.id,
+            self.component,
+            self.action,
+            self.total * 1000,
+            ", ".join("%s=%.3f" % (name, duration * 1000) for name, duration in
+                      self.stages),
+        )
+
+
+class TraceStore(object):
+    """Bounded store of the most recent request traces"""
+
+    def __init__(self, size: int = 1000, threshold: float = 0.5):
+        self.enabled = False
+        self.threshold = threshold
+        self.traces = deque(maxlen=size)
+        self.slow = 0
+
+        self._ids = count()
+
+    def configure(self, enabled: bool, size: int = None, threshold: float = None):
+        """Adjust tracing, the stored traces are kept if possible"""
+
+        self.enabled = enabled
+
+        if threshold is not None:
+            self.threshold = threshold
+        if size is not None and size != self.traces.maxlen:
+            self.traces = deque(self.traces, maxlen=size)
+
+    def begin(self, client, component=None, action=None, echo=False, start=None):
+        """Start tracing a request, returns None if tracing is disabled
+
+        :param start: perf_counter value of the request's arrival, if it
+            arrived before the trace was started
+        """
+
+        if not self.enabled:
+            return None
+
+        trace = Trace("%x" % next(self._ids), client, component, action, echo, start)
+        self.traces.append(trace)
+
+        return trace
+
+    def finish(self, trace: Trace):
+        """Mark a trace as answered and log it, if it was slow"""
+
+        if trace.finished:
+            return
+
+        trace.finished = True
+
+        if trace.total >= self.threshold:
+            self.slow += 1
+            trace_log("Slow request:", trace, lvl=warn)
+
+    def recent(self, limit: int = 20) -> list:
+        """Return the latest traces, newest first"""
+
+        return list(reversed(self.traces))[:limit]
+
+    def slowest(self, limit: int = 20) -> list:
+        """Return the slowest stored traces"""
+
+        return sorted(self.traces, key=lambda trace: trace.total, reverse=True)[:limit]
+
+    def clear(self):
+        """Drop all stored traces"""
+
+        self.traces.clear()
+        self.slow = 0
+
+
+traces = TraceStore()
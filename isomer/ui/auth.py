@@ -25,16 +25,31 @@ Module: Auth
 
 Authentication (and later Authorization) system
 
+Password hashes are computed by a small pool of worker threads, so bcrypt's
+deliberately slow key derivation does not stall the event loop. The pool
+accepts a bounded number of pending verifications and reports its queue
+through the metrics registry.
+
+Accounts and profiles are looked up through the identity cache, which is
+invalidated by object changes and also coalesces lastlogin updates. Logins
+always verify against freshly read accounts, so deactivations and password
+changes take effect immediately.
+
 
 """
+from concurrent.futures import ThreadPoolExecutor
 from hmac import compare_digest
+from threading import Lock
+from time import perf_counter
 from uuid import uuid4
 
 from circuits import Event, Timer
+from isomer import identity
 from isomer.component import handler, ConfigurableComponent
 from isomer.events.client import authentication, send
 from isomer.database import objectmodels
-from isomer.logger import error, warn, debug
+from isomer.logger import isolog, error, warn, debug
+from isomer.metrics import registry
 from isomer.misc.std import std_salt, std_hash, std_now, std_uuid, std_human_uid
 
 minimum_password_length = 5
@@ -56,6 +71,100 @@ class add_auth_hook(Event):
         self.event = event
 
 
+class passwordverified(Event):
+    """A hashing worker finished verifying a login request's password"""
+
+    def __init__(self, request, user_account, valid, *args, **kwargs):
+        super(passwordverified, self).__init__(*args, **kwargs)
+        self.request = request
+        self.user_account = user_account
+        self.valid = valid
+
+
+def hashpool_log(*args, **kwargs):
+    """Log as emitter 'HASHPOOL'"""
+    kwargs.update({"emitter": "HASHPOOL", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+class HashPool(object):
+    """Bounded pool of threads that verify passwords off the event loop"""
+
+    def __init__(self, workers=2, queue_size=64):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.active = 0
+
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="isomer-hash"
+        )
+
+        registry.gauge("isomer_auth_hash_queued",
+                       "Password verifications waiting for a worker",
+                       callback=lambda: self.pending - self.active)
+        registry.gauge("isomer_auth_hash_active",
+                       "Password verifications being computed",
+                       callback=lambda: self.active)
+        self._rejected_metric = registry.counter(
+            "isomer_auth_hash_rejected_total",
+            "Password verifications rejected due to a full queue"
+        )
+        self._wait_metric = registry.histogram(
+            "isomer_auth_hash_wait_seconds",
+            "Time password verifications spent waiting for a worker"
+        )
+        self._duration_metric = registry.histogram(
+            "isomer_auth_hash_seconds", "Duration of password verifications"
+        )
+
+    def verify(self, password, salt, passhash, callback):
+        """Queue a password verification
+
+        The callback receives the result (True or False) and is called from a
+        worker thread. Returns False without queueing, if the queue is full.
+        """
+
+        with self._lock:
+            if self.pending >= self.queue_size:
+                self._rejected_metric.inc()
+                return False
+            self.pending += 1
+
+        self._executor.submit(
+            self._verify, password, salt, passhash, callback, perf_counter()
+        )
+
+        return True
+
+    def _verify(self, password, salt, passhash, callback, queued):
+        started = perf_counter()
+        self._wait_metric.observe(started - queued)
+
+        with self._lock:
+            self.active += 1
+
+        # noinspection PyBroadException
+        try:
+            valid = compare_digest(std_hash(password, salt), passhash)
+        except Exception as e:
+            hashpool_log("Password verification failed:", e, type(e), lvl=error)
+            valid = False
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.pending -= 1
+            self._duration_metric.observe(perf_counter() - started)
+
+        callback(valid)
+
+    def shutdown(self):
+        """Stop the worker threads after finishing queued verifications"""
+
+        self._executor.shutdown(wait=False)
+
+
 class Authenticator(ConfigurableComponent):
     """
     Authenticates users against the database.
@@ -63,7 +172,34 @@ class Authenticator(ConfigurableComponent):
 
     channel = "isomer-web"
 
-    configprops = {}
+    configprops = {
+        "hash_workers": {
+            "type": "integer",
+            "title": "Hashing workers",
+            "description": "Number of threads verifying login passwords",
+            "default": 2,
+        },
+        "hash_queue": {
+            "type": "integer",
+            "title": "Hashing queue",
+            "description": "Maximum number of pending password verifications, "
+                           "further logins are refused until the queue drains",
+            "default": 64,
+        },
+        "identity_ttl": {
+            "type": "integer",
+            "title": "Identity cache lifetime",
+            "description": "Seconds to keep user accounts and profiles cached",
+            "default": identity.DEFAULT_TTL,
+        },
+        "lastlogin_interval": {
+            "type": "integer",
+            "title": "Last login interval",
+            "description": "Seconds between writes of collected lastlogin "
+                           "timestamps",
+            "default": 30,
+        },
+    }
 
     def __init__(self, *args):
         super(Authenticator, self).__init__("AUTH", *args)
@@ -91,6 +227,38 @@ class Authenticator(ConfigurableComponent):
 
         self.auth_hooks = {}
 
+        self.hashpool = HashPool(self.config.hash_workers, self.config.hash_queue)
+
+        identity.cache.configure(self.config.identity_ttl)
+        Timer(
+            self.config.lastlogin_interval,
+            Event.create("flush_lastlogin"),
+            persist=True,
+        ).register(self)
+
+    @handler("prepare_unregister", channel="*")
+    def prepare_unregister(self, event, component):
+        """Stop the hashing workers, when this component gets unregistered"""
+
+        if component is self:
+            self.hashpool.shutdown()
+            self.flush_lastlogin()
+
+    def flush_lastlogin(self):
+        """Writes the collected lastlogin timestamps"""
+
+        try:
+            identity.cache.flush()
+        except Exception as e:
+            self.log("Could not store lastlogin timestamps:", e, type(e), lvl=error)
+
+    @handler("objectchange", "objectcreation", "objectdeletion")
+    def objectchange(self, event):
+        """Drops cached identities, when a user or profile changes"""
+
+        if event.schema in identity.SCHEMATA:
+            identity.cache.invalidate(event.schema, event.uuid)
+
     @handler("add_auth_hook")
     def add_auth_hook(self, event):
         """Register event hook on reception of add_auth_hook-event"""
@@ -118,10 +286,9 @@ class Authenticator(ConfigurableComponent):
     def _login(self, event, user_account, user_profile, client_config):
         """Send login notification to client"""
 
-        user_account.lastlogin = std_now()
-        user_account.save()
+        identity.cache.update_lastlogin(user_account, std_now())
 
-        user_account.passhash = ""
+        user_account = identity.public_copy(user_account)
         self.fireEvent(
             authentication(
                 user_account.name,
@@ -169,7 +336,7 @@ class Authenticator(ConfigurableComponent):
             return
 
         try:
-            user_account = objectmodels["user"].find_one({"uuid": client_config.owner})
+            user_account = identity.cache.account(uuid=client_config.owner, fresh=True)
             if user_account is None:
                 raise AuthenticationError
             self.log("Autologin for", user_account.name, lvl=debug)
@@ -206,10 +373,8 @@ class Authenticator(ConfigurableComponent):
             self._fail(event, "Password or username too short")
             return
 
-        client_config = None
-
         try:
-            user_account = objectmodels["user"].find_one({"name": event.username})
+            user_account = identity.cache.account(name=event.username, fresh=True)
             # self.log("Account: %s" % user_account._fields, lvl=debug)
             if user_account is None:
                 raise AuthenticationError
@@ -225,15 +390,34 @@ class Authenticator(ConfigurableComponent):
             self._fail(event, "Account deactivated.")
             return
 
-        trying_passhash = std_hash(event.password, self.salt)
+        def verified(valid):
+            """Hand the result back to the event loop"""
+
+            self.fire(passwordverified(event, user_account, valid), "auth")
 
-        if compare_digest(trying_passhash, user_account.passhash) is False:
+        if not self.hashpool.verify(
+                event.password, self.salt, user_account.passhash, verified
+        ):
+            self.log("Too many pending logins, refusing request", lvl=warn)
+            self._fail(event, "Server busy, please try again")
+
+    @handler("passwordverified", channel="auth")
+    def passwordverified(self, event):
+        """Continues a login after its password has been verified"""
+
+        user_account = event.user_account
+        valid = event.valid
+        event = event.request
+
+        if valid is False:
             self.log("Password was wrong!", lvl=warn)
             self._fail(event)
             return
 
         self.log("Passhash matches, checking client and profile.", lvl=debug)
 
+        client_config = None
+
         requested_client_uuid = event.requestedclientuuid
         if requested_client_uuid is not None:
             client_config = objectmodels["client"].find_one(
@@ -281,10 +465,7 @@ class Authenticator(ConfigurableComponent):
         """Retrieves a user's profile"""
 
         try:
-            # TODO: Load active profile, not just any
-            user_profile = objectmodels["profile"].find_one(
-                {"owner": str(user_account.uuid)}
-            )
+            user_profile = identity.cache.profile(user_account.uuid)
             self.log("Profile: ", user_profile, user_account.uuid, lvl=debug)
         except Exception as e:
             self.log("No profile due to error: ", e, type(e), lvl=error)
@@ -298,5 +479,6 @@ class Authenticator(ConfigurableComponent):
             }
             user_profile = objectmodels["profile"](default)
             user_profile.save()
+            identity.cache.remember_profile(user_account.uuid, user_profile)
 
         return user_profile
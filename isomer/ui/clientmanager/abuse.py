@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module clientmanager.abuse
+==========================
+
+Bounded record of misbehaving client addresses.
+
+Addresses sending undecodable messages collect errors. Once they exceed a
+threshold, the address gets banned for a time that doubles with every
+further ban, up to a maximum. Records are forgotten after a period of
+inactivity following their last error or ban (TTL) and the least recently
+active ones are evicted, when the store is full. Currently banned addresses
+are only evicted, if no unbanned record is left.
+
+"""
+
+from collections import OrderedDict
+from time import monotonic
+
+
+class AbuseRecord(object):
+    """Errors and bans of a single address"""
+
+    __slots__ = ("errors", "bans", "banned_until", "seen")
+
+    def __init__(self, now):
+        self.errors = 0
+        self.bans = 0
+        self.banned_until = 0
+        self.seen = now
+
+
+class AbuseStore(object):
+    """LRU and TTL bounded store of abuse records by address"""
+
+    def __init__(self, size=10000, ttl=3600, threshold=5, ban_duration=60,
+                 max_ban_duration=86400):
+        self.size = size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.ban_duration = ban_duration
+        self.max_ban_duration = max_ban_duration
+
+        self._records = OrderedDict()
+
+    def __len__(self):
+        return len(self._records)
+
+    def _get(self, address, now):
+        record = self._records.get(address, None)
+
+        if record is None:
+            return None
+
+        if max(record.seen, record.banned_until) + self.ttl < now:
+            del self._records[address]
+            return None
+
+        return record
+
+    def _evict(self, now):
+        """Drop the least recently active record, preferring unbanned ones"""
+
+        for address, record in self._records.items():
+            if record.banned_until <= now:
+                del self._records[address]
+                return
+
+        self._records.popitem(last=False)
+
+    def banned(self, address, now=None):
+        """Check if an address is currently banned"""
+
+        if len(self._records) == 0:
+            return False
+
+        if now is None:
+            now = monotonic()
+
+        record = self._get(address, now)
+
+        if record is None or record.banned_until <= now:
+            return False
+
+        self._records.move_to_end(address)
+
+        return True
+
+    def record_error(self, address, now=None):
+        """Count an error of an address, returns the ban duration, if the
+        address got banned by it"""
+
+        if now is None:
+            now = monotonic()
+
+        record = self._get(address, now)
+
+        if record is None:
+            if len(self._records) >= self.size:
+                self._evict(now)
+            record = self._records[address] = AbuseRecord(now)
+        else:
+            self._records.move_to_end(address)
+
+        record.seen = now
+        record.errors += 1
+
+        if record.errors <= self.threshold:
+            return None
+
+        duration = min(self.ban_duration * 2 ** record.bans, self.max_ban_duration)
+
+        record.errors = 0
+        record.bans += 1
+        record.banned_until = now + duration
+
+        return duration
+
+    def banned_count(self, now=None):
+        """Return the number of currently banned addresses"""
+
+        if now is None:
+            now = monotonic()
+
+        return sum(1 for record in self._records.values() if record.banned_until > now)
+
+    def entries(self, now=None):
+        """Return (address, errors, bans, remaining ban, idle time) of all
+        active records"""
+
+        if now is None:
+            now = monotonic()
+
+        result = []
+
+        for address in list(self._records):
+            record = self._get(address, now)
+            if record is None:
+                continue
+
+            result.append((
+                address,
+                record.errors,
+                record.bans,
+                max(0, record.banned_until - now),
+                now - record.seen,
+            ))
+
+        return result
+
+    def unban(self, address):
+        """Lift the ban of an address, but keep its ban count"""
+
+        record = self._records.get(address, None)
+        if record is None:
+            return False
+
+        record.banned_until = 0
+        record.errors = 0
+
+        return True
+
+    def clear(self, address=None):
+        """Forget one or all addresses, returns the number of dropped records"""
+
+        if address is None:
+            count = len(self._records)
+            self._records.clear()
+            return count
+
+        return 1 if self._records.pop(address, None) is not None else 0
@@ -29,7 +29,8 @@ Handles authentication and authorization related aspects
 
 """
 
-import json
+
+from hmac import compare_digest
 
 from circuits.net.events import write
 
@@ -141,7 +142,7 @@ class AuthenticationManager(ClientBaseManager):
                 "data": account.serializablefields(),
             }
             self.log("Transmitting Authorization to client", authpacket, lvl=network)
-            self.fireEvent(write(event.sock, json.dumps(authpacket)), "wsserver")
+            self.fireEvent(write(event.sock, self.codec.dumps(authpacket)), "wsserver")
 
             profilepacket = {
                 "component": "profile",
@@ -149,7 +150,9 @@ class AuthenticationManager(ClientBaseManager):
                 "data": profile.serializablefields(),
             }
             self.log("Transmitting Profile to client", profilepacket, lvl=network)
-            self.fireEvent(write(event.sock, json.dumps(profilepacket)), "wsserver")
+            self.fireEvent(
+                write(event.sock, self.codec.dumps(profilepacket)), "wsserver"
+            )
 
             clientconfigpacket = {
                 "component": "clientconfig",
@@ -162,9 +165,25 @@ class AuthenticationManager(ClientBaseManager):
                 lvl=network,
             )
             self.fireEvent(
-                write(event.sock, json.dumps(clientconfigpacket)), "wsserver"
+                write(event.sock, self.codec.dumps(clientconfigpacket)), "wsserver"
             )
 
+            if self.config.resume_grace > 0:
+                newclient.session = self._session_tokens.new_nonce()
+                sessionpacket = {
+                    "component": "auth",
+                    "action": "session",
+                    "data": {
+                        "token": self._session_tokens.issue(
+                            useruuid, clientuuid, newclient.session
+                        ),
+                        "lifetime": self.config.session_lifetime,
+                    },
+                }
+                self.fireEvent(
+                    write(event.sock, self.codec.dumps(sessionpacket)), "wsserver"
+                )
+
             self.fireEvent(userlogin(clientuuid, useruuid, clientconfig, signedinuser))
 
             self.log(
@@ -217,6 +236,8 @@ class AuthenticationManager(ClientBaseManager):
                 return
             except Exception as e:
                 self.log("Login failed: ", e, type(e), lvl=warn, exc=True)
+        elif action == "resume":
+            self._resume_session(data, clientuuid, sock)
         elif action == "logout":
             self.log("User logged out, refreshing client.", lvl=network)
             try:
@@ -236,7 +257,68 @@ class AuthenticationManager(ClientBaseManager):
         else:
             self.log("Unsupported auth action requested:", action, lvl=warn)
 
-    def _handle_authorized_events(self, component, action, data, user, client):
+    def _resume_session(self, token, clientuuid, sock):
+        """Re-binds a new connection to the detached client and user of a
+        session token, keeping their subscriptions
+
+        Every resumption renews the client's session nonce, which revokes the
+        presented token. Clients that are still connected cannot be taken
+        over.
+        """
+
+        client = None
+        session = self._session_tokens.verify(token)
+
+        if session is not None:
+            useruuid, resumed_uuid, nonce = session
+            client = self._clients.get(resumed_uuid, None)
+
+            if (
+                    client is None
+                    or client.sock is not None
+                    or client.session is None
+                    or not compare_digest(client.session, nonce)
+                    or client.useruuid != useruuid
+                    or useruuid not in self._users
+            ):
+                client = None
+
+        if client is None:
+            self.log("Session resumption refused", lvl=warn)
+            packet = {"component": "auth", "action": "fail", "data": "Session expired"}
+            self.fireEvent(write(sock, self.codec.dumps(packet)), "wsserver")
+            return
+
+        del self._clients[clientuuid]
+        socket = self._sockets[sock]
+        socket.clientuuid = client.uuid
+
+        client.sock = sock
+        client.ip = socket.ip
+        client.detached = None
+        client.session = self._session_tokens.new_nonce()
+        backlog, client.backlog = client.backlog, None
+
+        self.log("Session resumed:", client.uuid, client.useruuid, lvl=debug)
+
+        packet = {
+            "component": "auth",
+            "action": "resume",
+            "data": {
+                "clientuuid": client.uuid,
+                "useruuid": client.useruuid,
+                "token": self._session_tokens.issue(
+                    client.useruuid, client.uuid, client.session
+                ),
+            },
+        }
+        self.fireEvent(write(sock, self.codec.dumps(packet)), "wsserver")
+
+        for data in backlog or ():
+            self.fireEvent(write(sock, data), "wsserver")
+
+    def _handle_authorized_events(self, component, action, data, user, client,
+                                  trace=None):
         """Isolated communication link for authorized events."""
 
         try:
@@ -267,6 +349,10 @@ class AuthenticationManager(ClientBaseManager):
                 self.fireEvent(send(event.client.uuid, result))
                 return
 
+            if trace is not None:
+                event.trace = trace
+                trace.mark("authorize")
+
             self.log("Firing authorized event: ", event, lvl=debug)
             # self.log("", (user, action, data, client), lvl=critical)
             self.fireEvent(event)
@@ -281,10 +367,16 @@ class AuthenticationManager(ClientBaseManager):
                 exc=True,
             )
 
-    def _handle_anonymous_events(self, component, action, data, client):
+    def _handle_anonymous_events(self, component, action, data, client, trace=None):
         """Handler for anonymous (public) events"""
         try:
-            event = self.anonymous_events[component][action]["event"]
+            event = self.anonymous_events[component][action]["event"](
+                action, data, client
+            )
+
+            if trace is not None:
+                event.trace = trace
+                trace.mark("forward")
 
             self.log(
                 "Firing anonymous event: ",
@@ -294,7 +386,7 @@ class AuthenticationManager(ClientBaseManager):
                 lvl=network,
             )
             # self.log("", (user, action, data, client), lvl=critical)
-            self.fireEvent(event(action, data, client))
+            self.fireEvent(event)
         except Exception as e:
             self.log(
                 "Critical error during anonymous event handling:",
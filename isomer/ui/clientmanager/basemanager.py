@@ -29,21 +29,27 @@ Basic client management functionality and component set up.
 
 """
 
-import json
 from base64 import b64decode
-from time import time
+from collections import deque
+from time import perf_counter, monotonic
 from uuid import uuid4
 from socket import socket
 
+from circuits import Event, Timer
 from circuits.net.events import write
+from isomer import identity
 from isomer.component import ConfigurableComponent, handler
 from isomer.database import objectmodels
 from isomer.events.client import clientdisconnect, userlogout, send
 
-from isomer.logger import debug, critical, verbose, error, warn, network
+from isomer.logger import debug, critical, verbose, error, warn, network, shorten
+from isomer.metrics import registry
+from isomer.tracing import traces
 from isomer.ui.clientobjects import Socket, Client, User
 
-from isomer.ui.clientmanager.encoder import ComplexEncoder
+from isomer.ui.clientmanager.abuse import AbuseStore
+from isomer.ui.clientmanager.encoder import get_codec
+from isomer.ui.clientmanager.sessions import SessionTokens
 
 
 from isomer.events.objectmanager import search, get
@@ -57,9 +63,122 @@ class ClientBaseManager(ConfigurableComponent):
 
     channel = "isomer-web"
 
+    configprops = {
+        "json_codec": {
+            "type": "string",
+            "enum": ["auto", "orjson", "ujson", "json"],
+            "title": "JSON codec",
+            "description": "Codec used for websocket packets, 'auto' picks the "
+                           "fastest installed one",
+            "default": "auto",
+        },
+        "tracing": {
+            "type": "boolean",
+            "title": "Request tracing",
+            "description": "Record per request timing breakdowns",
+            "default": False,
+        },
+        "trace_store_size": {
+            "type": "integer",
+            "title": "Trace store size",
+            "description": "Number of recent request traces to keep",
+            "default": 1000,
+        },
+        "slow_request_threshold": {
+            "type": "number",
+            "title": "Slow request threshold",
+            "description": "Log traced requests taking longer (in seconds)",
+            "default": 0.5,
+        },
+        "timing_echo": {
+            "type": "boolean",
+            "title": "Echo timing",
+            "description": "Always add an x-timing breakdown to responses of "
+                           "traced requests, clients can request it per "
+                           "message by sending x-timing",
+            "default": False,
+        },
+        "rate_limits": {
+            "type": "object",
+            "title": "Rate limits",
+            "description": "Token bucket limits ('rate' per second and 'burst') "
+                           "for each 'client', each 'ip' and per client for "
+                           "event classes given as component.action",
+            "default": {
+                "client": {"rate": 50, "burst": 100},
+                "ip": {"rate": 200, "burst": 400},
+            },
+        },
+        "abuse_store_size": {
+            "type": "integer",
+            "title": "Abuse store size",
+            "description": "Number of misbehaving client addresses to track",
+            "default": 10000,
+        },
+        "abuse_ttl": {
+            "type": "integer",
+            "title": "Abuse record lifetime",
+            "description": "Seconds to remember a misbehaving address after its "
+                           "last error or ban",
+            "default": 3600,
+        },
+        "abuse_threshold": {
+            "type": "integer",
+            "title": "Abuse threshold",
+            "description": "Undecodable messages an address may send before "
+                           "it gets banned",
+            "default": 5,
+        },
+        "ban_duration": {
+            "type": "integer",
+            "title": "Ban duration",
+            "description": "Seconds of a first ban, doubled with every further "
+                           "ban of the same address",
+            "default": 60,
+        },
+        "max_ban_duration": {
+            "type": "integer",
+            "title": "Maximum ban duration",
+            "description": "Upper bound of ban durations in seconds",
+            "default": 86400,
+        },
+        "session_lifetime": {
+            "type": "integer",
+            "title": "Session lifetime",
+            "description": "Seconds a session token can be used to resume a "
+                           "session",
+            "default": 43200,
+        },
+        "resume_grace": {
+            "type": "integer",
+            "title": "Resume grace period",
+            "description": "Seconds to keep a disconnected client's session for "
+                           "resumption, 0 logs clients out immediately",
+            "default": 120,
+        },
+        "resume_backlog": {
+            "type": "integer",
+            "title": "Resume backlog",
+            "description": "Packets to keep for a disconnected client until it "
+                           "resumes its session",
+            "default": 100,
+        },
+    }
+
     def __init__(self, *args, **kwargs):
         super(ClientBaseManager, self).__init__("CM", *args, **kwargs)
 
+        self.codec = get_codec(self.config.json_codec)
+        self.log("Using JSON codec", self.codec.name, lvl=debug)
+
+        traces.configure(
+            self.config.tracing,
+            self.config.trace_store_size,
+            self.config.slow_request_threshold,
+        )
+
+        self._session_tokens = SessionTokens(self.config.session_lifetime)
+
         self._public_access = True
 
         self._public_access_events = [search, get]
@@ -70,8 +189,33 @@ class ClientBaseManager(ConfigurableComponent):
         self._count = 0
         self._user_mapping = {}
 
-        self._erroneous_clients = {}
-        self._bans = {}
+        self._abuse = AbuseStore(
+            self.config.abuse_store_size,
+            self.config.abuse_ttl,
+            self.config.abuse_threshold,
+            self.config.ban_duration,
+            self.config.max_ban_duration,
+        )
+
+        registry.gauge("isomer_clients", "Connected clients",
+                       callback=lambda: len(self._clients))
+        registry.gauge("isomer_users", "Logged in users",
+                       callback=lambda: len(self._users))
+        registry.gauge("isomer_banned_addresses", "Banned client addresses",
+                       callback=lambda: self._abuse.banned_count())
+        registry.gauge("isomer_erroneous_addresses",
+                       "Addresses that sent undecodable messages",
+                       callback=lambda: len(self._abuse))
+
+        self._messages_metric = registry.counter(
+            "isomer_client_messages_total", "Received websocket messages"
+        )
+        self._decode_errors_metric = registry.counter(
+            "isomer_client_decode_errors_total", "Undecodable websocket messages"
+        )
+        self._requests_metric = registry.counter(
+            "isomer_client_requests_total", "Accepted client requests", ("component",)
+        )
 
     @handler("disconnect", channel="wsserver")
     def disconnect(self, sock):
@@ -88,32 +232,78 @@ class ClientBaseManager(ConfigurableComponent):
                 self.log("getting useruuid", lvl=debug)
                 useruuid = self._clients[clientuuid].useruuid
 
-                self.log("Firing disconnect event", lvl=debug)
-                self.fireEvent(
-                    clientdisconnect(clientuuid, self._clients[clientuuid].useruuid)
-                )
-
-                self.log("Logging out relevant client", lvl=debug)
-                if useruuid is not None:
-                    self.log("Client was logged in", lvl=debug)
-                    try:
-                        self._logout_client(useruuid, clientuuid)
-                        self.log("Client logged out", useruuid, clientuuid)
-                    except Exception as e:
-                        self.log(
-                            "Couldn't clean up logged in user! ",
-                            self._users[useruuid],
-                            e,
-                            type(e),
-                            lvl=critical,
-                        )
-                self.log("Deleting Client (", self._clients.keys, ")", lvl=debug)
-                del self._clients[clientuuid]
                 self.log("Deleting Socket", lvl=debug)
                 del self._sockets[sock]
+
+                if useruuid is not None and self.config.resume_grace > 0:
+                    self._detach_client(clientuuid)
+                else:
+                    self._remove_client(clientuuid)
         except Exception as e:
             self.log("Error during disconnect handling: ", e, type(e), lvl=critical)
 
+    def _remove_client(self, clientuuid):
+        """Finally remove a client and log out its user, if necessary"""
+
+        useruuid = self._clients[clientuuid].useruuid
+
+        self.log("Firing disconnect event", lvl=debug)
+        self.fireEvent(clientdisconnect(clientuuid, useruuid))
+
+        self.log("Logging out relevant client", lvl=debug)
+        if useruuid is not None:
+            self.log("Client was logged in", lvl=debug)
+            try:
+                self._logout_client(useruuid, clientuuid)
+                self.log("Client logged out", useruuid, clientuuid)
+            except Exception as e:
+                self.log(
+                    "Couldn't clean up logged in user! ",
+                    self._users[useruuid],
+                    e,
+                    type(e),
+                    lvl=critical,
+                )
+        self.log("Deleting Client (", self._clients.keys, ")", lvl=debug)
+        del self._clients[clientuuid]
+
+    def _detach_client(self, clientuuid):
+        """Keep a logged in client without socket, so its session can be
+        resumed during the grace period"""
+
+        client = self._clients[clientuuid]
+        client.sock = None
+        client.detached = monotonic()
+        client.backlog = deque(maxlen=self.config.resume_backlog)
+
+        self.log("Client detached, waiting for resumption:", clientuuid, lvl=debug)
+
+        Timer(
+            self.config.resume_grace,
+            Event.create("expire_session", clientuuid, client.detached),
+        ).register(self)
+
+    def expire_session(self, clientuuid, detached):
+        """Removes a detached client, if it did not resume its session"""
+
+        client = self._clients.get(clientuuid, None)
+        if client is None or client.detached != detached:
+            return
+
+        self.log("Session of detached client expired:", clientuuid, lvl=debug)
+        self._remove_client(clientuuid)
+
+    def _write_client(self, client, data):
+        """Write data to a client's socket or keep it until the client
+        resumes its session"""
+
+        if client.sock is None:
+            if client.backlog is not None:
+                client.backlog.append(data)
+            return
+
+        self.fireEvent(write(client.sock, data), "wsserver")
+
     def _logout_client(self, useruuid, clientuuid):
         """Log out a client and possibly associated user"""
 
@@ -127,6 +317,8 @@ class ClientBaseManager(ConfigurableComponent):
                 del self._users[useruuid]
 
             self._clients[clientuuid].useruuid = None
+            # Revoke the client's session token
+            self._clients[clientuuid].session = None
         except Exception as e:
             self.log(
                 "Error during client logout: ",
@@ -172,26 +364,30 @@ class ClientBaseManager(ConfigurableComponent):
         """Sends a packet to an already known user or one of his clients by
         UUID"""
 
+        trace = getattr(event, "trace", None)
+
         try:
-            jsonpacket = json.dumps(event.packet, cls=ComplexEncoder)
-            if event.sendtype == "user":
-                # TODO: I think, caching a user name <-> uuid table would
-                # make sense instead of looking this up all the time.
+            packet = event.packet
+            if trace is not None and trace.echo and isinstance(packet, dict):
+                packet = dict(packet, **{"x-timing": trace.timings()})
 
+            jsonpacket = self.codec.dumps(packet)
+            if event.sendtype == "user":
                 if event.uuid is None:
-                    userobject = objectmodels["user"].find_one({"name": event.username})
-                else:
-                    userobject = objectmodels["user"].find_one({"uuid": event.uuid})
+                    userobject = identity.cache.account(name=event.username)
+
+                    if userobject is None:
+                        self.log("No user by that name known.", lvl=warn)
+                        return
 
-                if userobject is None:
-                    self.log("No user by that name known.", lvl=warn)
-                    return
-                else:
                     uuid = userobject.uuid
+                else:
+                    uuid = event.uuid
 
                 self.log(
-                    "Broadcasting to all of users clients: '%s': '%s"
-                    % (uuid, str(event.packet)[:20]),
+                    "Broadcasting to all of users clients:",
+                    uuid,
+                    shorten(event.packet, 20),
                     lvl=network,
                 )
                 if uuid not in self._users:
@@ -200,19 +396,21 @@ class ClientBaseManager(ConfigurableComponent):
                 clients = self._users[uuid].clients
 
                 for clientuuid in clients:
-                    sock = self._clients[clientuuid].sock
+                    client = self._clients[clientuuid]
 
                     if not event.raw:
-                        self.log("Sending json to client", jsonpacket[:50], lvl=network)
+                        self.log("Sending json to client", shorten(jsonpacket, 50),
+                                 lvl=network)
 
-                        self.fireEvent(write(sock, jsonpacket), "wsserver")
+                        self._write_client(client, jsonpacket)
                     else:
                         self.log("Sending raw data to client")
-                        self.fireEvent(write(sock, event.packet), "wsserver")
+                        self._write_client(client, event.packet)
             else:  # only to client
                 self.log(
-                    "Sending to user's client: '%s': '%s'"
-                    % (event.uuid, jsonpacket[:50]),
+                    "Sending to user's client:",
+                    event.uuid,
+                    shorten(jsonpacket, 50),
                     lvl=network,
                 )
                 if event.uuid not in self._clients:
@@ -221,12 +419,16 @@ class ClientBaseManager(ConfigurableComponent):
                         self.log("Clients:", self._clients, lvl=debug)
                     return
 
-                sock = self._clients[event.uuid].sock
+                client = self._clients[event.uuid]
                 if not event.raw:
-                    self.fireEvent(write(sock, jsonpacket), "wsserver")
+                    self._write_client(client, jsonpacket)
                 else:
                     self.log("Sending raw data to client", lvl=network)
-                    self.fireEvent(write(sock, event.packet[:20]), "wsserver")
+                    self._write_client(client, event.packet)
+
+            if trace is not None:
+                trace.mark("send")
+                traces.finish(trace)
 
         except Exception as e:
             self.log(
@@ -254,7 +456,7 @@ class ClientBaseManager(ConfigurableComponent):
                         "Broadcasting to all clients: ", event.content, lvl=network
                     )
                     for client in self._clients.values():
-                        self.fireEvent(write(client.sock, event.content), "wsserver")
+                        self._write_client(client, event.content)
                         # else:
                         #    self.log("Not broadcasting, no clients
                         # connected.",
@@ -265,15 +467,7 @@ class ClientBaseManager(ConfigurableComponent):
                         "Broadcasting to group: ", event.content, event.group,
                         lvl=network
                     )
-                    for participant in set(event.group):
-                        if event.broadcasttype == 'usergroup':
-                            broadcast_type = "user"
-                        else:
-                            broadcast_type = "client"
-
-                        broadcast = send(participant, event.content,
-                                         sendtype=broadcast_type)
-                        self.fireEvent(broadcast)
+                    self._fan_out(event.broadcasttype, event.content, event.group)
             elif event.broadcasttype == "socks":
                 if len(self._sockets) > 0:
                     self.log("Emergency?! Broadcasting to all sockets: ", event.content)
@@ -287,11 +481,34 @@ class ClientBaseManager(ConfigurableComponent):
         except Exception as e:
             self.log("Error during broadcast: ", e, type(e), lvl=critical)
 
+    def _fan_out(self, grouptype, content, group):
+        """Encode a packet once and write it to all clients of a group"""
+
+        if grouptype == "usergroup":
+            clients = set()
+            for useruuid in group:
+                if useruuid in self._users:
+                    clients.update(self._users[useruuid].clients)
+        else:
+            clients = set(group)
+
+        jsonpacket = self.codec.dumps(content)
+
+        for clientuuid in clients:
+            client = self._clients.get(clientuuid, None)
+            if client is None:
+                self.log("Unknown client in group:", clientuuid, lvl=verbose)
+                continue
+
+            self._write_client(client, jsonpacket)
+
     @handler("read", channel="wsserver")
     def read(self, *args):
         """Handles raw client requests and distributes them to the
         appropriate components"""
 
+        started = perf_counter()
+
         self.log("Beginning new transaction: ", args, lvl=network)
 
         sock = msg = user = password = client = client_uuid = \
@@ -303,52 +520,53 @@ class ClientBaseManager(ConfigurableComponent):
 
             # self.log("", msg)
 
-            # TODO: Harmonize this with flood protection and other still to do
-            #  protections and optimize administrative
-            ip = sock.getpeername()[0]
-            if ip in self._bans:
-                return
+            socket_object = self._sockets[sock]
+            ip = getattr(socket_object, "ip", None)
+            if ip is None:
+                ip = sock.getpeername()[0]
 
-            if self._erroneous_clients.get(ip, 0) > 5:
-                self.log('Ignoring erroneous client that sent too much garbage before', lvl=warn)
-                self._bans[ip] = time()
+            if self._abuse.banned(ip):
                 return
 
-            client_uuid = self._sockets[sock].clientuuid
+            client_uuid = socket_object.clientuuid
         except Exception as e:
             self.log("Receiving error: ", e, type(e), lvl=error, exc=True)
             return
 
+        self._messages_metric.inc()
+
         if sock is None or msg is None:
             self.log("Socket or message are invalid!", lvl=error)
             return
 
-        if client_uuid in self._flooding:
+        if self._check_flood_protection(client_uuid, ip):
             return
 
         try:
-            msg = json.loads(msg)
+            msg = self.codec.loads(msg)
             self.log("Message from client received: ", msg, lvl=network)
         except Exception as e:
             self.log("JSON Decoding failed! %s (%s of %s)" % (msg, e, type(e)))
-            ip = sock.getpeername()[0]
-            if ip in self._erroneous_clients:
-                self._erroneous_clients[ip] += 1
-            else:
-                self._erroneous_clients[ip] = 1
-
+            self._record_decode_error(ip)
             return
 
         try:
             request_component = msg["component"]
             request_action = msg["action"]
-        except (KeyError, AttributeError) as e:
+        except (KeyError, AttributeError, TypeError) as e:
             self.log("Unpacking error: ", msg, e, type(e), lvl=error)
             return
 
-        if self._check_flood_protection(request_component, request_action, client_uuid):
-            self.log("Flood protection triggered")
-            self._flooding[client_uuid] = time()
+        if not isinstance(request_component, str) or \
+                not isinstance(request_action, str):
+            self.log("Invalid component or action: ", msg, lvl=warn)
+            self._record_decode_error(ip)
+            return
+
+        if self._check_flood_protection(
+                client_uuid, ip, request_component, request_action
+        ):
+            return
 
         try:
             # TODO: Do not unpickle or decode anything from unsafe events
@@ -362,17 +580,40 @@ class ClientBaseManager(ConfigurableComponent):
             request_data = None
 
         if request_component == "auth":
+            self._requests_metric.inc(component=request_component)
             self._handle_authentication_events(
                 request_data, request_action, client_uuid, sock
             )
             return
         else:
+            trace = traces.begin(
+                client_uuid,
+                request_component,
+                request_action,
+                self.config.timing_echo or bool(msg.get("x-timing", False)),
+                started,
+            )
+            if trace is not None:
+                trace.mark("decode")
+
             self._forward_event(
-                client_uuid, request_component, request_action, request_data
+                client_uuid, request_component, request_action, request_data, trace
             )
 
+    def _record_decode_error(self, ip):
+        """Count an undecodable message of a client address and ban it, if it
+        sent too many"""
+
+        self._decode_errors_metric.inc()
+
+        ban_duration = self._abuse.record_error(ip)
+        if ban_duration is not None:
+            self.log("Banning client address that sent too much garbage:", ip,
+                     "for", ban_duration, "seconds", lvl=warn)
+
     def _forward_event(
-        self, client_uuid, request_component, request_action, request_data
+        self, client_uuid, request_component, request_action, request_data,
+        trace=None
     ):
         """Determine what exactly to do with the event and forward it to its
         destination"""
@@ -388,15 +629,17 @@ class ClientBaseManager(ConfigurableComponent):
             and request_action in self.anonymous_events[request_component]
         ):
             self.log("Executing anonymous event:", request_component, request_action)
+            self._requests_metric.inc(component=request_component)
             try:
                 self._handle_anonymous_events(
-                    request_component, request_action, request_data, client
+                    request_component, request_action, request_data, client, trace
                 )
             except Exception as e:
                 self.log("Anonymous request failed:", e, type(e), lvl=warn, exc=True)
             return
 
         elif request_component in self.authorized_events:
+            self._requests_metric.inc(component=request_component)
             try:
                 user_uuid = client.useruuid
                 self.log(
@@ -436,9 +679,13 @@ class ClientBaseManager(ConfigurableComponent):
                 return
 
             self.log("Handling event:", request_component, request_action, lvl=verbose)
+            if trace is not None:
+                trace.mark("forward")
+
             try:
                 self._handle_authorized_events(
-                    request_component, request_action, request_data, user, client
+                    request_component, request_action, request_data, user, client,
+                    trace
                 )
             except Exception as e:
                 self.log("User request failed: ", e, type(e), lvl=warn, exc=True)
@@ -36,6 +36,7 @@ from isomer.component import handler
 from isomer.debugger import cli_register_event
 from isomer.misc import i18n as _
 from isomer.misc.std import std_table
+from isomer.tracing import traces
 
 from isomer.ui.clientmanager.authentication import AuthenticationManager
 
@@ -76,6 +77,29 @@ class cli_who(Event):
     pass
 
 
+class cli_traces(Event):
+    """Display or control client request traces
+
+    Arguments:
+        on|off|clear    Switch tracing on/off or drop stored traces
+        [int]           Number of traces to display
+        [slow]          Display the slowest instead of the latest traces
+    """
+
+    pass
+
+
+class cli_abuse(Event):
+    """Display or clear tracked misbehaving client addresses
+
+    Arguments:
+        clear [address]     Forget all or one address
+        unban address       Lift the ban of an address
+    """
+
+    pass
+
+
 class CliManager(AuthenticationManager):
     """Command Line Interface support"""
 
@@ -88,6 +112,8 @@ class CliManager(AuthenticationManager):
         self.fireEvent(cli_register_event("events", cli_events))
         self.fireEvent(cli_register_event("sources", cli_sources))
         self.fireEvent(cli_register_event("who", cli_who))
+        self.fireEvent(cli_register_event("traces", cli_traces))
+        self.fireEvent(cli_register_event("abuse", cli_abuse))
 
     @handler("cli_client")
     def client_details(self, *args):
@@ -190,3 +216,77 @@ class CliManager(AuthenticationManager):
                 rows.append(row)
 
         self.log("\n" + std_table(rows))
+
+    @handler("cli_traces")
+    def traces_list(self, *args):
+        """Display or control client request traces"""
+
+        if len(args) > 0 and args[0] in ("on", "off", "clear"):
+            if args[0] == "clear":
+                traces.clear()
+            else:
+                traces.configure(args[0] == "on")
+            self.log("Request tracing", args[0])
+            return
+
+        try:
+            limit = int(args[0]) if len(args) > 0 else 20
+        except ValueError:
+            limit = 20
+
+        if "slow" in args:
+            selection = traces.slowest(limit)
+        else:
+            selection = traces.recent(limit)
+
+        self.log(
+            "Tracing", "enabled" if traces.enabled else "disabled", "-",
+            len(traces.traces), "traces stored,", traces.slow, "slow requests"
+        )
+
+        if len(selection) == 0:
+            return
+
+        Row = namedtuple("Row", ["Trace", "Component", "Action", "Total", "Stages"])
+        rows = []
+
+        for trace in selection:
+            timings = trace.timings()
+            stages = " ".join("%s=%.3f" % (name, duration) for name, duration in
+                              timings["stages"])
+            rows.append(Row(trace.id, str(trace.component), str(trace.action),
+                            "%.3f" % timings["total"], stages))
+
+        self.log("\n" + std_table(rows))
+
+    @handler("cli_abuse")
+    def abuse_list(self, *args):
+        """Display or clear tracked misbehaving client addresses"""
+
+        if len(args) > 0 and args[0] == "clear":
+            count = self._abuse.clear(args[1] if len(args) > 1 else None)
+            self.log("Forgot", count, "addresses")
+            return
+
+        if len(args) > 1 and args[0] == "unban":
+            if self._abuse.unban(args[1]):
+                self.log("Lifted ban of", args[1])
+            else:
+                self.log("Unknown address:", args[1])
+            return
+
+        entries = self._abuse.entries()
+
+        self.log(len(entries), "tracked addresses,", self._abuse.banned_count(),
+                 "banned")
+
+        if len(entries) == 0:
+            return
+
+        Row = namedtuple("Row", ["Address", "Errors", "Bans", "Banned", "Idle"])
+        rows = [
+            Row(str(address), errors, bans, "%.0f" % banned, "%.0f" % idle)
+            for address, errors, bans, banned, idle in entries
+        ]
+
+        self.log("\n" + std_table(rows))
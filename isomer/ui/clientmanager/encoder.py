@@ -26,11 +26,34 @@ Module clientmanager.encoder
 
 Enhanced JSON encoding
 
+Packets are encoded and decoded by a codec, which is selected once at
+startup. Faster third party backends (orjson, ujson) are used if they are
+installed, otherwise the standard library's json module is used.
+Dates and times are always converted to ISO 8601 formatting.
+
 
 """
 
 import datetime
 import json
+from time import perf_counter
+
+from isomer.logger import isolog, warn, verbose
+
+
+def codec_log(*args, **kwargs):
+    """Log as emitter 'CODEC'"""
+    kwargs.update({"emitter": "CODEC", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+def _default(obj):
+    """Convert otherwise unserializable objects for third party codecs"""
+
+    if isinstance(obj, (datetime.time, datetime.date)):
+        return obj.isoformat()
+
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj))
 
 
 class ComplexEncoder(json.JSONEncoder):
@@ -42,3 +65,134 @@ class ComplexEncoder(json.JSONEncoder):
             return obj.isoformat()
             # Let the base class default method raise the TypeError
         return json.JSONEncoder.default(self, obj)
+
+
+class JSONCodec(object):
+    """Standard library JSON codec"""
+
+    name = "json"
+
+    def dumps(self, obj):
+        """Encode an object to a JSON string"""
+
+        return json.dumps(obj, cls=ComplexEncoder)
+
+    def loads(self, data):
+        """Decode a JSON string or bytes"""
+
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """orjson based codec, falls back to the standard codec for objects orjson
+    cannot handle (e.g. integers exceeding 64 bit)"""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        try:
+            return self._orjson.dumps(
+                obj, default=_default, option=self._options
+            ).decode("utf-8")
+        except TypeError:
+            return super(OrjsonCodec, self).dumps(obj)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+class UJSONCodec(JSONCodec):
+    """ujson based codec, falls back to the standard codec for objects ujson
+    cannot handle"""
+
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        try:
+            return self._ujson.dumps(obj, default=_default, ensure_ascii=False)
+        except (TypeError, OverflowError):
+            return super(UJSONCodec, self).dumps(obj)
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+
+codecs = {"orjson": OrjsonCodec, "ujson": UJSONCodec, "json": JSONCodec}
+
+#: Order of preference for automatic codec selection
+preference = ("orjson", "ujson", "json")
+
+
+def available_codecs():
+    """Return instances of all installed codecs"""
+
+    result = {}
+
+    for name in preference:
+        try:
+            result[name] = codecs[name]()
+        except ImportError:
+            codec_log("Codec not installed:", name, lvl=verbose)
+
+    return result
+
+
+def get_codec(name="auto"):
+    """Return the requested codec, or the fastest installed one for 'auto'
+
+    Falls back to the standard codec, if a requested codec is not installed.
+    """
+
+    if name != "auto":
+        try:
+            return codecs[name]()
+        except (KeyError, ImportError):
+            codec_log("Requested codec not available:", name, lvl=warn)
+
+    for candidate in preference:
+        try:
+            return codecs[candidate]()
+        except ImportError:
+            continue
+
+
+def benchmark_codecs(payloads, rounds=100):
+    """Measure encoding and decoding of packets with all installed codecs
+
+    :param payloads: List of packets to encode
+    :param rounds: Number of times all packets are encoded and decoded
+    :return: Dictionary of codec names and (encoding time, decoding time,
+        total size) tuples, times in seconds per round
+    """
+
+    results = {}
+
+    for name, codec in available_codecs().items():
+        encoded = [codec.dumps(payload) for payload in payloads]
+
+        start = perf_counter()
+        for _ in range(rounds):
+            for payload in payloads:
+                codec.dumps(payload)
+        encoding = (perf_counter() - start) / rounds
+
+        start = perf_counter()
+        for _ in range(rounds):
+            for data in encoded:
+                codec.loads(data)
+        decoding = (perf_counter() - start) / rounds
+
+        results[name] = (encoding, decoding, sum(len(data) for data in encoded))
+
+    return results
@@ -26,25 +26,20 @@ Module clientmanager.floodprotection
 
 Protection against erroneously flooding clients.
 
+Requests are accounted in token buckets (see
+:mod:`isomer.ui.clientmanager.ratelimit`), requests exceeding a limit are
+dropped and the client is notified once, until it slows down again.
+
 
 """
 
 from time import time
 
-from circuits import Timer, Event
-
-from isomer.component import handler
 from isomer.events.client import send
+from isomer.metrics import registry
 
 from isomer.ui.clientmanager.cli import CliManager
-
-
-class reset_flood_counters(Event):
-    pass
-
-
-class reset_flood_offenders(Event):
-    pass
+from isomer.ui.clientmanager.ratelimit import RateLimiter
 
 
 class FloodProtectedManager(CliManager):
@@ -54,51 +49,49 @@ class FloodProtectedManager(CliManager):
         super(FloodProtectedManager, self).__init__(*args, **kwargs)
 
         self._flooding = {}
-        self._flood_counter = {}
+        self._rate_limiter = RateLimiter(self.config.rate_limits)
 
-        self._flood_counters_resetter = Timer(
-            2, Event.create("reset_flood_counters"), persist=True
-        ).register(self)
-        self._flood_offender_resetter = Timer(
-            10, Event.create("reset_flood_offenders"), persist=True
-        ).register(self)
+        registry.gauge("isomer_flooding_clients", "Clients blocked for flooding",
+                       callback=lambda: len(self._flooding))
+        self._throttled_metric = registry.counter(
+            "isomer_throttled_requests_total", "Requests dropped by rate limiting",
+            ("scope",)
+        )
 
-    @handler("reset_flood_counters")
-    def _reset_flood_counters(self, *args):
-        """Resets the flood counters on event trigger"""
+    def _remove_client(self, clientuuid):
+        """Forget the rate limiting state of removed clients"""
 
-        # self.log('Resetting flood counter')
-        self._flood_counter = {}
+        super(FloodProtectedManager, self)._remove_client(clientuuid)
 
-    @handler("reset_flood_offenders")
-    def _reset_flood_offenders(self, *args):
-        """Resets the list of flood offenders on event trigger"""
+        self._rate_limiter.forget(clientuuid)
+        self._flooding.pop(clientuuid, None)
 
-        offenders = []
-        # self.log('Resetting flood offenders')
+    def _check_flood_protection(self, clientuuid, ip, component=None, action=None):
+        """Checks if a client exceeds its rate limits, either for messages in
+        general or, given component and action, for that event class"""
 
-        for offender, offence_time in self._flooding.items():
-            if time() - offence_time < 10:
-                self.log("Removed offender from flood list:", offender)
-                offenders.append(offender)
+        if component is None:
+            scope = self._rate_limiter.check(clientuuid, ip)
+        else:
+            scope = self._rate_limiter.check_event(clientuuid, component, action)
 
-        for offender in offenders:
-            del self._flooding[offender]
+        if scope is None:
+            if component is None and clientuuid in self._flooding:
+                self.log("Removed offender from flood list:", clientuuid)
+                del self._flooding[clientuuid]
+            return False
 
-    def _check_flood_protection(self, component, action, clientuuid):
-        """Checks if any clients have been flooding the node"""
+        self._throttled_metric.inc(scope=scope)
 
-        if clientuuid not in self._flood_counter:
-            self._flood_counter[clientuuid] = 0
+        if clientuuid not in self._flooding:
+            self._flooding[clientuuid] = time()
 
-        self._flood_counter[clientuuid] += 1
-
-        if self._flood_counter[clientuuid] > 100:
             packet = {
                 "component": "isomer.ui.clientmanager",
                 "action": "Flooding",
                 "data": True,
             }
             self.fireEvent(send(clientuuid, packet))
-            self.log("Flooding from", clientuuid)
-            return True
+            self.log("Flooding from", clientuuid, "exceeding the", scope, "limit")
+
+        return True
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module clientmanager.ratelimit
+==============================
+
+Token bucket rate limiting of client requests.
+
+Every client, every IP address and, if configured, every event class per
+client gets a bucket holding up to ``burst`` tokens, which refills with
+``rate`` tokens per second. Each request takes a token, requests finding an
+empty bucket are throttled. Buckets are refilled lazily from monotonic
+timestamps when they are used, so no timers or periodic sweeps are needed.
+When a scope is full, idle buckets are dropped first, then the least
+recently used ones.
+
+Limits are given as dictionary::
+
+    {
+        "client": {"rate": 50, "burst": 100},
+        "ip": {"rate": 200, "burst": 400},
+        "isomer.events.objectmanager.getlist": {"rate": 5, "burst": 20}
+    }
+
+Event classes are addressed by their request's component and action,
+joined with a dot.
+
+"""
+
+from collections import OrderedDict
+from time import monotonic
+
+#: Number of buckets per scope, above which idle and then least recently used
+#: buckets are dropped
+MAX_BUCKETS = 10000
+
+
+class TokenBucket(object):
+    """Lazily refilled token bucket"""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def _level(self, now):
+        return min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+
+    def consume(self, now, amount=1):
+        """Take tokens from the bucket, returns False if there are not
+        enough"""
+
+        tokens = self._level(now)
+        self.stamp = now
+
+        if tokens < amount:
+            self.tokens = tokens
+            return False
+
+        self.tokens = tokens - amount
+        return True
+
+    def idle(self, now):
+        """Check if the bucket is full again and thus equals a new one"""
+
+        return self._level(now) >= self.burst
+
+
+def _limit(definition):
+    """Convert a limit definition into a (rate, burst) tuple"""
+
+    if not definition:
+        return None
+
+    return float(definition["rate"]), float(definition["burst"])
+
+
+class RateLimiter(object):
+    """Per client, per IP address and per event class token buckets"""
+
+    def __init__(self, limits=None, max_buckets=MAX_BUCKETS):
+        self.max_buckets = max_buckets
+
+        self.client_limit = None
+        self.ip_limit = None
+        self.event_limits = {}
+
+        self._clients = OrderedDict()
+        self._ips = OrderedDict()
+        self._events = OrderedDict()
+
+        self.configure(limits)
+
+    def configure(self, limits):
+        """Set new limits and drop all buckets"""
+
+        limits = dict(limits or {})
+
+        self.client_limit = _limit(limits.pop("client", None))
+        self.ip_limit = _limit(limits.pop("ip", None))
+        self.event_limits = {
+            name: _limit(definition) for name, definition in limits.items()
+        }
+
+        self._clients.clear()
+        self._ips.clear()
+        self._events.clear()
+
+    def _consume(self, buckets, key, limit, now):
+        bucket = buckets.get(key, None)
+
+        if bucket is None:
+            if len(buckets) >= self.max_buckets:
+                self._prune(buckets, now)
+            bucket = buckets[key] = TokenBucket(limit[0], limit[1], now)
+        else:
+            buckets.move_to_end(key)
+
+        return bucket.consume(now)
+
+    def _prune(self, buckets, now):
+        for key in [key for key, bucket in buckets.items() if bucket.idle(now)]:
+            del buckets[key]
+
+        while len(buckets) >= self.max_buckets:
+            buckets.popitem(last=False)
+
+    def check(self, clientuuid, ip, now=None):
+        """Account a message of a client, returns the name of the exceeded
+        limit ('client' or 'ip') or None"""
+
+        if now is None:
+            now = monotonic()
+
+        if self.client_limit is not None and not self._consume(
+                self._clients, clientuuid, self.client_limit, now
+        ):
+            return "client"
+
+        if self.ip_limit is not None and not self._consume(
+                self._ips, ip, self.ip_limit, now
+        ):
+            return "ip"
+
+        return None
+
+    def check_event(self, clientuuid, component, action, now=None):
+        """Account a request of a client for an event class, returns 'event',
+        if its limit is exceeded, None otherwise"""
+
+        limit = self.event_limits.get(component + "." + action, None)
+        if limit is None:
+            return None
+
+        if now is None:
+            now = monotonic()
+
+        buckets = self._events.get(clientuuid, None)
+        if buckets is None:
+            while len(self._events) >= self.max_buckets:
+                self._events.popitem(last=False)
+            buckets = self._events[clientuuid] = OrderedDict()
+        else:
+            self._events.move_to_end(clientuuid)
+
+        if not self._consume(buckets, (component, action), limit, now):
+            return "event"
+
+        return None
+
+    def forget(self, clientuuid):
+        """Drop the buckets of a disconnected client"""
+
+        self._clients.pop(clientuuid, None)
+        self._events.pop(clientuuid, None)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: Sessions
+================
+
+Signed, expiring session tokens.
+
+A token is handed to a client after it logged in. When its websocket drops,
+the client's user and client objects are kept for a grace period, during
+which a new connection can present the token to resume the session without
+another login.
+
+Tokens are signed with a per process secret, as the sessions they refer to
+only exist in this process' memory anyway. Every token also carries a
+random session nonce, which is stored on the client. Renewing the nonce on
+resumption or clearing it on logout revokes all earlier tokens.
+
+"""
+
+import hmac
+import os
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import sha256
+from time import time
+
+
+class SessionTokens(object):
+    """Issues and verifies session tokens"""
+
+    def __init__(self, lifetime, secret=None):
+        self.lifetime = lifetime
+        self._secret = secret if secret is not None else os.urandom(32)
+
+    def _sign(self, payload):
+        return hmac.new(self._secret, payload, sha256).digest()
+
+    @staticmethod
+    def new_nonce():
+        """Return a new random session nonce"""
+
+        return os.urandom(12).hex()
+
+    def issue(self, useruuid, clientuuid, nonce, now=None):
+        """Return a token for a logged in client's session nonce"""
+
+        if now is None:
+            now = time()
+
+        expires = int(now + self.lifetime)
+        payload = ("%s:%s:%s:%i" % (useruuid, clientuuid, nonce, expires)).encode(
+            "ascii"
+        )
+
+        return "%s.%s" % (
+            urlsafe_b64encode(payload).decode("ascii"),
+            urlsafe_b64encode(self._sign(payload)).decode("ascii"),
+        )
+
+    def verify(self, token, now=None):
+        """Return (useruuid, clientuuid, nonce) of a valid token, None
+        otherwise"""
+
+        if now is None:
+            now = time()
+
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = urlsafe_b64decode(encoded_payload)
+            signature = urlsafe_b64decode(encoded_signature)
+
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                return None
+
+            useruuid, clientuuid, nonce, expires = payload.decode("ascii").split(":")
+            if int(expires) < now:
+                return None
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+        return useruuid, clientuuid, nonce
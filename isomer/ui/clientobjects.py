@@ -78,6 +78,12 @@ class Client(object):
         self.config = config
         self.language = language
 
+        # Set while the client waits for a session resume without a socket
+        self.detached = None
+        self.backlog = None
+        # Nonce of the currently valid session token
+        self.session = None
+
     def __repr__(self):
         return self.name
 
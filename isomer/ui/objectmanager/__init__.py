@@ -28,10 +28,10 @@ publish/subscriber functionality.
 
 """
 
-from isomer.ui.objectmanager.subscriptions import SubscriptionOperations
+from isomer.ui.objectmanager.watcher import WatchOperations
 
 
-class ObjectManager(SubscriptionOperations):
+class ObjectManager(WatchOperations):
     """Combined functionality object management component"""
 
     pass
@@ -29,9 +29,15 @@ Basic object management functionality and component set up.
 
 from isomer.component import ConfigurableComponent
 from isomer.database import objectmodels
-from isomer.schemastore import schemastore
+from isomer.permissions import (
+    check_permissions,
+    check_create_permission,
+    get_compiled,
+    permission_filter,
+)
 
 from isomer.events.client import send
+from isomer.ui.objectmanager.registry import SubscriptionRegistry
 from isomer.logger import verbose, warn, error
 
 
@@ -42,72 +48,90 @@ class ObjectBaseManager(ConfigurableComponent):
 
     channel = "isomer-web"
 
-    configprops = {}
+    configprops = {
+        "query_filtering": {
+            "type": "boolean",
+            "title": "Filter by permissions in database",
+            "description": "Let the database filter list and search results by "
+                           "the requesting user's roles",
+            "default": True,
+        },
+        "chunk_size": {
+            "type": "integer",
+            "title": "Streaming chunk size",
+            "description": "Number of objects per chunk of streamed search results",
+            "default": 100,
+        },
+        "watch_changes": {
+            "type": "boolean",
+            "title": "Watch database changes",
+            "description": "Forward changes made by other nodes or tools to "
+                           "subscribers (uses change streams or the oplog)",
+            "default": False,
+        },
+        "watch_schemata": {
+            "type": "array",
+            "items": {"type": "string"},
+            "title": "Watched schemata",
+            "description": "Schemata to watch for changes, all if empty",
+            "default": [],
+        },
+        "watch_interval": {
+            "type": "number",
+            "title": "Watch interval",
+            "description": "Maximum time in seconds to wait for changes per poll",
+            "default": 1.0,
+        },
+    }
 
     def __init__(self, *args, **kwargs):
         super(ObjectBaseManager, self).__init__("OM", *args, **kwargs)
 
-        self.subscriptions = {}
+        self.subscriptions = SubscriptionRegistry()
 
         self.log("Started")
 
-    def _check_permissions(self, schema, subject, action, obj):
-        # TODO:
-        #  * Clean up
-        #  * Rewrite (simplify?) administrative access
-        #  * Write testsuite
-
-        self.log('Roles of user:', subject.account.roles, lvl=verbose)
-        schema_object = schemastore[schema]['schema']
-        self.log('Schema:', schema_object, lvl=verbose, pretty=True)
-
-        # First check administrative access, it overrides everything
-        if "perms" not in obj._fields:
-            if "admin" in subject.account.roles:
-                self.log('Access to administrative object granted', lvl=verbose)
-                return True
-            else:
-                self.log('Access to administrative object failed', lvl=verbose)
-                return False
-
-        # Secondly check special functionality (like moderation)
-        specials = schemastore[schema].get('specials', None)
-        if specials is not None:
-            action_check = specials.get(action, None)
-
-            if action_check is not None:
-                if action_check(obj, subject.roles) is False:
-                    self.log("Action check failed for", action)
-                    return False
-
-        # Third: Check if user is the owner
-        if "owner" in obj.perms[action]:
-            try:
-                if subject.uuid == obj.owner:
-                    self.log('Access granted via ownership', lvl=verbose)
-                    return True
-            except AttributeError as e:
-                self.log(
-                    "Schema has ownership permission but no owner:",
-                    obj._schema["name"],
-                    lvl=verbose,
-                )
+    def _check_permissions(self, schema, subject, action, obj, roles=None):
+        """Check if a subject is allowed to execute an action on an object
+
+        Evaluation uses the precompiled schema permissions and cached
+        decisions, see :mod:`isomer.permissions`.
+        """
+
+        try:
+            granted = check_permissions(schema, subject, action, obj, roles)
+        except (KeyError, AttributeError) as e:
+            self.log("Permission check failed:", schema, action, e, type(e),
+                     lvl=warn)
+            return False
 
-        # Fourth: Check if general RBAC rules allow accessing this object
-        for role in subject.account.roles:
-            if role in obj.perms[action]:
-                self.log('Access granted', lvl=verbose)
-                return True
+        if not granted:
+            self.log("Access denied", schema, action, lvl=verbose)
 
-        self.log("Access denied", lvl=verbose)
-        return False
+        return granted
 
     @staticmethod
     def _check_create_permission(subject, schema):
-        for role in subject.account.roles:
-            if role in schemastore[schema]["schema"]["roles_create"]:
-                return True
-        return False
+        return check_create_permission(schema, subject)
+
+    def _filter_by_permission(self, schema, subject, action, object_filter, roles=None):
+        """Merge a subject's permissions into an object filter
+
+        Returns the resulting filter and whether the found objects still have
+        to be checked individually.
+        """
+
+        if not self.config.query_filtering:
+            return object_filter, True
+
+        rbac_filter = permission_filter(subject, action, roles)
+
+        if len(object_filter) > 0:
+            object_filter = {"$and": [object_filter, rbac_filter]}
+        else:
+            object_filter = rbac_filter
+
+        return object_filter, action in get_compiled(schema).specials
 
     def _cancel_by_permission(self, schema, data, event):
         self.log("No permission:", schema, data, event.user.uuid, lvl=warn)
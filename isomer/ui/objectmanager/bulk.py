@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: objectmanager.bulk
+==========================
+
+Bulk variants of the CRUD and role operations.
+
+Every bulk request fetches all involved objects with one ``$in`` query,
+stores all changes with one ``bulk_write`` and answers with one aggregated
+response. Subscribers receive one coalesced notification per client.
+
+
+"""
+
+from uuid import uuid4
+
+from pymongo import ReplaceOne, UpdateOne
+
+from isomer.component import handler
+from isomer.database import objectmodels, ValidationError
+from isomer.schemastore import schemastore
+from isomer.events.objectmanager import (
+    getmany,
+    putmany,
+    changemany,
+    deletemany,
+    changeroles,
+    objectchange,
+    objectcreation,
+    objectdeletion,
+)
+from isomer.logger import warn, debug, error
+from isomer.misc.std import std_color
+from isomer.permissions import get_roles, get_compiled, get_fields
+from isomer.ui.objectmanager.crud import validate_field
+from isomer.ui.objectmanager.subscriptions import SubscriptionOperations
+
+
+class BulkOperations(SubscriptionOperations):
+    """Adds bulk variants of the object operations"""
+
+    def _get_uuids(self, event, data):
+        """Extract a non-empty list of object uuids from a request"""
+
+        uuids = data.get("uuid", None)
+
+        if uuids is None:
+            self._cancel_by_error(event, "missing_args")
+            return None
+
+        if not isinstance(uuids, list):
+            uuids = [uuids]
+
+        return [str(uuid) for uuid in uuids]
+
+    def _respond_many(self, action, schema, event, **data):
+        """Send the aggregated response of a bulk request"""
+
+        data["schema"] = schema
+        result = {
+            "component": "isomer.events.objectmanager",
+            "action": action,
+            "data": data,
+        }
+        self._respond(None, result, event)
+
+    @handler(getmany)
+    def getmany(self, event):
+        """Get a number of specified objects"""
+
+        try:
+            data, schema, user, client = self._get_args(event)
+        except AttributeError:
+            return
+
+        uuids = self._get_uuids(event, data)
+        if uuids is None:
+            return
+
+        roles = get_roles(user)
+        object_filter, check_items = self._filter_by_permission(
+            schema, user, "read", {"uuid": {"$in": uuids}}, roles
+        )
+
+        hidden = schemastore[schema].get("options", {}).get("hidden", [])
+        do_subscribe = data.get("subscribe", False) is True
+
+        objects = []
+
+        for storage_object in objectmodels[schema].find(object_filter):
+            if check_items and not self._check_permissions(
+                schema, user, "read", storage_object, roles
+            ):
+                continue
+
+            for field in hidden:
+                storage_object._fields.pop(field, None)
+
+            if do_subscribe:
+                self._add_subscription(storage_object.uuid, event, schema)
+
+            objects.append(storage_object.serializablefields())
+
+        found = set(item["uuid"] for item in objects)
+        missing = [uuid for uuid in uuids if uuid not in found]
+
+        self._respond_many("getmany", schema, event, objects=objects, missing=missing)
+
+    @handler(putmany)
+    def putmany(self, event):
+        """Put a number of objects"""
+
+        try:
+            data, schema, user, client = self._get_args(event)
+        except AttributeError:
+            return
+
+        client_objects = data.get("objs", None)
+
+        if not isinstance(client_objects, list):
+            self.log("Put request with missing arguments!", data, lvl=warn)
+            self._cancel_by_error(event, "missing_args")
+            return
+
+        model = objectmodels[schema]
+        roles = get_roles(user)
+
+        uuids = [
+            item.get("uuid", "create")
+            for item in client_objects
+            if isinstance(item, dict) and item.get("uuid", "create") != "create"
+        ]
+        stored = {
+            storage_object.uuid: storage_object
+            for storage_object in model.find({"uuid": {"$in": uuids}})
+        }
+
+        may_create = None
+        failed = []
+        created = []
+        changed = []
+        requests = []
+
+        for client_object in client_objects:
+            if not isinstance(client_object, dict):
+                failed.append({"uuid": None, "reason": "malformed"})
+                continue
+
+            uuid = client_object.get("uuid", "create")
+            client_object.pop("_id", None)
+
+            try:
+                client_object = self._validate(schema, model, client_object)
+            except ValidationError:
+                failed.append({"uuid": uuid, "reason": "invalid_object"})
+                continue
+
+            storage_object = stored.get(uuid, None)
+
+            if storage_object is None:
+                if may_create is None:
+                    may_create = self._check_create_permission(user, schema)
+                if not may_create:
+                    failed.append({"uuid": uuid, "reason": "no_permission"})
+                    continue
+
+                if uuid == "create":
+                    uuid = str(uuid4())
+                client_object["uuid"] = uuid
+                client_object["owner"] = user.uuid
+                storage_object = model(client_object)
+                created.append(storage_object)
+            else:
+                if not self._check_permissions(
+                    schema, user, "write", storage_object, roles
+                ):
+                    failed.append({"uuid": uuid, "reason": "no_permission"})
+                    continue
+
+                storage_object._fields.update(client_object)
+                try:
+                    storage_object.validate()
+                except ValidationError:
+                    self.log("Validation of changed object failed!", uuid, lvl=warn)
+                    failed.append({"uuid": uuid, "reason": "invalid_object"})
+                    continue
+
+                changed.append(storage_object)
+
+            if storage_object._fields.get("color", None) is None:
+                storage_object._fields["color"] = std_color()
+
+            requests.append(
+                ReplaceOne({"uuid": uuid}, storage_object._fields, upsert=True)
+            )
+
+        if len(requests) > 0:
+            try:
+                model.collection().bulk_write(requests, ordered=False)
+            except Exception as e:
+                self.log("Error during bulk object storage:", e, type(e), lvl=error,
+                         exc=True)
+                self._cancel_by_error(event, "storage_failed")
+                return
+
+            self.log("Stored", len(requests), "objects of", schema, lvl=debug)
+
+        for storage_object in created:
+            self.fireEvent(objectcreation(storage_object.uuid, schema, client))
+        for storage_object in changed:
+            self.fireEvent(objectchange(storage_object.uuid, schema, client))
+
+        self._update_subscribers_many(schema, changed)
+
+        self._respond_many(
+            "putmany",
+            schema,
+            event,
+            created=[storage_object.uuid for storage_object in created],
+            changed=[storage_object.uuid for storage_object in changed],
+            failed=failed,
+        )
+
+    @handler(changemany)
+    def changemany(self, event):
+        """Change a number of existing objects
+
+        Accepts either a list of individual changes (``changes`` with uuid,
+        field and value) or one ``change`` to be applied to all given uuids.
+        """
+
+        try:
+            data, schema, user, client = self._get_args(event)
+        except AttributeError:
+            return
+
+        try:
+            if "changes" in data:
+                changes = [
+                    (str(item["uuid"]), item["field"], item["value"])
+                    for item in data["changes"]
+                ]
+            else:
+                object_change = data["change"]
+                uuids = data["uuid"]
+                if not isinstance(uuids, list):
+                    uuids = [uuids]
+                changes = [
+                    (str(uuid), object_change["field"], object_change["value"])
+                    for uuid in uuids
+                ]
+        except (KeyError, TypeError) as e:
+            self.log("Update request with missing arguments!", data, e, lvl=warn)
+            self._cancel_by_error(event, "missing_args")
+            return
+
+        model = objectmodels[schema]
+        roles = get_roles(user)
+
+        stored = {
+            storage_object.uuid: storage_object
+            for storage_object in model.find(
+                {"uuid": {"$in": list(set(change[0] for change in changes))}}
+            )
+        }
+
+        updates = {}
+        failed = []
+
+        for uuid, field, value in changes:
+            storage_object = stored.get(uuid, None)
+
+            if storage_object is None:
+                failed.append({"uuid": uuid, "reason": "not_found"})
+                continue
+
+            if uuid not in updates and not self._check_permissions(
+                schema, user, "write", storage_object, roles
+            ):
+                failed.append({"uuid": uuid, "reason": "no_permission"})
+                stored.pop(uuid)
+                continue
+
+            try:
+                validate_field(schema, field, value)
+            except ValidationError:
+                self.log("Validation of changed field failed!", uuid, field, lvl=warn)
+                failed.append({"uuid": uuid, "reason": "invalid_object"})
+                continue
+
+            storage_object._fields[field] = value
+            updates.setdefault(uuid, {})[field] = value
+
+        changed = []
+        requests = []
+
+        for uuid, fields in updates.items():
+            changed.append(stored[uuid])
+            requests.append(UpdateOne({"uuid": uuid}, {"$set": fields}))
+
+        if len(requests) > 0:
+            try:
+                model.collection().bulk_write(requests, ordered=False)
+            except Exception as e:
+                self.log("Error during bulk object change:", e, type(e), lvl=error,
+                         exc=True)
+                self._cancel_by_error(event, "storage_failed")
+                return
+
+            self.log("Changed", len(requests), "objects of", schema, lvl=debug)
+
+        for storage_object in changed:
+            self.fireEvent(objectchange(storage_object.uuid, schema, client))
+
+        self._update_subscribers_many(schema, changed)
+
+        self._respond_many(
+            "changemany",
+            schema,
+            event,
+            uuid=[storage_object.uuid for storage_object in changed],
+            failed=failed,
+        )
+
+    @handler(deletemany)
+    def deletemany(self, event):
+        """Delete a number of existing objects"""
+
+        try:
+            data, schema, user, client = self._get_args(event)
+        except AttributeError:
+            return
+
+        uuids = self._get_uuids(event, data)
+        if uuids is None:
+            return
+
+        model = objectmodels[schema]
+        collection = model.collection()
+        query = {"uuid": {"$in": uuids}}
+        roles = get_roles(user)
+
+        # Special permission checks need complete objects, not projections
+        if "write" in get_compiled(schema).specials:
+            documents = model.find(query)
+        else:
+            projection = {"_id": 0, "uuid": 1, "perms": 1, "owner": 1}
+            documents = collection.find(query, projection)
+
+        deleted = []
+        denied = []
+        found = set()
+
+        for document in documents:
+            uuid = get_fields(document)["uuid"]
+            found.add(uuid)
+            if self._check_permissions(schema, user, "write", document, roles):
+                deleted.append(uuid)
+            else:
+                denied.append(uuid)
+
+        missing = [uuid for uuid in uuids if uuid not in found]
+
+        if len(deleted) > 0:
+            collection.delete_many({"uuid": {"$in": deleted}})
+            self.log("Deleted", len(deleted), "objects of", schema, lvl=debug)
+
+            for uuid in deleted:
+                self.fireEvent(objectdeletion(uuid, schema, client))
+
+            self._notify_deletions(schema, deleted)
+
+        self._respond_many(
+            "deletemany", schema, event, uuid=deleted, denied=denied, missing=missing
+        )
+
+    @handler(changeroles)
+    def changeroles(self, event):
+        """Add or remove a role on a number of objects"""
+
+        try:
+            data, schema, user, client = self._get_args(event)
+        except AttributeError:
+            return
+
+        mode = data.get("mode", None)
+        if mode not in ("add", "remove"):
+            self._cancel_by_error(event, "missing_args")
+            return
+
+        result = self._role_request(event, add=mode == "add")
+
+        if result is None:
+            self._cancel_by_error(event, "missing_args")
+            return
+
+        changed, denied, missing = result
+
+        self._respond_many(
+            "changeroles", schema, event, uuid=changed, denied=denied, missing=missing
+        )
@@ -51,4 +51,5 @@ class CliManager(ObjectBaseManager):
 
     @handler("cli_subscriptions")
     def cli_subscriptions(self, event):
-        self.log("Subscriptions", self.subscriptions, pretty=True)
+        self.log("Subscriptions", self.subscriptions)
+        self.log("Objects", self.subscriptions.objects, pretty=True)
@@ -35,11 +35,15 @@ CRUD operations for objects. CRUD stands for
 
 from uuid import uuid4
 from ast import literal_eval
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+
+from bson import json_util
+from jsonschema import Draft4Validator
 
 from isomer.component import handler
 from isomer.database import objectmodels, ValidationError
 from isomer.schemastore import schemastore
-from isomer.events.client import send
+from isomer.events.client import broadcast
 from isomer.events.objectmanager import (
     get,
     search,
@@ -54,12 +58,134 @@ from isomer.events.objectmanager import (
 from isomer.logger import warn, verbose, error, debug, critical
 from isomer.misc import nested_map_find, nested_map_update
 from isomer.misc.std import std_uuid
+from isomer.permissions import (
+    get_compiled,
+    get_fields,
+    get_roles,
+)
 from pymongo import ASCENDING, DESCENDING
 
 from isomer.ui.objectmanager.cli import CliManager
 
 WARN_SIZE = 500
 
+# Always fetched, to identify objects and check permissions
+PROJECTION_FIELDS = ("uuid", "name", "perms", "owner")
+
+_field_validators = {}
+
+
+def _get_value(document, key):
+    """Get a (possibly nested, dotted) value from a document"""
+
+    value = document
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part, None)
+
+    return value
+
+
+def get_continuation_token(sort, document):
+    """Generate an opaque token to continue a sorted search after a document"""
+
+    state = {
+        "keys": [key for key, _ in sort],
+        "values": [_get_value(document, key) for key, _ in sort],
+    }
+
+    return urlsafe_b64encode(json_util.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def get_continuation_filter(sort, token):
+    """Generate a filter that matches all documents sorted after the object
+    a continuation token was generated from
+
+    Missing and null values sort before all other values. The sort order
+    should end with a unique key, so documents with equal values are
+    neither skipped nor repeated.
+    """
+
+    state = json_util.loads(urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+    keys = [key for key, _ in sort]
+
+    if state["keys"] != keys:
+        raise ValueError("Continuation token does not match sort order")
+
+    values = state["values"]
+    alternatives = []
+
+    for index, (key, direction) in enumerate(sort):
+        alternative = {keys[i]: values[i] for i in range(index)}
+        value = values[index]
+
+        if direction == ASCENDING:
+            if value is None:
+                alternative[key] = {"$ne": None}
+            else:
+                alternative[key] = {"$gt": value}
+        else:
+            if value is None:
+                # Nothing sorts after null values, the next keys decide
+                continue
+            alternative["$or"] = [{key: {"$lt": value}}, {key: None}]
+
+        alternatives.append(alternative)
+
+    if len(alternatives) == 0:
+        # Nothing can follow, match no document at all
+        return {"_id": {"$exists": False}}
+
+    return {"$or": alternatives}
+
+
+def get_field_validator(schema_name, field):
+    """Return a (cached) validator for a single top level field of a schema
+
+    Local references are resolved against the schema's definitions.
+    Returns None if the schema does not allow this field.
+    """
+
+    schema = schemastore[schema_name]["schema"]
+    key = (schema_name, id(schema), field)
+
+    try:
+        return _field_validators[key]
+    except KeyError:
+        pass
+
+    subschema = schema.get("properties", {}).get(field, None)
+
+    if subschema is None:
+        additional = schema.get("additionalProperties", True)
+        if additional is False:
+            return None
+        subschema = additional if isinstance(additional, dict) else {}
+
+    subschema = dict(subschema)
+    if "definitions" in schema:
+        subschema["definitions"] = schema["definitions"]
+
+    validator = Draft4Validator(subschema)
+    _field_validators[key] = validator
+
+    return validator
+
+
+def validate_field(schema_name, field, value):
+    """Validate a single changed top level field instead of the whole object"""
+
+    if field in ("", "_id") or field.startswith("$") or "." in field:
+        raise ValidationError("Field cannot be changed: %s" % field)
+
+    validator = get_field_validator(schema_name, field)
+
+    if validator is None:
+        raise ValidationError("Unknown field: %s" % field)
+
+    validator.validate(value)
+
 
 class CrudOperations(CliManager):
     """Adds CRUD (create, read, update, delete) functionality"""
@@ -117,7 +243,7 @@ class CrudOperations(CliManager):
                 storage_object._fields.pop(field, None)
 
             if do_subscribe and uuid != "":
-                self._add_subscription(uuid, event)
+                self._add_subscription(uuid, event, schema)
 
             result = {
                 "component": "isomer.events.objectmanager",
@@ -187,6 +313,23 @@ class CrudOperations(CliManager):
 
         object_list = []
 
+        roles = get_roles(user)
+        object_filter, check_items = self._filter_by_permission(
+            schema, user, "list", object_filter, roles
+        )
+
+        opts = schemastore[schema].get("options", {})
+        hidden = opts.get("hidden", [])
+
+        # Special permission checks need complete objects, not projections
+        complete = check_items and "list" in get_compiled(schema).specials
+
+        if data.get("stream", False) is True:
+            return self._stream_search(
+                event, schema, user, object_filter, fields, hidden, roles,
+                check_items, do_subscribe, complete
+            )
+
         size = objectmodels[schema].count(object_filter)
 
         if size > WARN_SIZE and (limit > 0 and limit > WARN_SIZE):
@@ -194,9 +337,6 @@ class CrudOperations(CliManager):
                 "Getting a very long (", size, ") list of items for ", schema, lvl=warn
             )
 
-        opts = schemastore[schema].get("options", {})
-        hidden = opts.get("hidden", [])
-
         self.log(
             "result: ",
             object_filter,
@@ -215,49 +355,44 @@ class CrudOperations(CliManager):
             if limit > 0:
                 options["limit"] = limit
             if sort is not None:
-                options["sort"] = []
-                for thing in sort:
-                    key = thing[0]
-                    direction = thing[1]
-                    direction = ASCENDING if direction == "asc" else DESCENDING
-                    options["sort"].append([key, direction])
+                options["sort"] = self._get_sort(sort)
 
             return options
 
-        cursor = objectmodels[schema].find(object_filter, **get_options())
+        projected = fields not in ("*", ["*"])
+
+        if projected and not complete:
+            # Only transfer the requested fields and skip model construction
+            projection = self._get_projection(fields, hidden)
+            cursor = objectmodels[schema].collection().find(
+                object_filter, projection, **get_options()
+            )
+        else:
+            # Complete objects, requested or needed by special permission checks
+            cursor = objectmodels[schema].find(object_filter, **get_options())
 
         for item in cursor:
-            if not self._check_permissions(schema, user, "list", item):
+            if check_items and not self._check_permissions(
+                schema, user, "list", item, roles
+            ):
                 continue
             self.log("Search found item: ", item, lvl=verbose)
 
-            try:
-                list_item = {"uuid": item.uuid}
-                if fields in ("*", ["*"]):
-                    item_fields = item.serializablefields()
-                    for field in hidden:
-                        item_fields.pop(field, None)
-                    object_list.append(item_fields)
-                else:
-                    if "name" in item._fields:
-                        list_item["name"] = item.name
-
-                    for field in fields:
-                        if field in item._fields and field not in hidden:
-                            list_item[field] = item._fields[field]
-                        else:
-                            list_item[field] = None
+            item_fields = get_fields(item)
 
-                    object_list.append(list_item)
+            try:
+                object_list.append(
+                    self._get_list_item(item, fields, hidden, projected)
+                )
 
                 if do_subscribe:
-                    self._add_subscription(item.uuid, event)
+                    self._add_subscription(item_fields["uuid"], event)
             except Exception as e:
                 self.log(
                     "Faulty object or field: ",
                     e,
                     type(e),
-                    item._fields,
+                    item_fields,
                     fields,
                     lvl=error,
                     exc=True,
@@ -272,6 +407,182 @@ class CrudOperations(CliManager):
 
         self._respond(None, result, event)
 
+    def _stream_search(
+        self, event, schema, user, object_filter, fields, hidden, roles,
+        check_items, do_subscribe, complete=False
+    ):
+        """Stream search results in chunks, directly from the database cursor
+
+        Deep pages are addressed by continuation tokens carrying the sort key
+        values of the last transmitted object, instead of skipping results.
+        """
+
+        data = event.data
+
+        try:
+            chunk_size = max(1, int(data.get("chunk_size", self.config.chunk_size)))
+            limit = max(0, int(data.get("limit", 0)))
+        except (TypeError, ValueError):
+            self._cancel_by_error(event, "invalid_arguments")
+            return
+
+        sort = self._get_sort(data.get("sort", None) or [])
+
+        if any(key.split(".", 1)[0] in hidden for key, _ in sort):
+            # Continuation tokens would disclose the values of hidden fields
+            self._cancel_by_error(event, "invalid_sort")
+            return
+
+        # Unique tie-breaker, so equal sort values cannot skip or repeat objects
+        if "uuid" not in [key for key, _ in sort]:
+            sort.append(("uuid", ASCENDING))
+
+        token = data.get("continue", None)
+        if token is not None:
+            try:
+                continuation = get_continuation_filter(sort, token)
+            except (ValueError, TypeError, KeyError):
+                self._cancel_by_error(event, "invalid_continuation")
+                return
+
+            if len(object_filter) > 0:
+                object_filter = {"$and": [object_filter, continuation]}
+            else:
+                object_filter = continuation
+
+        model = objectmodels[schema]
+        projected = fields not in ("*", ["*"])
+
+        if projected and not complete:
+            projection = self._get_projection(
+                list(fields) + [key for key, _ in sort], hidden
+            )
+        else:
+            projection = None
+
+        cursor = model.collection().find(
+            object_filter, projection, sort=sort, limit=limit, batch_size=chunk_size
+        )
+
+        chunk = []
+        chunk_number = 0
+        fetched = 0
+        last_document = None
+
+        for document in cursor:
+            fetched += 1
+            last_document = document
+
+            if projection is not None:
+                item = document
+            else:
+                item = model(document, from_find=True)
+
+            if check_items and not self._check_permissions(
+                schema, user, "list", item, roles
+            ):
+                continue
+
+            try:
+                chunk.append(self._get_list_item(item, fields, hidden, projected))
+
+                if do_subscribe:
+                    self._add_subscription(document["uuid"], event)
+            except Exception as e:
+                self.log("Faulty object or field: ", e, type(e), document, fields,
+                         lvl=error, exc=True)
+
+            if len(chunk) >= chunk_size:
+                self._send_chunk(event, schema, chunk, chunk_number)
+                chunk = []
+                chunk_number += 1
+
+                # Allow other events to be processed between chunks
+                yield
+
+        if limit > 0 and fetched == limit:
+            token = get_continuation_token(sort, last_document)
+        else:
+            token = None
+
+        self._send_chunk(event, schema, chunk, chunk_number, True, token)
+
+    def _send_chunk(self, event, schema, chunk, number, complete=False, token=None):
+        """Transmit a chunk of streamed search results"""
+
+        result = {
+            "component": "isomer.events.objectmanager",
+            "action": "search",
+            "data": {
+                "schema": schema,
+                "list": chunk,
+                "chunk": number,
+                "complete": complete,
+                "continue": token,
+            },
+        }
+
+        self._respond(None, result, event)
+
+    @staticmethod
+    def _get_sort(sort):
+        """Translate client sort specifications into a database sort order"""
+
+        result = []
+
+        for thing in sort:
+            key = thing[0]
+            direction = thing[1]
+            direction = ASCENDING if direction == "asc" else DESCENDING
+            result.append((key, direction))
+
+        return result
+
+    @staticmethod
+    def _get_list_item(item, fields, hidden, projected):
+        """Assemble a search result entry from a document or model"""
+
+        if not projected:
+            serializable_fields = item.serializablefields()
+            for field in hidden:
+                serializable_fields.pop(field, None)
+
+            return serializable_fields
+
+        item_fields = get_fields(item)
+        list_item = {"uuid": item_fields["uuid"]}
+
+        if "name" in item_fields:
+            list_item["name"] = item_fields["name"]
+
+        for field in fields:
+            if field in item_fields and field not in hidden:
+                list_item[field] = item_fields[field]
+            else:
+                list_item[field] = None
+
+        return list_item
+
+    @staticmethod
+    def _get_projection(fields, hidden):
+        """Assemble a database projection for requested list fields plus the
+        fields necessary for permission checks"""
+
+        projection = {"_id": False}
+
+        for field in PROJECTION_FIELDS:
+            projection[field] = True
+
+        for field in fields:
+            if field in hidden:
+                continue
+            if field.split(".", 1)[0] in PROJECTION_FIELDS:
+                continue
+
+            projection[field] = True
+
+        return projection
+
     @handler(getlist)
     def objectlist(self, event):
         """Get a list of objects"""
@@ -297,13 +608,20 @@ class CrudOperations(CliManager):
         opts = schemastore[schema].get("options", {})
         hidden = opts.get("hidden", [])
 
+        roles = get_roles(user)
+        object_filter, check_items = self._filter_by_permission(
+            schema, user, "list", object_filter, roles
+        )
+
         if objectmodels[schema].count(object_filter) > WARN_SIZE:
             self.log("Getting a very long list of items for ", schema, lvl=warn)
 
         try:
             for item in objectmodels[schema].find(object_filter):
                 try:
-                    if not self._check_permissions(schema, user, "list", item):
+                    if check_items and not self._check_permissions(
+                        schema, user, "list", item, roles
+                    ):
                         continue
                     if fields in ("*", ["*"]):
                         item_fields = item.serializablefields()
@@ -364,10 +682,17 @@ class CrudOperations(CliManager):
             self._cancel_by_error(event, "missing_args")
             return
 
+        model = objectmodels[schema]
+        collection = model.collection()
+        projection = {"_id": 0, "uuid": 1, "perms": 1, "owner": 1}
         storage_object = None
 
         try:
-            storage_object = objectmodels[schema].find_one({"uuid": uuid})
+            # Special permission checks need complete objects, not projections
+            if "write" in get_compiled(schema).specials:
+                storage_object = model.find_one({"uuid": uuid})
+            else:
+                storage_object = collection.find_one({"uuid": uuid}, projection)
         except Exception as e:
             self.log("Change for unknown object requested:", e, schema, data, lvl=warn)
 
@@ -379,24 +704,29 @@ class CrudOperations(CliManager):
             self._cancel_by_permission(schema, data, event)
             return
 
-        self.log("Changing object:", storage_object._fields, lvl=debug)
-        storage_object._fields[field] = new_data
-
-        self.log("Storing object:", storage_object._fields, lvl=debug)
         try:
-            storage_object.validate()
-        except ValidationError:
-            self.log("Validation of changed object failed!", storage_object, lvl=warn)
+            validate_field(schema, field, new_data)
+        except ValidationError as e:
+            self.log("Validation of changed field failed!", field, e, lvl=warn)
             self._cancel_by_error(event, "invalid_object")
             return
 
-        storage_object.save()
+        self.log("Changing object:", uuid, field, lvl=debug)
+        update = collection.update_one({"uuid": uuid}, {"$set": {field: new_data}})
+
+        if update.matched_count == 0:
+            self._cancel_by_error(event, "not_found")
+            return
 
         self.log("Object stored.")
 
-        notification = objectchange(storage_object.uuid, schema, client)
+        notification = objectchange(uuid, schema, client)
 
-        self._update_subscribers(schema, storage_object)
+        if uuid in self.subscriptions:
+            # Only fetch the post-image when someone is interested in it
+            storage_object = model.find_one({"uuid": uuid})
+            if storage_object is not None:
+                self._update_subscribers(schema, storage_object)
 
         result = {
             "component": "isomer.events.objectmanager",
@@ -596,10 +926,8 @@ class CrudOperations(CliManager):
                         "action": "deletion",
                         "data": {"schema": schema, "uuid": uuid},
                     }
-                    for recipient in self.subscriptions[uuid]:
-                        self.fireEvent(send(recipient, deletion))
-
-                    del self.subscriptions[uuid]
+                    recipients = list(self.subscriptions.remove_object(uuid))
+                    self.fireEvent(broadcast("clientgroup", deletion, group=recipients))
 
                 result = {
                     "component": "isomer.events.objectmanager",
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: objectmanager.registry
+==============================
+
+Indexed registry of object subscriptions.
+
+Subscriptions are stored per object, with reverse indices per client and per
+schema, so that disconnecting clients and deleted objects can be cleaned up
+without scanning all subscriptions. Read permission decisions of subscribers
+are cached per object version, i.e. the recipient's roles and the object's
+owner and read permissions.
+
+
+"""
+
+
+class SubscriptionRegistry(object):
+    """Object subscriptions with per client and per schema reverse indices"""
+
+    def __init__(self):
+        self.objects = {}
+        self.clients = {}
+        self.schemata = {}
+        self.object_schemata = {}
+        self.decisions = {}
+        self.updates = {}
+
+    def __contains__(self, uuid):
+        return uuid in self.objects
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __repr__(self):
+        return "<SubscriptionRegistry objects=%i clients=%i schemata=%s>" % (
+            len(self.objects),
+            len(self.clients),
+            {schema: len(uuids) for schema, uuids in self.schemata.items()},
+        )
+
+    def add(self, uuid, client, user, schema=None):
+        """Subscribe a client's user to an object"""
+
+        self.objects.setdefault(uuid, {})[client] = user
+        self.clients.setdefault(client, set()).add(uuid)
+
+        if schema is not None:
+            self.set_schema(uuid, schema)
+
+    def set_schema(self, uuid, schema):
+        """Record the schema of a subscribed object"""
+
+        if uuid not in self.objects or self.object_schemata.get(uuid) == schema:
+            return
+
+        self.object_schemata[uuid] = schema
+        self.schemata.setdefault(schema, set()).add(uuid)
+
+    def remove(self, uuid, client):
+        """Unsubscribe a single client from an object"""
+
+        recipients = self.objects.get(uuid, None)
+        if recipients is None or client not in recipients:
+            return False
+
+        del recipients[client]
+        self.decisions.pop((client, uuid), None)
+
+        uuids = self.clients[client]
+        uuids.discard(uuid)
+        if len(uuids) == 0:
+            del self.clients[client]
+
+        if len(recipients) == 0:
+            self._drop_object(uuid)
+
+        return True
+
+    def remove_client(self, client):
+        """Drop all subscriptions of a client, returns the affected objects"""
+
+        uuids = self.clients.pop(client, set())
+
+        for uuid in uuids:
+            recipients = self.objects[uuid]
+            recipients.pop(client, None)
+            self.decisions.pop((client, uuid), None)
+
+            if len(recipients) == 0:
+                self._drop_object(uuid)
+
+        return uuids
+
+    def remove_object(self, uuid):
+        """Drop all subscriptions of an object, returns its former recipients"""
+
+        recipients = self.objects.get(uuid, {})
+
+        for client in recipients:
+            self.decisions.pop((client, uuid), None)
+            uuids = self.clients[client]
+            uuids.discard(uuid)
+            if len(uuids) == 0:
+                del self.clients[client]
+
+        self._drop_object(uuid)
+
+        return recipients
+
+    def _drop_object(self, uuid):
+        self.objects.pop(uuid, None)
+        self.updates.pop(uuid, None)
+
+        schema = self.object_schemata.pop(uuid, None)
+        if schema is not None:
+            uuids = self.schemata[schema]
+            uuids.discard(uuid)
+            if len(uuids) == 0:
+                del self.schemata[schema]
+
+    def recipients(self, uuid):
+        """Return the subscribed clients and their users of an object"""
+
+        return self.objects.get(uuid, {})
+
+    def by_client(self, client):
+        """Return the uuids of all objects a client subscribed to"""
+
+        return self.clients.get(client, set())
+
+    def by_schema(self, schema):
+        """Return the uuids of all subscribed objects of a schema"""
+
+        return self.schemata.get(schema, set())
+
+    def get_decision(self, client, uuid, version):
+        """Return a cached read permission decision or None, if the object's
+        version changed"""
+
+        cached = self.decisions.get((client, uuid), None)
+
+        if cached is None or cached[0] != version:
+            return None
+
+        return cached[1]
+
+    def set_decision(self, client, uuid, version, decision):
+        """Cache a read permission decision for an object version"""
+
+        if uuid in self.objects and client in self.objects[uuid]:
+            self.decisions[(client, uuid)] = (version, decision)
+
+    def set_update(self, uuid, data):
+        """Remember the last state of an object that was sent to subscribers"""
+
+        if uuid in self.objects:
+            self.updates[uuid] = data
+
+    def is_sent(self, uuid, data):
+        """Check if subscribers already received this state of an object"""
+
+        return self.updates.get(uuid, None) == data
@@ -28,10 +28,12 @@ RBAC (role based access control) support functionality for objects
 
 """
 
+from isomer import identity
 from isomer.component import handler
 from isomer.database import objectmodels
 from isomer.events.objectmanager import remove_role, add_role
 from isomer.logger import error
+from isomer.permissions import get_roles
 from isomer.ui.objectmanager.crud import CrudOperations
 
 
@@ -42,6 +44,21 @@ class RoleOperations(CrudOperations):
     def remove_role(self, event):
         """Remove a role from one or many objects' permissions"""
 
+        self._role_request(event, add=False)
+
+    @handler(add_role)
+    def add_role(self, event):
+        """Add a role to one or many objects' permissions"""
+
+        self._role_request(event, add=True)
+
+    def _role_request(self, event, add):
+        """Validate a role change request and apply it to all given objects
+
+        Returns the changed, denied and missing object uuids or None, if the
+        request was invalid.
+        """
+
         schema = event.data.get("schema", None)
         uuid = event.data.get("uuid", None)
         action = event.data.get("action", None)
@@ -49,62 +66,54 @@ class RoleOperations(CrudOperations):
 
         if schema is None or uuid is None or action is None or role is None:
             self.log("Invalid request, arguments missing:", event.data, lvl=error)
-            return
-
-        user = event.user
+            return None
 
         if not isinstance(uuid, list):
             uuid = [uuid]
 
-        for item in uuid:
-            obj = objectmodels[schema].find_one({"uuid": item})
-
-            if not self._check_permissions(schema, user, "write", obj):
-                self.log("Revoking role not possible due to insufficient permissions.")
-                return
-
-            self.log("Removing role", role, "of", action, "on", schema, ":", item)
-            try:
-                obj.perms[action].remove(role)
-                obj.save()
-            except ValueError:
-                self.log(
-                    "Could not remove role, it is not existing:",
-                    role,
-                    action,
-                    schema,
-                    ":",
-                    item,
-                )
+        return self._change_roles(schema, event.user, uuid, action, role, add)
 
-    @handler(add_role)
-    def add_role(self, event):
-        """Add a role to one or many objects' permissions"""
+    def _change_roles(self, schema, user, uuids, action, role, add):
+        """Add or remove a role of an action on many objects at once
 
-        schema = event.data.get("schema", None)
-        uuid = event.data.get("uuid", None)
-        action = event.data.get("action", None)
-        role = event.data.get("role", None)
+        All objects are fetched with a single query and updated with a single
+        atomic update_many, objects the user may not write to are skipped.
+        """
 
-        if schema is None or uuid is None or action is None or role is None:
-            self.log("Invalid request, arguments missing:", event.data, lvl=error)
-            return
+        collection = objectmodels[schema].collection()
+        projection = {"_id": 0, "uuid": 1, "perms": 1, "owner": 1}
+        roles = get_roles(user)
 
-        user = event.user
+        permitted = []
+        denied = []
+        found = set()
 
-        if not isinstance(uuid, list):
-            uuid = [uuid]
+        for document in collection.find({"uuid": {"$in": uuids}}, projection):
+            found.add(document["uuid"])
+            if self._check_permissions(schema, user, "write", document, roles):
+                permitted.append(document["uuid"])
+            else:
+                denied.append(document["uuid"])
 
-        for item in uuid:
-            obj = objectmodels[schema].find_one({"uuid": item})
+        missing = [uuid for uuid in uuids if uuid not in found]
 
-            if not self._check_permissions(schema, user, "write", obj):
-                self.log("Adding role not possible due to insufficient permissions.")
-                return
+        if len(denied) > 0:
+            self.log(
+                "Changing role not possible due to insufficient permissions:", denied
+            )
 
-            self.log("Appending role", role, "of", action, "on", schema, ":", item)
-            if role not in obj.perms[action]:
-                obj.perms[action].append(role)
-                obj.save()
+        if len(permitted) > 0:
+            field = "perms." + action
+            if add:
+                self.log("Appending role", role, "of", action, "on", schema, ":",
+                         permitted)
+                change = {"$addToSet": {field: role}}
             else:
-                self.log("Role already present, not adding")
+                self.log("Removing role", role, "of", action, "on", schema, ":",
+                         permitted)
+                change = {"$pull": {field: role}}
+
+            collection.update_many({"uuid": {"$in": permitted}}, change)
+            identity.cache.invalidate(schema)
+
+        return permitted, denied, missing
@@ -29,9 +29,10 @@ Subscription management for objects
 """
 
 from isomer.component import handler
-from isomer.events.client import send
+from isomer.events.client import broadcast
 from isomer.events.objectmanager import subscribe, unsubscribe
-from isomer.logger import verbose
+from isomer.logger import verbose, debug
+from isomer.permissions import get_compiled, get_fields
 from isomer.ui.objectmanager.roles import RoleOperations
 
 
@@ -61,18 +62,13 @@ class SubscriptionOperations(RoleOperations):
         }
         self._respond(None, result, event)
 
-    def _add_subscription(self, uuid, event):
+    def _add_subscription(self, uuid, event, schema=None):
         self.log("Adding subscription for", uuid, event.user, lvl=verbose)
-        if uuid in self.subscriptions:
-            if event.client.uuid not in self.subscriptions[uuid]:
-                self.subscriptions[uuid][event.client.uuid] = event.user
-        else:
-            self.subscriptions[uuid] = {event.client.uuid: event.user}
+        self.subscriptions.add(uuid, event.client.uuid, event.user, schema)
 
     @handler(unsubscribe)
     def unsubscribe(self, event):
         """Unsubscribe from an object's future changes"""
-        # TODO: Automatic Unsubscription
         uuids = event.data
 
         if not isinstance(uuids, list):
@@ -81,12 +77,7 @@ class SubscriptionOperations(RoleOperations):
         result = []
 
         for uuid in uuids:
-            if uuid in self.subscriptions:
-                self.subscriptions[uuid].pop(event.client.uuid)
-
-                if len(self.subscriptions[uuid]) == 0:
-                    del self.subscriptions[uuid]
-
+            if self.subscriptions.remove(uuid, event.client.uuid):
                 result.append(uuid)
 
         result = {
@@ -97,6 +88,16 @@ class SubscriptionOperations(RoleOperations):
 
         self._respond(None, result, event)
 
+    @handler("clientdisconnect")
+    def clientdisconnect(self, event):
+        """Drop all subscriptions of a disconnected client"""
+
+        uuids = self.subscriptions.remove_client(event.clientuuid)
+
+        if len(uuids) > 0:
+            self.log("Removed", len(uuids), "subscriptions of disconnected client",
+                     event.clientuuid, lvl=debug)
+
     @handler("updatesubscriptions")
     def update_subscriptions(self, event):
         """OM event handler for to be stored and client shared objectmodels
@@ -110,26 +111,135 @@ class SubscriptionOperations(RoleOperations):
         except Exception as e:
             self.log("Error during subscription update: ", type(e), e, exc=True)
 
+    def _check_subscriber(self, schema, client, recipient, update_object):
+        """Check a subscriber's read permission, cached per object version
+
+        The version consists of everything a decision depends on: the
+        recipient's roles and the object's owner and read permissions.
+        Schemata with special read checks are always evaluated.
+        """
+
+        if "read" in get_compiled(schema).specials:
+            return self._check_permissions(schema, recipient, "read", update_object)
+
+        fields = get_fields(update_object)
+        perms = fields.get("perms", None)
+        version = (
+            tuple(recipient.account.roles),
+            str(fields.get("owner", None)),
+            None if perms is None else tuple(perms.get("read", ())),
+        )
+
+        uuid = update_object.uuid
+        decision = self.subscriptions.get_decision(client, uuid, version)
+
+        if decision is None:
+            decision = self._check_permissions(schema, recipient, "read", update_object)
+            self.subscriptions.set_decision(client, uuid, version, decision)
+
+        return decision
+
     def _update_subscribers(self, update_schema, update_object):
         # Notify frontend subscribers
 
         self.log("Notifying subscribers about update.", lvl=verbose)
         if update_object.uuid in self.subscriptions:
+            self.subscriptions.set_schema(update_object.uuid, update_schema)
+
+            serialized = update_object.serializablefields()
+            self.subscriptions.set_update(update_object.uuid, serialized)
+
             update = {
                 "component": "isomer.events.objectmanager",
                 "action": "update",
                 "data": {
                     "schema": update_schema,
                     "uuid": update_object.uuid,
-                    "object": update_object.serializablefields(),
+                    "object": serialized,
                 },
             }
 
-            # pprint(self.subscriptions)
+            recipients = self.subscriptions.recipients(update_object.uuid)
+            permitted = [
+                client
+                for client, recipient in list(recipients.items())
+                if self._check_subscriber(
+                    update_schema, client, recipient, update_object
+                )
+            ]
+
+            if len(permitted) > 0:
+                # All permitted subscribers get the same, once encoded packet
+                self.log("Notifying subscribers: ", permitted, lvl=verbose)
+                self.fireEvent(broadcast("clientgroup", update, group=permitted))
+
+    def _update_subscribers_many(self, update_schema, update_objects):
+        """Notify frontend subscribers about many updated objects with a
+        single coalesced update per client"""
+
+        self.log("Notifying subscribers about bulk update.", lvl=verbose)
+
+        updates = {}
+
+        for update_object in update_objects:
+            if update_object.uuid not in self.subscriptions:
+                continue
+
+            self.subscriptions.set_schema(update_object.uuid, update_schema)
+
+            serialized = None
+            recipients = self.subscriptions.recipients(update_object.uuid)
 
-            for client, recipient in self.subscriptions[update_object.uuid].items():
-                if not self._check_permissions(update_schema, recipient, "read", update_object):
+            for client, recipient in list(recipients.items()):
+                if not self._check_subscriber(
+                    update_schema, client, recipient, update_object
+                ):
                     continue
 
-                self.log("Notifying subscriber: ", client, recipient, lvl=verbose)
-                self.fireEvent(send(client, update))
+                if serialized is None:
+                    serialized = update_object.serializablefields()
+                    self.subscriptions.set_update(update_object.uuid, serialized)
+
+                updates.setdefault(client, {})[update_object.uuid] = serialized
+
+        # Clients with the same permission outcome share one encoded packet
+        for objects, clients in self._group_recipients(updates).items():
+            self.log("Notifying subscribers: ", clients, len(objects), lvl=verbose)
+            update = {
+                "component": "isomer.events.objectmanager",
+                "action": "updatemany",
+                "data": {
+                    "schema": update_schema,
+                    "objects": [updates[clients[0]][uuid] for uuid in objects],
+                },
+            }
+            self.fireEvent(broadcast("clientgroup", update, group=clients))
+
+    def _notify_deletions(self, schema, uuids):
+        """Notify frontend subscribers about many deleted objects with a
+        single coalesced deletion per client and drop their subscriptions"""
+
+        deletions = {}
+
+        for uuid in uuids:
+            for client in self.subscriptions.remove_object(uuid):
+                deletions.setdefault(client, []).append(uuid)
+
+        for deleted, clients in self._group_recipients(deletions).items():
+            deletion = {
+                "component": "isomer.events.objectmanager",
+                "action": "deletionmany",
+                "data": {"schema": schema, "uuid": list(deleted)},
+            }
+            self.fireEvent(broadcast("clientgroup", deletion, group=clients))
+
+    @staticmethod
+    def _group_recipients(packets):
+        """Group clients by the object uuids they are about to receive"""
+
+        groups = {}
+
+        for client, uuids in packets.items():
+            groups.setdefault(tuple(uuids), []).append(client)
+
+        return groups
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+Module: objectmanager.watcher
+=============================
+
+Database change watching for object subscriptions.
+
+Changes that were not made through this node's object manager (other nodes
+sharing the database, command line tools, provisioning) are picked up from
+MongoDB change streams and forwarded to the subscribers. If the database does
+not support change streams, the replica set oplog is tailed instead.
+
+Deletions only carry the database id of an object, so they can only be
+forwarded for objects whose changes were already seen by the watcher.
+
+
+"""
+
+from collections import OrderedDict
+from threading import Thread, Event as ThreadEvent
+
+from circuits import Event
+from pymongo import CursorType
+from pymongo.errors import OperationFailure, PyMongoError
+
+from isomer import identity
+from isomer.component import handler
+from isomer.database import objectmodels
+from isomer.logger import isolog, debug, verbose, warn, error
+from isomer.ui.objectmanager.bulk import BulkOperations
+
+#: Upper bound of remembered database ids of subscribed objects
+ID_CACHE_SIZE = 10000
+
+
+def watcher_log(*args, **kwargs):
+    """Log as emitter 'WATCHER'"""
+    kwargs.update({"emitter": "WATCHER", "frame_ref": 2})
+    isolog(*args, **kwargs)
+
+
+class watchedchange(Event):
+    """A stored object was changed in the database"""
+
+    def __init__(self, schema, operation, object_id, document=None, *args):
+        super(watchedchange, self).__init__(*args)
+        self.schema = schema
+        self.operation = operation
+        self.object_id = object_id
+        self.document = document
+
+
+class ChangeWatcher(Thread):
+    """Background thread tailing database changes of a set of schemata"""
+
+    def __init__(self, component, schemata, interval=1.0):
+        super(ChangeWatcher, self).__init__(name="isomer-changewatcher", daemon=True)
+
+        self.component = component
+        self.interval = interval
+        self.collections = {}
+
+        for schema in schemata:
+            collection = objectmodels[schema].collection()
+            self.collections[collection.name] = (schema, collection)
+
+        first = next(iter(self.collections.values()))[1]
+        self.database = first.database
+
+        self.resume_token = None
+        self.use_oplog = False
+        self.stopping = ThreadEvent()
+
+    def stop(self):
+        """Stop watching after the current wait period"""
+
+        self.stopping.set()
+
+    def run(self):
+        watcher_log("Watching changes of", len(self.collections), "collections")
+
+        while not self.stopping.is_set():
+            try:
+                if self.use_oplog:
+                    self._tail_oplog()
+                else:
+                    self._watch()
+            except OperationFailure as e:
+                if self.use_oplog:
+                    watcher_log("Cannot tail oplog, giving up:", e, lvl=error)
+                    return
+
+                watcher_log("Change streams unavailable, tailing oplog:", e,
+                            lvl=warn)
+                self.use_oplog = True
+            except PyMongoError as e:
+                watcher_log("Database error while watching changes:", e, lvl=warn)
+                self.stopping.wait(self.interval)
+
+    def _fire(self, collection_name, operation, object_id, document=None):
+        schema = self.collections[collection_name][0]
+        watcher_log("Change:", operation, schema, object_id, lvl=verbose)
+        self.component.fireEvent(
+            watchedchange(schema, operation, str(object_id), document)
+        )
+
+    def _watch(self):
+        pipeline = [
+            {
+                "$match": {
+                    "ns.coll": {"$in": list(self.collections.keys())},
+                    "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+                }
+            }
+        ]
+
+        with self.database.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            max_await_time_ms=int(self.interval * 1000),
+        ) as stream:
+            while not self.stopping.is_set() and stream.alive:
+                change = stream.try_next()
+                self.resume_token = stream.resume_token
+
+                if change is None:
+                    continue
+
+                collection = change["ns"]["coll"]
+                object_id = change["documentKey"]["_id"]
+
+                if change["operationType"] == "delete":
+                    self._fire(collection, "delete", object_id)
+                elif change.get("fullDocument", None) is not None:
+                    self._fire(collection, "update", object_id, change["fullDocument"])
+
+    def _tail_oplog(self):
+        oplog = self.database.client.local["oplog.rs"]
+        prefix = self.database.name + "."
+        namespaces = [prefix + name for name in self.collections]
+
+        last = oplog.find_one(sort=[("$natural", -1)])
+        if last is None:
+            raise OperationFailure("Oplog is empty or unavailable")
+
+        timestamp = last["ts"]
+
+        while not self.stopping.is_set():
+            cursor = oplog.find(
+                {"ts": {"$gt": timestamp}, "ns": {"$in": namespaces}},
+                cursor_type=CursorType.TAILABLE_AWAIT,
+            ).max_await_time_ms(int(self.interval * 1000))
+
+            while cursor.alive and not self.stopping.is_set():
+                for entry in cursor:
+                    timestamp = entry["ts"]
+                    name = entry["ns"][len(prefix):]
+
+                    if entry["op"] == "d":
+                        self._fire(name, "delete", entry["o"]["_id"])
+                    elif entry["op"] == "i":
+                        self._fire(name, "update", entry["o"]["_id"], entry["o"])
+                    elif entry["op"] == "u":
+                        object_id = entry["o2"]["_id"]
+                        document = self.collections[name][1].find_one(
+                            {"_id": object_id}
+                        )
+                        if document is not None:
+                            self._fire(name, "update", object_id, document)
+
+            self.stopping.wait(self.interval)
+
+
+class WatchOperations(BulkOperations):
+    """Forwards changes made elsewhere in the database to subscribers"""
+
+    def __init__(self, *args, **kwargs):
+        super(WatchOperations, self).__init__(*args, **kwargs)
+
+        self._watched_ids = OrderedDict()
+        self.watcher = None
+
+        if self.config.watch_changes:
+            self._start_watcher()
+
+    def _start_watcher(self):
+        schemata = self.config.watch_schemata
+        if len(schemata) == 0:
+            schemata = list(objectmodels.keys())
+
+        schemata = [schema for schema in schemata if schema in objectmodels]
+
+        if len(schemata) == 0:
+            self.log("No schemata to watch for changes", lvl=warn)
+            return
+
+        self.log("Watching database changes of", schemata, lvl=debug)
+        self.watcher = ChangeWatcher(self, schemata, self.config.watch_interval)
+        self.watcher.start()
+
+    @handler("prepare_unregister", channel="*")
+    def prepare_unregister(self, event, component):
+        """Stop the watcher thread, when this component gets unregistered"""
+
+        if component is self and self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    @handler("watchedchange")
+    def watchedchange(self, event):
+        """Forward a database change to the subscribers of the object"""
+
+        if event.schema in identity.SCHEMATA:
+            # Changes of other nodes have to reach the identity cache, too
+            uuid = None if event.document is None else event.document.get("uuid")
+            identity.cache.invalidate(event.schema, uuid)
+
+        if event.operation == "delete":
+            uuid = self._watched_ids.pop(event.object_id, None)
+            if uuid is not None and uuid in self.subscriptions:
+                self._notify_deletions(event.schema, [uuid])
+            return
+
+        uuid = event.document.get("uuid", None)
+        if uuid is None or uuid not in self.subscriptions:
+            return
+
+        self._watched_ids[event.object_id] = uuid
+        self._watched_ids.move_to_end(event.object_id)
+        if len(self._watched_ids) > ID_CACHE_SIZE:
+            self._watched_ids.popitem(last=False)
+
+        try:
+            update_object = objectmodels[event.schema](event.document, from_find=True)
+        except Exception as e:
+            self.log("Could not load changed object:", event.schema, uuid, e,
+                     lvl=warn)
+            return
+
+        if self.subscriptions.is_sent(uuid, update_object.serializablefields()):
+            # This node already notified about its own change
+            return
+
+        self._update_subscribers(event.schema, update_object)
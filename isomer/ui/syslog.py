@@ -18,14 +18,32 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Live system logging (WiP!)"""
+"""Live system logging
+
+The logfile is followed incrementally from its end: every tick (and on
+inotify modification events, where available) all bytes written since the
+last offset are read, indexed and sent to subscribers as one batched update.
+Log rotation is detected by inode changes or shrinking files. History
+requests are served from a sparse index of line offsets by a worker thread.
+The lines that existed on startup are indexed in the background.
+"""
+
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Event as ThreadEvent
 
 from circuits import Event, Timer
 
 from isomer.component import ConfigurableComponent, handler
-from isomer.events.client import send  # , clientdisconnect
+from isomer.events.client import broadcast, send
 from isomer.events.system import authorized_event
-from isomer.logger import error, debug, get_logfile
+from isomer.logger import error, debug, verbose, warn, get_logfile
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
 
 
 class history(authorized_event):
@@ -36,6 +54,236 @@ class subscribe(authorized_event):
     pass
 
 
+class LogTailer(object):
+    """Incremental reader and line index of a growing (and rotating) file
+
+    New lines are followed from the end of the file on. The lines that
+    already existed when following started (the backlog) are indexed by
+    :meth:`index_backlog`, which is meant to run in a background thread.
+    Only every stride'th line offset is stored, so the indices stay small
+    even for huge logfiles.
+    """
+
+    def __init__(self, path, stride=32, chunk_size=4 * 1024 * 1024):
+        self.path = path
+        self.stride = stride
+        self.chunk_size = chunk_size
+
+        self.handle = None
+        self.inode = None
+        self.generation = 0
+        self.offset = 0
+        self.partial = b""
+        self.live_from = 0
+        self.live_lines = 0
+        self.live_index = array("q")
+        self.backlog_lines = 0
+        self.backlog_index = array("q")
+        self.indexed = ThreadEvent()
+
+    @property
+    def lines(self):
+        """Number of indexed lines"""
+
+        return self.backlog_lines + self.live_lines
+
+    def _open(self):
+        try:
+            self.handle = open(self.path, "rb")
+        except (IOError, OSError):
+            self.handle = None
+            return False
+
+        stat = os.fstat(self.handle.fileno())
+
+        self.inode = stat.st_ino
+        self.generation += 1
+        self.offset = 0
+        self.partial = b""
+        self.live_from = 0
+        self.live_lines = 0
+        self.live_index = array("q")
+        self.backlog_lines = 0
+        self.backlog_index = array("q")
+        self.indexed = ThreadEvent()
+
+        return True
+
+    def start(self):
+        """Open the file and follow it from the end of its last complete line
+        on, the lines before still have to be indexed by index_backlog"""
+
+        if not self._open():
+            return
+
+        size = os.fstat(self.handle.fileno()).st_size
+        tail = max(0, size - 65536)
+
+        self.handle.seek(tail)
+        last_newline = self.handle.read(size - tail).rfind(b"\n")
+
+        if last_newline >= 0:
+            self.live_from = self.offset = tail + last_newline + 1
+        else:
+            self.live_from = self.offset = tail
+
+        if self.live_from == 0:
+            self.indexed.set()
+
+    def index_backlog(self):
+        """Index the lines that existed before following started
+
+        Gives up, if the file is rotated in the meantime.
+        """
+
+        generation = self.generation
+        indexed = self.indexed
+        end = self.live_from
+
+        index = array("q")
+        lines = 0
+        position = 0
+
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_ino != self.inode:
+                    return
+
+                for line in f:
+                    if position >= end or generation != self.generation:
+                        break
+
+                    if lines % self.stride == 0:
+                        index.append(position)
+                    lines += 1
+                    position += len(line)
+        except (IOError, OSError):
+            return
+        finally:
+            if generation == self.generation:
+                self.backlog_index = index
+                self.backlog_lines = lines
+            indexed.set()
+
+    def _rotated(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+
+        return stat.st_ino != self.inode or stat.st_size < self.offset
+
+    def _read_lines(self):
+        result = []
+
+        while True:
+            self.handle.seek(self.offset + len(self.partial))
+            data = self.handle.read(self.chunk_size)
+
+            if len(data) == 0:
+                return result
+
+            data = self.partial + data
+            position = self.offset
+
+            start = 0
+            while True:
+                end = data.find(b"\n", start)
+                if end == -1:
+                    break
+
+                if self.live_lines % self.stride == 0:
+                    self.live_index.append(position + start)
+                self.live_lines += 1
+
+                result.append(data[start:end].decode("utf-8", errors="replace"))
+
+                start = end + 1
+
+            self.partial = data[start:]
+            self.offset = position + start
+
+    def read(self):
+        """Read and index all complete lines written since the last call
+
+        On rotation, the unread lines of the old file are returned together
+        with the ones of the new file.
+        """
+
+        result = []
+
+        if self.handle is not None and self._rotated():
+            result = self._read_lines()
+            self.handle.close()
+            self.handle = None
+
+        if self.handle is None:
+            if not self._open():
+                return result
+            self.indexed.set()
+
+        return result + self._read_lines()
+
+    def _read_indexed(self, f, index, number, count):
+        f.seek(index[number // self.stride])
+
+        for _ in range(number % self.stride):
+            f.readline()
+
+        result = []
+
+        for _ in range(count):
+            line = f.readline()
+            if not line:
+                break
+            result.append(line.rstrip(b"\n").decode("utf-8", errors="replace"))
+
+        return result
+
+    def history(self, limit, end=None):
+        """Return up to limit indexed lines before line number end"""
+
+        backlog_lines = self.backlog_lines
+        lines = backlog_lines + self.live_lines
+
+        if end is None or end > lines:
+            end = lines
+
+        begin = max(0, end - limit)
+
+        if begin >= end or self.handle is None:
+            return []
+
+        result = []
+
+        with open(self.path, "rb") as f:
+            if begin < backlog_lines:
+                result += self._read_indexed(
+                    f, self.backlog_index, begin, min(end, backlog_lines) - begin
+                )
+                begin = backlog_lines
+
+            if begin < end:
+                result += self._read_indexed(
+                    f, self.live_index, begin - backlog_lines, end - begin
+                )
+
+        return result
+
+
+if pyinotify is not None:
+
+    class LogfileHandler(pyinotify.ProcessEvent):
+        """Triggers following the logfile on modifications"""
+
+        def __init__(self, component, *args, **kwargs):
+            super(LogfileHandler, self).__init__(*args, **kwargs)
+            self.component = component
+
+        def process_default(self, event):
+            self.component.notify_change()
+
+
 class Syslog(ConfigurableComponent):
     """
     System log access component
@@ -44,6 +292,28 @@ class Syslog(ConfigurableComponent):
 
     """
 
+    configprops = {
+        "interval": {
+            "type": "number",
+            "title": "Follow interval",
+            "description": "Seconds between checks for new log lines",
+            "default": 1.0,
+        },
+        "inotify": {
+            "type": "boolean",
+            "title": "Use inotify",
+            "description": "Follow log changes immediately, where inotify is "
+                           "available",
+            "default": True,
+        },
+        "history_limit": {
+            "type": "integer",
+            "title": "History limit",
+            "description": "Maximum number of lines per history request",
+            "default": 1000,
+        },
+    }
+
     def __init__(self, *args):
         super(Syslog, self).__init__("SYSLOG", *args)
 
@@ -51,14 +321,66 @@ class Syslog(ConfigurableComponent):
 
         self.subscribers = []
 
-        self.log_file = open(get_logfile())
-        self.log_position = 0
+        self.tailer = LogTailer(get_logfile())
+        self.tailer.start()
+
+        Thread(
+            target=self.tailer.index_backlog, name="isomer-syslog-index", daemon=True
+        ).start()
+        self.history_worker = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="isomer-syslog"
+        )
+
+        self._follow_pending = False
+        self.watch_manager = None
+        self.notifier = None
+
+        if self.config.inotify:
+            self._start_notifier()
+
+        self.follow_timer = Timer(
+            self.config.interval, Event.create("syslog_follow"), persist=True
+        ).register(self)
+
+    def _start_notifier(self):
+        if pyinotify is None:
+            self.log("No inotify support available, polling logfile", lvl=verbose)
+            return
+
+        try:
+            self.watch_manager = pyinotify.WatchManager()
+            self.notifier = pyinotify.ThreadedNotifier(
+                self.watch_manager, LogfileHandler(self)
+            )
+            self.notifier.daemon = True
+            self.notifier.start()
+            # Watch the directory, so rotated and recreated logfiles are seen
+            self.watch_manager.add_watch(
+                os.path.dirname(os.path.abspath(self.tailer.path)),
+                pyinotify.IN_MODIFY | pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO,
+            )
+        except Exception as e:
+            self.log("Could not set up inotify, polling logfile:", e, lvl=warn)
+            self.notifier = None
+
+    @handler("prepare_unregister", channel="*")
+    def prepare_unregister(self, event, component):
+        """Stop the history worker, when this component gets unregistered"""
 
-        self.follow_timer = Timer(1, Event.create("syslog_follow"), persist=True)
+        if component is self:
+            self.history_worker.shutdown(wait=False)
+
+    def notify_change(self):
+        """Called from the inotify thread, requests following the logfile"""
+
+        if not self._follow_pending:
+            self._follow_pending = True
+            self.fireEvent(Event.create("syslog_follow"))
 
     @handler(subscribe)
     def subscribe(self, event):
-        self.subscribers.append(event.client.uuid)
+        if event.client.uuid not in self.subscribers:
+            self.subscribers.append(event.client.uuid)
 
     @handler("clientdisconnect", priority=1000)
     def disconnect(self, event):
@@ -73,34 +395,53 @@ class Syslog(ConfigurableComponent):
             "data": new_messages,
         }
 
-        for subscriber in self.subscribers:
-            self.fireEvent(send(subscriber, packet, fail_quiet=True))
+        self.fireEvent(broadcast("clientgroup", packet, group=list(self.subscribers)))
 
     @handler("syslog_follow")
     def follow(self):
-        where = self.log_file.tell()
-        line = self.log_file.readline()
-        if not line:
-            self.log_file.seek(where)
-        else:
-            self._logupdate(line)
+        self._follow_pending = False
+
+        messages = self.tailer.read()
+
+        if len(messages) > 0 and len(self.subscribers) > 0:
+            self._logupdate(messages)
 
     @handler(history)
     def history(self, event):
         try:
-            limit = event.data["limit"]
+            limit = int(event.data["limit"])
             end = event.data["end"]
-        except (KeyError, AttributeError) as e:
+            end = None if end is None else int(end)
+        except (KeyError, AttributeError, TypeError, ValueError) as e:
             self.log("Error during event lookup:", e, type(e), exc=True, lvl=error)
             return
 
+        limit = max(0, min(limit, self.config.history_limit))
+
         self.log("History requested:", limit, end, lvl=debug)
 
-        messages = []
+        self.history_worker.submit(self._send_history, event.client.uuid, limit, end)
+
+    def _send_history(self, clientuuid, limit, end):
+        """Read and transmit requested history lines, in a worker thread"""
+
+        # Line numbers are only stable, once the backlog is indexed
+        self.tailer.indexed.wait(10)
+
+        try:
+            messages = self.tailer.history(limit, end)
+        except Exception as e:
+            self.log("Could not read log history:", e, type(e), lvl=error)
+            return
 
         history_packet = {
             "component": "isomer.ui.syslog",
             "action": "history",
-            "data": {"limit": limit, "end": end, "history": messages},
+            "data": {
+                "limit": limit,
+                "end": end,
+                "lines": self.tailer.lines,
+                "history": messages,
+            },
         }
-        self.fireEvent(send(event.client.uuid, history_packet))
+        self.fireEvent(send(clientuuid, history_packet))
@@ -163,6 +163,9 @@ setup(
         "typing_extensions>=3.7.4.2",
 
     ],
+    extras_require={
+        "fastjson": ["orjson>=3.4"],
+    },
     data_files=datafiles,
     entry_points="""[console_scripts]
     isomer=isomer.iso:main
@@ -175,6 +178,7 @@ setup(
     maintenance=isomer.database.components:Maintenance
     backup=isomer.database.components:BackupManager
     memlog=isomer.debugger:MemoryLogger
+    profiler=isomer.debugger:Profiler
 
     [isomer.sails]
     auth=isomer.ui.auth:Authenticator
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Abuse Store
+=======================
+
+
+
+"""
+
+from isomer.ui.clientmanager.abuse import AbuseStore
+
+
+def test_exponential_bans():
+    store = AbuseStore(threshold=2, ban_duration=10, max_ban_duration=25)
+
+    assert store.record_error("a", now=0) is None
+    assert store.record_error("a", now=0) is None
+    assert store.record_error("a", now=0) == 10
+
+    assert store.banned("a", now=5)
+    assert store.banned("a", now=11) is False
+
+    for _ in range(2):
+        store.record_error("a", now=20)
+    assert store.record_error("a", now=20) == 20
+    assert store.banned_count(now=30) == 1
+
+    for _ in range(2):
+        store.record_error("a", now=50)
+    assert store.record_error("a", now=50) == 25
+
+
+def test_ttl_and_size_bounds():
+    store = AbuseStore(size=2, ttl=100, threshold=0, ban_duration=10)
+
+    store.record_error("a", now=0)
+    store.record_error("b", now=1)
+    store.record_error("c", now=2)
+
+    assert [entry[0] for entry in store.entries(now=3)] == ["b", "c"]
+
+    # Bans are remembered for the TTL after they ended
+    assert len(store.entries(now=100)) == 2
+    assert len(store.entries(now=200)) == 0
+    assert len(store) == 0
+
+
+def test_bans_survive_address_cycling():
+    store = AbuseStore(size=3, threshold=1, ban_duration=100)
+
+    store.record_error("attacker", now=0)
+    assert store.record_error("attacker", now=0) == 100
+
+    for number in range(10):
+        store.record_error("cycled-%i" % number, now=1)
+
+    assert store.banned("attacker", now=2)
+    assert len(store) == 3
+
+    # Lookups keep the ban the most recently used record
+    store.record_error("other", now=3)
+    store.banned("attacker", now=3)
+    assert [entry[0] for entry in store.entries(now=4)][-1] == "attacker"
+
+
+def test_unban_and_clear():
+    store = AbuseStore(threshold=0)
+
+    store.record_error("a", now=0)
+    store.record_error("b", now=0)
+
+    assert store.unban("a")
+    assert store.banned("a", now=1) is False
+    assert store.unban("c") is False
+
+    assert store.clear("b") == 1
+    assert store.clear() == 1
@@ -30,13 +30,14 @@ Test Isomer Auth
 
 from circuits import Manager, Event
 import pytest
-from isomer.ui.auth import Authenticator
+from isomer.ui.auth import Authenticator, HashPool
 from isomer.events.client import authenticationrequest, authentication
 from isomer.misc.std import std_hash, std_now, std_uuid
 from isomer.database import objectmodels
 import isomer.logger as logger
 
 from bcrypt import gensalt
+from threading import Event as ThreadEvent
 
 # from pprint import pprint
 
@@ -143,3 +144,26 @@ def test_user_auth():
     assert isinstance(result, authentication)
     assert result.username == 'TESTER'
 
+
+
+def test_hashpool_queue():
+    """Test if password verifications run in workers and the queue is bounded"""
+
+    pool = HashPool(workers=1, queue_size=2)
+    results = []
+    finished = ThreadEvent()
+
+    def callback(valid):
+        results.append(valid)
+        if len(results) == 2:
+            finished.set()
+
+    assert pool.verify('PASSWORD', salt, new_user.passhash, callback)
+    assert pool.verify('WRONG', salt, new_user.passhash, callback)
+    assert pool.verify('OTHER', salt, new_user.passhash, callback) is False
+
+    assert finished.wait(5)
+    assert sorted(results) == [False, True]
+    assert pool.pending == 0
+
+    pool.shutdown()
@@ -34,7 +34,7 @@ from circuits.net.events import read  # , write
 from json import dumps  # , loads
 
 from isomer.ui.clientmanager import ClientManager
-from isomer.ui.clientobjects import Client, Socket
+from isomer.ui.clientobjects import Client, Socket, User
 from isomer.events.client import clientdisconnect
 from isomer.misc.std import std_uuid
 
@@ -172,3 +172,65 @@ def test_auth_logout():
     assert result.clientuuid == client_uuid
     assert isinstance(result, clientdisconnect)
 
+
+
+def test_session_resume():
+    """Tests if a new connection can resume a dropped client's session"""
+
+    client_uuid = std_uuid()
+    user_uuid = std_uuid()
+    temporary_uuid = std_uuid()
+
+    old_sock = object()
+    new_sock = object()
+
+    cm._sockets[old_sock] = Socket('127.0.0.1', client_uuid)
+    cm._clients[client_uuid] = Client(old_sock, '127.0.0.1', client_uuid, user_uuid,
+                                      'TESTER')
+    user = User(None, None, user_uuid)
+    user.clients.append(client_uuid)
+    cm._users[user_uuid] = user
+
+    cm.disconnect(old_sock)
+
+    client = cm._clients[client_uuid]
+    assert client.sock is None
+    assert client.detached is not None
+    assert user_uuid in cm._users
+
+    cm._sockets[new_sock] = Socket('127.0.0.2', temporary_uuid)
+    cm._clients[temporary_uuid] = Client(new_sock, '127.0.0.2', temporary_uuid)
+
+    client.session = cm._session_tokens.new_nonce()
+    token = cm._session_tokens.issue(user_uuid, client_uuid, client.session)
+    cm._handle_authentication_events(token, 'resume', temporary_uuid, new_sock)
+
+    assert temporary_uuid not in cm._clients
+    assert cm._sockets[new_sock].clientuuid == client_uuid
+    assert client.sock is new_sock
+    assert client.detached is None
+
+    # The presented token was revoked by the resumption
+    another_sock = object()
+    another_uuid = std_uuid()
+    cm._sockets[another_sock] = Socket('127.0.0.3', another_uuid)
+    cm._clients[another_uuid] = Client(another_sock, '127.0.0.3', another_uuid)
+
+    cm._handle_authentication_events(token, 'resume', another_uuid, another_sock)
+
+    assert another_uuid in cm._clients
+    assert client.sock is new_sock
+
+
+def test_invalid_component():
+    """Tests if frames with non string components count as decode errors"""
+
+    sock = object()
+    client_uuid = std_uuid()
+
+    cm._sockets[sock] = Socket('127.0.0.4', client_uuid)
+    cm._clients[client_uuid] = Client(sock, '127.0.0.4', client_uuid)
+
+    cm.read(sock, dumps({'component': 1, 'action': 'x', 'data': {}}))
+
+    assert cm._abuse.entries()[-1][:2] == ('127.0.0.4', 1)
@@ -30,11 +30,12 @@ Test Isomer Debugger
 
 from circuits import Manager
 # import pytest
-from isomer.debugger import IsomerDebugger
+from isomer.debugger import IsomerDebugger, StackSampler
 from isomer.events.system import debugrequest
 from isomer.ui.clientobjects import User
 from isomer import logger
-from time import sleep
+from time import sleep, monotonic
+import threading
 
 # from pprint import pprint
 
@@ -67,3 +68,29 @@ def test_exception_monitor():
 
     # TODO: Fix me. Something broke, here.
     # assert "ERROR" in lastlog
+
+
+def test_stack_sampler(tmpdir):
+    """Samples a busy thread and checks the collapsed stack output"""
+
+    def busy_loop():
+        end = monotonic() + 0.3
+        while monotonic() < end:
+            sum(range(100))
+
+    sampler = StackSampler(threading.get_ident(), 0.2, 0.001)
+    sampler.start()
+    busy_loop()
+    sampler.join()
+
+    assert sampler.samples > 0
+    assert sampler.leaves(1)[0][0].startswith("busy_loop@test_debugger.py")
+
+    filename = str(tmpdir.join("profile.folded"))
+    sampler.write(filename)
+
+    with open(filename) as f:
+        stack, amount = f.readline().rsplit(" ", 1)
+
+    assert "busy_loop@" in stack.split(";")[-1]
+    assert int(amount) > 0
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer JSON Codecs
+=======================
+
+
+
+"""
+
+import datetime
+
+from isomer.ui.clientmanager.encoder import available_codecs, get_codec, \
+    benchmark_codecs
+
+packet = {
+    "component": "isomer.events.objectmanager",
+    "action": "get",
+    "data": {
+        "uuid": "f8d5e8e2-5fb5-4d4c-9d3f-3a8c2b0e0d1c",
+        "created": datetime.datetime(2020, 5, 4, 3, 2, 1),
+        "day": datetime.date(2020, 5, 4),
+        "big": 2 ** 70,
+        "list": [1, 2.5, None, True, "ü"],
+    },
+}
+
+
+def test_codecs_agree():
+    """All installed codecs produce the same decoded packets"""
+
+    expected = dict(packet["data"])
+    expected["created"] = "2020-05-04T03:02:01"
+    expected["day"] = "2020-05-04"
+
+    for name, codec in available_codecs().items():
+        encoded = codec.dumps(packet)
+
+        assert isinstance(encoded, str), name
+        assert codec.loads(encoded)["data"] == expected, name
+
+
+def test_get_codec():
+    assert get_codec("json").name == "json"
+    assert get_codec("nonexistent").name in available_codecs()
+    assert get_codec().name == list(available_codecs().keys())[0]
+
+
+def test_benchmark():
+    results = benchmark_codecs([packet], rounds=2)
+
+    assert "json" in results
+    assert all(len(value) == 3 for value in results.values())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Event Statistics
+============================
+
+
+
+"""
+
+from isomer import logger
+from isomer.events import statistics
+from isomer.events.client import send, broadcast
+from isomer.events.system import debugrequest
+
+
+def test_event_counters():
+    statistics.reset()
+
+    for _ in range(5):
+        send("client", {"action": "test"})
+    broadcast("clients", {"action": "test"})
+
+    report = statistics.report()
+
+    assert report[0][0] == "isomer.events.client.send"
+    assert report[0][1] == 5
+    assert report[1][:2] == ("isomer.events.client.broadcast", 1)
+
+    # Rates are relative to the previous report
+    send("client", {"action": "test"})
+    report = dict((item[0], item) for item in statistics.report())
+
+    assert report["isomer.events.client.send"][1] == 6
+    assert report["isomer.events.client.broadcast"][2] == 0
+
+
+def test_event_subclass_counted_once():
+    statistics.reset()
+
+    debugrequest("user", "debug", None, "client")
+
+    assert statistics.counts[debugrequest] == 1
+
+
+def test_event_logging_guard():
+    level = logger.get_verbosity()["global"]
+    logger.live = True
+    try:
+        logger.set_verbosity(logger.info)
+        logged = len(logger.LiveLog)
+        send("client", {"action": "silent"})
+        assert len(logger.LiveLog) == logged
+
+        logger.set_verbosity(logger.events)
+        send("client", {"action": "logged"})
+        assert "logged" in logger.LiveLog[-1][-1]
+    finally:
+        logger.set_verbosity(level)
+        logger.live = False
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Identity
+====================
+
+
+
+"""
+
+from isomer import identity
+from isomer.identity import IdentityCache
+
+
+class Account(object):
+    """Minimal stand in for a stored user account"""
+
+    def __init__(self, uuid, name):
+        self.uuid = uuid
+        self.name = name
+        self.lastlogin = None
+
+
+class Profile(object):
+    """Minimal stand in for a stored user profile"""
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+
+def test_identity_lookup():
+    cache = IdentityCache()
+    account = Account("1234", "TESTER")
+
+    cache.remember_account(account)
+    cache.remember_profile("1234", Profile("5678"))
+
+    assert cache.account(uuid="1234") is account
+    assert cache.account(name="TESTER") is account
+    assert cache.profile("1234").uuid == "5678"
+    assert cache.hits == 3
+    assert cache.misses == 0
+
+
+def test_identity_fresh_lookup(monkeypatch):
+    cache = IdentityCache()
+    stale = Account("1234", "TESTER")
+    stored = Account("1234", "TESTER")
+    stored.active = False
+
+    class UserModel(object):
+        queries = []
+
+        @classmethod
+        def find_one(cls, query):
+            cls.queries.append(query)
+            return stored
+
+    monkeypatch.setattr(identity, "objectmodels", {"user": UserModel})
+
+    cache.remember_account(stale)
+
+    assert cache.account(name="TESTER") is stale
+    assert cache.account(name="TESTER", fresh=True) is stored
+    assert UserModel.queries == [{"name": "TESTER"}]
+
+    # The cache now serves the freshly read account
+    assert cache.account(uuid="1234") is stored
+
+
+def test_identity_invalidation():
+    cache = IdentityCache()
+    cache.remember_account(Account("1234", "TESTER"))
+    cache.remember_account(Account("4321", "OTHER"))
+    cache.remember_profile("1234", Profile("5678"))
+
+    cache.invalidate("user", "1234")
+
+    assert "1234" not in cache._accounts
+    assert "TESTER" not in cache._names
+    assert "OTHER" in cache._names
+
+    cache.invalidate("profile", "5678")
+    assert "1234" not in cache._profiles
+
+    cache.invalidate()
+    assert len(cache._accounts) == 0
+
+
+def test_identity_expiry():
+    cache = IdentityCache(ttl=-1)
+    cache.remember_account(Account("1234", "TESTER"))
+
+    assert cache._lookup(cache._accounts, "1234") is None
+    assert "1234" not in cache._accounts
+
+
+def test_identity_lastlogin():
+    cache = IdentityCache()
+    account = Account("1234", "TESTER")
+
+    cache.update_lastlogin(account, "2020-01-01T00:00:00")
+    cache.update_lastlogin(account, "2020-01-02T00:00:00")
+
+    assert account.lastlogin == "2020-01-02T00:00:00"
+    assert cache._lastlogins == {"1234": "2020-01-02T00:00:00"}
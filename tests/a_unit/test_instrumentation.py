@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Instrumentation
+===========================
+
+
+
+"""
+
+from circuits import Component, Event, Manager
+
+from isomer.component import handler
+from isomer.instrumentation import Histogram, stats, enable_handler_stats
+
+
+class ping(Event):
+    """Test event"""
+
+    pass
+
+
+class Pinged(Component):
+    """Test component with decorated handlers"""
+
+    def __init__(self):
+        super(Pinged, self).__init__()
+        self.pings = 0
+
+    @handler("ping")
+    def ping(self, event):
+        self.pings += 1
+
+        return "pong"
+
+
+def test_histogram_buckets():
+    histogram = Histogram()
+
+    for value in range(1, 10001):
+        histogram.record(value)
+
+    assert histogram.count == 10000
+    assert histogram.min == 1
+    assert histogram.max == 10000
+
+    # Relative bucket error is bounded by the sub bucket resolution
+    assert abs(histogram.percentile(50) - 5000) <= 5000 / 16
+    assert abs(histogram.percentile(99) - 9900) <= 9900 / 16
+    assert histogram.percentile(100) == 10000
+
+
+def test_handler_stats():
+    manager = Manager()
+    component = Pinged().register(manager)
+
+    stats.reset()
+    manager.fire(ping())
+    manager.flush()
+
+    assert component.pings == 1
+    assert stats.handlers == {}
+
+    enable_handler_stats()
+    try:
+        for _ in range(3):
+            value = manager.fire(ping())
+            manager.flush()
+            assert value.value == "pong"
+    finally:
+        enable_handler_stats(False)
+
+    report = stats.report()
+
+    assert component.pings == 4
+    assert report["handlers"][0]["name"] == "Pinged.ping"
+    assert report["handlers"][0]["count"] == 3
+    assert report["events"][0]["name"] == "ping"
+    assert report["queue_depth"]["count"] == 3
@@ -31,6 +31,7 @@ Test Isomer Logger
 from circuits import Manager
 import pytest
 from isomer import logger
+from time import time
 
 # from time import sleep
 
@@ -63,3 +64,106 @@ def test_script_logging():
     lastlog = logger.LiveLog[-1][-1]
 
     assert "FOOBAR" in lastlog
+
+
+def test_buffered_file_logging(tmp_path):
+    """Tests if buffered log lines end up in the logfile"""
+
+    previous_logfile = logger.get_logfile()
+    previous_verbosity = dict(logger.get_verbosity())
+
+    logger.set_logfile(str(tmp_path), "test", "buffered.log")
+    logger.set_verbosity(logger.debug, previous_verbosity["console"], logger.debug)
+
+    for number in range(100):
+        logger.isolog("BUFFERED", number)
+
+    logger.writer.flush()
+
+    with open(str(tmp_path / "buffered.log")) as f:
+        lines = f.readlines()
+
+    logger.logfile = previous_logfile
+    logger.set_verbosity(
+        previous_verbosity["global"],
+        previous_verbosity["console"],
+        previous_verbosity["file"]
+    )
+
+    assert len(lines) == 100
+    assert "BUFFERED 99" in lines[-1]
+
+
+def test_lazy_arguments():
+    """Tests if deferred arguments are only evaluated for emitted messages"""
+
+    evaluated = []
+
+    def expensive():
+        evaluated.append(True)
+        return "EXPENSIVE"
+
+    previous_verbosity = dict(logger.get_verbosity())
+    logger.live = True
+
+    logger.set_verbosity(logger.info, logger.info, logger.off)
+    assert logger.is_enabled(logger.debug) is False
+
+    logger.isolog("LAZY", logger.lazy(expensive), lvl=logger.debug)
+    assert evaluated == []
+
+    logger.isolog("LAZY", logger.lazy(expensive), logger.shorten("X" * 100, 10))
+    assert evaluated == [True]
+    assert logger.LiveLog[-1][-1] == " LAZY EXPENSIVE XXXXXXXXXX"
+
+    logger.set_verbosity(
+        previous_verbosity["global"],
+        previous_verbosity["console"],
+        previous_verbosity["file"]
+    )
+
+
+def test_live_log_buffer():
+    """Tests if the live log keeps a bounded number of queryable messages"""
+
+    buffer = logger.LogBuffer(capacity=10)
+
+    for number in range(25):
+        level = logger.error if number % 5 == 0 else logger.info
+        emitter = "ODD" if number % 2 else "EVEN"
+        buffer.append(time(), level, number, emitter, "MESSAGE %i" % number)
+
+    assert len(buffer) == 10
+    assert buffer[0][3] == 15
+    assert buffer[-1][-1] == "MESSAGE 24"
+
+    errors = buffer.query(min_level=logger.error)
+    assert [entry[3] for entry in errors] == [20, 15]
+
+    odd = buffer.query(limit=3, emitter="ODD")
+    assert [entry[3] for entry in odd] == [23, 21, 19]
+
+    odd_errors = buffer.query(min_level=logger.error, emitter="ODD")
+    assert [entry[3] for entry in odd_errors] == [15]
+
+    assert buffer.query(emitter="UNKNOWN") == []
+
+
+def test_live_log_buffer_emitters():
+    """Tests if emitters of overwritten messages are dropped from the live log"""
+
+    buffer = logger.LogBuffer(capacity=4)
+
+    for number in range(100):
+        buffer.append(time(), logger.info, number, "EMITTER %i" % number, "MESSAGE")
+
+    assert len(buffer.emitter_ids) == 4
+    assert len(buffer.emitter_names) == 4
+    assert len(buffer.by_emitter) == 4
+    assert buffer.query(emitter="EMITTER 95") == []
+    assert buffer.query(emitter="EMITTER 99")[0][4] == "EMITTER 99"
+
+    buffer.append(time(), logger.error, 100, "EMITTER 99", "MESSAGE")
+
+    assert [entry[3] for entry in buffer.query(min_level=logger.error)] == [100]
+    assert [entry[3] for entry in buffer.query(emitter="EMITTER 99")] == [100, 99]
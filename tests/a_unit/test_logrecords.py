@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Log Records
+=======================
+
+
+
+"""
+
+import os
+
+from isomer.logger import LogWriter, info, warn, error
+from isomer.logrecords import LogReader, INDEX_STRIDE
+
+emitters = ["ALPHA", "BETA", "GAMMA"]
+levels = [info, warn, error]
+
+
+def write_records(path, record_format, count, first=1000.0):
+    writer = LogWriter(path=path, record_format=record_format)
+
+    for number in range(count):
+        writer.write(
+            (
+                first + number,
+                levels[number % 3],
+                emitters[number % 3],
+                "[test@file:%i]" % number,
+                "Message %i" % number,
+            )
+        )
+
+    writer.close()
+
+
+def check_format(tmpdir, record_format):
+    path = str(tmpdir.join("structured." + record_format))
+    count = INDEX_STRIDE * 3 + 10
+
+    write_records(path, record_format, count)
+
+    with LogReader(path) as reader:
+        records = list(reader.query())
+        assert len(records) == count
+        assert records[0] == {
+            "t": 1000.0,
+            "l": info,
+            "e": "ALPHA",
+            "s": "[test@file:0]",
+            "c": "Message 0",
+        }
+
+        records = list(reader.query(start=1500.0, end=1510.0))
+        assert [record["c"] for record in records] == [
+            "Message %i" % number for number in range(500, 511)
+        ]
+
+        records = list(reader.query(min_level=error, emitter="GAMMA", limit=5))
+        assert len(records) == 5
+        assert all(record["e"] == "GAMMA" for record in records)
+
+        assert list(reader.query(emitter="DELTA")) == []
+
+    assert os.path.exists(path + ".idx")
+
+    # Appended records extend the persisted index
+    index_size = os.path.getsize(path + ".idx")
+    write_records(path, record_format, INDEX_STRIDE, first=5000.0)
+
+    with LogReader(path) as reader:
+        records = list(reader.query(start=5000.0))
+        assert len(records) == INDEX_STRIDE
+        assert records[0]["c"] == "Message 0"
+
+    assert os.path.getsize(path + ".idx") == index_size + 16
+
+
+def test_ndjson_records(tmpdir):
+    check_format(tmpdir, "ndjson")
+
+
+def test_binary_records(tmpdir):
+    check_format(tmpdir, "binary")
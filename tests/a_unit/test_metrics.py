@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Metrics
+===================
+
+
+
+"""
+
+from urllib.request import urlopen
+
+import pytest
+from circuits import Manager
+from circuits.web import Server
+
+from isomer.metrics import Registry, MetricsController, registry
+
+
+def test_exposition():
+    metrics = Registry()
+
+    counter = metrics.counter("test_requests_total", "Requests", ("component",))
+    counter.inc(component="a")
+    counter.inc(2, component='quote"d')
+
+    assert metrics.counter("test_requests_total", "Requests") is counter
+    assert counter.get(component="a") == 1
+
+    connected = [1, 2, 3]
+    metrics.gauge("test_clients", "Clients", callback=lambda: len(connected))
+
+    histogram = metrics.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    with pytest.raises(ValueError):
+        metrics.gauge("test_requests_total", "Conflicting type")
+
+    lines = metrics.expose().splitlines()
+
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{component="a"} 1' in lines
+    assert 'test_requests_total{component="quote\\"d"} 2' in lines
+    assert "test_clients 3" in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_latency_seconds_count 3" in lines
+    assert "test_latency_seconds_sum 5.55" in lines
+
+
+def test_endpoint():
+    registry.counter("test_endpoint_total", "Endpoint test").inc()
+
+    manager = Manager()
+    server = Server(("127.0.0.1", 0)).register(manager)
+    MetricsController().register(manager)
+
+    manager.start()
+    try:
+        port = server.port
+        with urlopen("http://127.0.0.1:%i/metrics" % port, timeout=5) as response:
+            content_type = response.headers["Content-Type"]
+            body = response.read().decode("utf-8")
+    finally:
+        manager.stop()
+
+    assert content_type.startswith("text/plain")
+    assert "test_endpoint_total 1" in body.splitlines()
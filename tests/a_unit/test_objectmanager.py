@@ -35,10 +35,11 @@ from uuid import uuid4
 from random import randint
 
 from isomer.database import objectmodels
+from isomer.permissions import get_compiled, get_fields
 from isomer.ui.clientobjects import User, Client
 from isomer.ui.objectmanager import ObjectManager
 from isomer.events.objectmanager import change, get, delete, put, getlist, search, \
-    subscribe, unsubscribe
+    subscribe, unsubscribe, getmany, putmany, deletemany
 # objectchange, objectcreation, objectdeletion, objectevent,
 # updatesubscriptions,
 
@@ -95,7 +96,10 @@ def transmit(action, data, account=AccountMock()):
         'getlist': getlist,
         'search': search,
         'subscribe': subscribe,
-        'unsubscribe': unsubscribe
+        'unsubscribe': unsubscribe,
+        'getmany': getmany,
+        'putmany': putmany,
+        'deletemany': deletemany
     }
 
     waiter = pytest.WaitEvent(m, "send", "isomer-web")
@@ -376,3 +380,164 @@ def test_delete_invalid_object():
     pprint(packet)
     assert packet['action'] == 'fail'
     assert packet['data']['reason'] == 'not found'
+
+
+def test_search_stream():
+    """Tests if searches can be streamed in chunks"""
+
+    packet = transmit('search', {
+        'schema': 'systemconfig',
+        'search': '*',
+        'stream': True,
+        'chunk_size': 1,
+        'limit': 1,
+        'req': 23
+    })
+
+    assert packet['action'] == 'search'
+
+    data = packet['data']
+
+    assert data['req'] == 23
+    assert data['chunk'] == 0
+    assert len(data['list']) == 1
+
+
+def test_continuation_token():
+    """Tests if continuation tokens resume after the last transmitted object"""
+
+    from isomer.ui.objectmanager.crud import get_continuation_token, \
+        get_continuation_filter
+
+    sort = [('name', 1), ('uuid', 1)]
+    token = get_continuation_token(sort, {'name': 'foo', 'uuid': 'bar'})
+
+    continuation = get_continuation_filter(sort, token)
+
+    assert continuation == {'$or': [
+        {'name': {'$gt': 'foo'}},
+        {'name': 'foo', 'uuid': {'$gt': 'bar'}}
+    ]}
+
+
+def test_continuation_token_null_values():
+    """Tests if continuation filters handle missing sort key values"""
+
+    from isomer.ui.objectmanager.crud import get_continuation_token, \
+        get_continuation_filter
+
+    sort = [('name', 1), ('uuid', 1)]
+    token = get_continuation_token(sort, {'uuid': 'bar'})
+
+    assert get_continuation_filter(sort, token) == {'$or': [
+        {'name': {'$ne': None}},
+        {'name': None, 'uuid': {'$gt': 'bar'}}
+    ]}
+
+    sort = [('name', -1), ('uuid', 1)]
+    token = get_continuation_token(sort, {'uuid': 'bar'})
+
+    assert get_continuation_filter(sort, token) == {'$or': [
+        {'name': None, 'uuid': {'$gt': 'bar'}}
+    ]}
+
+    token = get_continuation_token(sort, {'name': 'foo', 'uuid': 'bar'})
+
+    assert get_continuation_filter(sort, token) == {'$or': [
+        {'$or': [{'name': {'$lt': 'foo'}}, {'name': None}]},
+        {'name': 'foo', 'uuid': {'$gt': 'bar'}}
+    ]}
+
+
+def test_bulk_operations():
+    """Tests storing, fetching and deleting many objects at once"""
+
+    uuids = [str(uuid4()) for _ in range(3)]
+    objs = []
+    for uuid in uuids:
+        obj = objectmodels['systemconfig']({'uuid': uuid})
+        obj.active = False
+        obj.name = 'TEST SYSTEMCONFIG'
+        objs.append(obj.serializablefields())
+
+    packet = transmit('putmany', {
+        'schema': 'systemconfig',
+        'objs': objs
+    })
+
+    assert packet['action'] == 'putmany'
+    assert sorted(packet['data']['created']) == sorted(uuids)
+    assert packet['data']['failed'] == []
+
+    packet = transmit('getmany', {
+        'schema': 'systemconfig',
+        'uuid': uuids + ['FOOBAR']
+    })
+
+    assert packet['action'] == 'getmany'
+    assert len(packet['data']['objects']) == 3
+    assert packet['data']['missing'] == ['FOOBAR']
+
+    packet = transmit('deletemany', {
+        'schema': 'systemconfig',
+        'uuid': uuids
+    })
+
+    assert packet['action'] == 'deletemany'
+    assert sorted(packet['data']['uuid']) == sorted(uuids)
+    assert packet['data']['missing'] == []
+
+
+def test_deletemany_special_permissions():
+    """Tests if special write checks see complete objects on bulk deletion"""
+
+    def protect(obj, roles):
+        return get_fields(obj).get('name', None) != 'PROTECTED'
+
+    uuids = [str(uuid4()) for _ in range(2)]
+    for uuid, name in zip(uuids, ['PROTECTED', 'UNPROTECTED']):
+        obj = objectmodels['systemconfig']({'uuid': uuid})
+        obj.name = name
+        obj.save()
+
+    specials = get_compiled('systemconfig').specials
+    specials['write'] = protect
+
+    try:
+        packet = transmit('deletemany', {
+            'schema': 'systemconfig',
+            'uuid': uuids
+        })
+    finally:
+        del specials['write']
+
+    assert packet['action'] == 'deletemany'
+    assert packet['data']['uuid'] == [uuids[1]]
+    assert packet['data']['denied'] == [uuids[0]]
+
+    objectmodels['systemconfig'].find_one({'uuid': uuids[0]}).delete()
+
+
+def test_change_field():
+    """Tests if single fields are changed and validated in place"""
+
+    packet = transmit('change', {
+        'schema': 'systemconfig',
+        'uuid': test_config.uuid,
+        'change': {'field': 'name', 'value': 'CHANGED SYSTEMCONFIG'}
+    })
+
+    assert packet['action'] == 'change'
+    assert packet['data']['uuid'] == test_config.uuid
+
+    stored = objectmodels['systemconfig'].find_one({'uuid': test_config.uuid})
+    assert stored.name == 'CHANGED SYSTEMCONFIG'
+
+    packet = transmit('change', {
+        'schema': 'systemconfig',
+        'uuid': test_config.uuid,
+        'change': {'field': 'name', 'value': 23}
+    })
+
+    assert packet['action'] == 'fail'
+    assert packet['data']['reason'] == 'invalid_object'
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Permissions
+=======================
+
+
+
+"""
+
+from uuid import uuid4
+
+from isomer import permissions
+from isomer.schemata.base import base_object
+from isomer.ui.clientobjects import User
+
+schema = base_object("permtest", roles_read=["crew"], roles_create="crew")
+store = {"permtest": {"schema": schema, "form": []}}
+
+
+class AccountMock():
+    def __init__(self, roles):
+        self.name = 'TEST'
+        self.roles = roles
+
+
+def get_user(roles):
+    return User(AccountMock(roles), None, str(uuid4()))
+
+
+def get_object(owner=None):
+    return {
+        "uuid": str(uuid4()),
+        "owner": owner,
+        "perms": {
+            "read": ["admin", "crew", "owner"],
+            "write": ["admin", "owner"],
+            "list": ["admin", "owner"],
+        }
+    }
+
+
+def test_compile():
+    """Tests if schema permissions are compiled correctly"""
+
+    compiled = permissions.compile_permissions(store)["permtest"]
+
+    assert compiled.roles_create == frozenset(["crew"])
+    assert compiled.specials == {}
+
+
+def test_check_permissions():
+    """Tests role and ownership based permission checks"""
+
+    from isomer import schemastore
+
+    schemastore.permissionstore.update(permissions.compile_permissions(store))
+
+    crew = get_user(["crew"])
+    obj = get_object()
+
+    assert permissions.check_permissions("permtest", crew, "read", obj)
+    assert not permissions.check_permissions("permtest", crew, "write", obj)
+
+    owned = get_object(owner=crew.uuid)
+
+    assert permissions.check_permissions("permtest", crew, "write", owned)
+
+    assert permissions.check_create_permission("permtest", crew)
+    assert not permissions.check_create_permission("permtest", get_user(["public"]))
+
+
+def test_administrative_objects():
+    """Tests if objects without permissions are only accessible to admins"""
+
+    obj = {"uuid": str(uuid4())}
+
+    assert permissions.check_permissions("permtest", get_user(["admin"]), "read", obj)
+    assert not permissions.check_permissions(
+        "permtest", get_user(["crew"]), "read", obj
+    )
+
+
+def test_permission_filter():
+    """Tests the translation of roles into a database query"""
+
+    crew = get_user(["crew"])
+    query = permissions.permission_filter(crew, "list")
+
+    assert {"perms.list": {"$in": ["crew"]}} in query["$or"]
+    assert {"perms.list": "owner", "owner": crew.uuid} in query["$or"]
+    assert len(query["$or"]) == 2
+
+    query = permissions.permission_filter(get_user(["admin"]), "list")
+
+    assert {"perms": {"$exists": False}} in query["$or"]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Rate Limiting
+=========================
+
+
+
+"""
+
+from isomer.ui.clientmanager.ratelimit import TokenBucket, RateLimiter
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, burst=3, now=0)
+
+    assert bucket.consume(0)
+    assert bucket.consume(0)
+    assert bucket.consume(0)
+    assert bucket.consume(0) is False
+
+    # Half a second refills one token
+    assert bucket.consume(0.5)
+    assert bucket.consume(0.5) is False
+
+    assert bucket.idle(10)
+    assert bucket.consume(10)
+    assert bucket.tokens == 2
+
+
+def test_rate_limiter_scopes():
+    limiter = RateLimiter({
+        "client": {"rate": 1, "burst": 2},
+        "ip": {"rate": 1, "burst": 3},
+        "objectmanager.getlist": {"rate": 1, "burst": 1},
+    })
+
+    assert limiter.check("a", "127.0.0.1", now=0) is None
+    assert limiter.check("a", "127.0.0.1", now=0) is None
+    assert limiter.check("a", "127.0.0.1", now=0) == "client"
+
+    # Throttled messages do not take IP tokens
+    assert limiter.check("b", "127.0.0.1", now=0) is None
+    assert limiter.check("b", "127.0.0.1", now=0) == "ip"
+    assert limiter.check("c", "127.0.0.2", now=0) is None
+
+    assert limiter.check_event("a", "objectmanager", "getlist", now=0) is None
+    assert limiter.check_event("a", "objectmanager", "getlist", now=0) == "event"
+    assert limiter.check_event("b", "objectmanager", "getlist", now=0) is None
+    assert limiter.check_event("a", "objectmanager", "get", now=0) is None
+
+    limiter.forget("a")
+    assert limiter.check_event("a", "objectmanager", "getlist", now=0) is None
+
+
+def test_rate_limiter_pruning():
+    limiter = RateLimiter({"client": {"rate": 1, "burst": 1}}, max_buckets=2)
+
+    assert limiter.check("a", None, now=0) is None
+    assert limiter.check("b", None, now=0) is None
+    assert limiter.check("c", None, now=5) is None
+
+    assert len(limiter._clients) == 1
+
+
+def test_rate_limiter_bounds():
+    limiter = RateLimiter({
+        "client": {"rate": 1, "burst": 1},
+        "objectmanager.getlist": {"rate": 1, "burst": 1},
+    }, max_buckets=2)
+
+    # None of these buckets is idle, the least recently used one is dropped
+    assert limiter.check("a", None, now=0) is None
+    assert limiter.check("b", None, now=0) is None
+    assert limiter.check("a", None, now=0) == "client"
+    assert limiter.check("c", None, now=0) is None
+
+    assert list(limiter._clients) == ["a", "c"]
+
+    for client in "abc":
+        limiter.check_event(client, "objectmanager", "getlist", now=0)
+
+    assert list(limiter._events) == ["b", "c"]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Sessions
+====================
+
+
+
+"""
+
+from isomer.ui.clientmanager.sessions import SessionTokens
+
+
+def test_session_token():
+    tokens = SessionTokens(60)
+    token = tokens.issue("user", "client", "nonce", now=1000)
+
+    assert tokens.verify(token, now=1030) == ("user", "client", "nonce")
+    assert tokens.verify(token, now=1061) is None
+
+
+def test_session_token_forgery():
+    tokens = SessionTokens(60)
+    token = tokens.issue("user", "client", tokens.new_nonce())
+
+    assert SessionTokens(60).verify(token) is None
+    assert tokens.verify(token[:-4] + "AAA=") is None
+    assert tokens.verify("garbage") is None
+    assert tokens.verify(None) is None
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Subscription Registry
+=================================
+
+
+
+"""
+
+from isomer.ui.objectmanager.registry import SubscriptionRegistry
+
+
+def test_add_remove():
+    registry = SubscriptionRegistry()
+
+    registry.add("obj1", "client1", "user1", "schema")
+    registry.add("obj1", "client2", "user2")
+    registry.add("obj2", "client1", "user1", "schema")
+
+    assert "obj1" in registry
+    assert registry.recipients("obj1") == {"client1": "user1", "client2": "user2"}
+    assert registry.by_client("client1") == {"obj1", "obj2"}
+    assert registry.by_schema("schema") == {"obj1", "obj2"}
+
+    assert registry.remove("obj2", "client1") is True
+    assert registry.remove("obj2", "client1") is False
+    assert "obj2" not in registry
+    assert registry.by_schema("schema") == {"obj1"}
+
+
+def test_client_disconnect():
+    registry = SubscriptionRegistry()
+
+    registry.add("obj1", "client1", "user1", "schema")
+    registry.add("obj2", "client1", "user1", "schema")
+    registry.add("obj2", "client2", "user2", "schema")
+
+    assert registry.remove_client("client1") == {"obj1", "obj2"}
+
+    assert "obj1" not in registry
+    assert registry.recipients("obj2") == {"client2": "user2"}
+    assert registry.by_client("client1") == set()
+    assert registry.by_schema("schema") == {"obj2"}
+
+
+def test_remove_object():
+    registry = SubscriptionRegistry()
+
+    registry.add("obj1", "client1", "user1", "schema")
+    registry.add("obj1", "client2", "user2", "schema")
+
+    assert registry.remove_object("obj1") == {"client1": "user1", "client2": "user2"}
+    assert len(registry) == 0
+    assert registry.clients == {}
+    assert registry.schemata == {}
+
+
+def test_decision_cache():
+    registry = SubscriptionRegistry()
+
+    registry.add("obj1", "client1", "user1")
+    registry.set_decision("client1", "obj1", ("v1",), True)
+
+    assert registry.get_decision("client1", "obj1", ("v1",)) is True
+    assert registry.get_decision("client1", "obj1", ("v2",)) is None
+
+    registry.remove("obj1", "client1")
+    assert registry.decisions == {}
+
+
+def test_group_recipients():
+    from isomer.ui.objectmanager.subscriptions import SubscriptionOperations
+
+    groups = SubscriptionOperations._group_recipients({
+        "client1": ["obj1", "obj2"],
+        "client2": ["obj1", "obj2"],
+        "client3": ["obj1"],
+    })
+
+    assert groups == {
+        ("obj1", "obj2"): ["client1", "client2"],
+        ("obj1",): ["client3"]
+    }
+
+
+def test_sent_updates():
+    registry = SubscriptionRegistry()
+
+    registry.set_update("obj1", {"uuid": "obj1"})
+    assert registry.is_sent("obj1", {"uuid": "obj1"}) is False
+
+    registry.add("obj1", "client1", "user1")
+    registry.set_update("obj1", {"uuid": "obj1"})
+    assert registry.is_sent("obj1", {"uuid": "obj1"}) is True
+    assert registry.is_sent("obj1", {"uuid": "obj1", "name": "changed"}) is False
+
+    registry.remove_client("client1")
+    assert registry.updates == {}
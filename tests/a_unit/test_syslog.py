@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Syslog
+==================
+
+
+
+"""
+
+import os
+
+from isomer.ui.syslog import LogTailer
+
+
+def write(path, lines, mode="a"):
+    with open(path, mode) as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def test_follow(tmp_path):
+    """Tests if all new lines are read at once and old ones are skipped"""
+
+    path = str(tmp_path / "test.log")
+    write(path, ["OLD %i" % number for number in range(10)], "w")
+
+    tailer = LogTailer(path, stride=4)
+    tailer.start()
+
+    assert tailer.read() == []
+    assert tailer.lines == 0
+
+    tailer.index_backlog()
+    assert tailer.indexed.is_set()
+    assert tailer.lines == 10
+
+    write(path, ["NEW %i" % number for number in range(1000)])
+
+    lines = tailer.read()
+
+    assert len(lines) == 1000
+    assert lines[-1] == "NEW 999"
+    assert tailer.lines == 1010
+
+
+def test_partial_lines(tmp_path):
+    path = str(tmp_path / "test.log")
+    write(path, [], "w")
+
+    tailer = LogTailer(path)
+    tailer.start()
+
+    with open(path, "a") as f:
+        f.write("INCOMPLETE")
+
+    assert tailer.read() == []
+
+    with open(path, "a") as f:
+        f.write(" LINE\n")
+
+    assert tailer.read() == ["INCOMPLETE LINE"]
+
+
+def test_rotation(tmp_path):
+    path = str(tmp_path / "test.log")
+    write(path, ["FIRST"], "w")
+
+    tailer = LogTailer(path)
+    tailer.start()
+
+    write(path, ["UNREAD"])
+    os.rename(path, path + ".1")
+    write(path, ["ROTATED"], "w")
+
+    # Lines written to the old file before rotation are not lost
+    assert tailer.read() == ["UNREAD", "ROTATED"]
+    assert tailer.lines == 1
+
+
+def test_history(tmp_path):
+    path = str(tmp_path / "test.log")
+    write(path, ["LINE %i" % number for number in range(100)], "w")
+
+    tailer = LogTailer(path, stride=8)
+    tailer.start()
+    tailer.index_backlog()
+
+    write(path, ["LINE %i" % number for number in range(100, 120)])
+    tailer.read()
+
+    assert tailer.history(5) == ["LINE %i" % number for number in range(115, 120)]
+    assert tailer.history(3, 20) == ["LINE 17", "LINE 18", "LINE 19"]
+    assert tailer.history(10, 4) == ["LINE %i" % number for number in range(4)]
+    assert tailer.history(4, 102) == ["LINE %i" % number for number in range(98, 102)]
+
+
+def test_live_before_backlog(tmp_path):
+    """Tests if new lines are followed before the backlog is indexed"""
+
+    path = str(tmp_path / "test.log")
+    write(path, ["OLD %i" % number for number in range(1000)], "w")
+
+    with open(path, "a") as f:
+        f.write("INCOMPLETE")
+
+    tailer = LogTailer(path, chunk_size=64)
+    tailer.start()
+
+    with open(path, "a") as f:
+        f.write(" LINE\nNEW\n")
+
+    assert tailer.read() == ["INCOMPLETE LINE", "NEW"]
+    assert tailer.history(1) == ["NEW"]
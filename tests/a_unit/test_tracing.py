@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Isomer - The distributed application framework
+# ==============================================
+# Copyright (C) 2011-2020 Heiko 'riot' Weinen <riot@c-base.org> and others.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Isomer - Backend
+
+Test Isomer Tracing
+===================
+
+
+
+"""
+
+from circuits import Component, Event, Manager
+
+from isomer import tracing
+from isomer.component import handler
+from isomer.events.client import send
+from isomer.tracing import TraceStore, traces
+
+
+class traced(Event):
+    """Test event"""
+
+    trace = None
+
+
+class Responder(Component):
+    """Test component answering traced events"""
+
+    def __init__(self):
+        super(Responder, self).__init__()
+        self.sent = []
+
+    @handler("traced")
+    def traced(self, event):
+        self.sent.append(send("client", {"action": "response"}))
+
+
+def test_trace_store():
+    store = TraceStore(size=2, threshold=0.0)
+
+    assert store.begin("client") is None
+
+    store.configure(True)
+    for action in ("one", "two", "three"):
+        trace = store.begin("client", "test", action)
+        trace.mark("decode")
+
+    assert len(store.traces) == 2
+    assert store.recent(1)[0].action == "three"
+
+    store.finish(trace)
+    store.finish(trace)
+
+    assert trace.finished
+    assert store.slow == 1
+    assert trace.timings()["stages"][0][0] == "decode"
+
+
+def test_traced_handler():
+    manager = Manager()
+    component = Responder().register(manager)
+
+    traces.configure(True)
+    try:
+        trace = traces.begin("client", "test", "traced")
+        trace.mark("decode")
+
+        event = traced()
+        event.trace = trace
+
+        manager.fire(event)
+        manager.flush()
+    finally:
+        traces.configure(False)
+
+    assert tracing.current is None
+
+    # Responses fired by the handler continue the request's trace
+    assert component.sent[0].trace is trace
+
+    stages = [name for name, duration in trace.stages]
+    assert stages == ["decode", "queue", "Responder.traced"]